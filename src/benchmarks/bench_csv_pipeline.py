@@ -0,0 +1,128 @@
+"""
+Benchmark of pipelines.Paragraph2CsvPipeline.
+
+Compares the former implementation (one single-row pandas DataFrame, os.path.exists check and append-mode open per
+paragraph) against the buffered csv writer on synthetic paragraph items. The former implementation is only run on
+the first --legacy-rows items and extrapolated to the full number of paragraphs, both outputs are compared byte by
+byte on these items.
+
+Run from the src directory:
+    python -m benchmarks.bench_csv_pipeline [--rows N] [--legacy-rows N]
+"""
+import argparse
+import filecmp
+import inspect
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+import pandas
+
+from parsers import ParagraphItem
+from pipelines import Paragraph2CsvPipeline
+from shared import simple_logger
+
+
+SENTENCES = ["Die Stadtverwaltung informiert über die neuen Öffnungszeiten des Bürgerbüros.",
+             "The city council announced new opening hours; the citizens' office opens at 8.",
+             "Weitere Informationen erhalten Sie bei unserer \"Geschäftsstelle\".",
+             "Results of the survey\nwill be published next month."]
+
+# pandas >= 1.5 renamed the line_terminator argument
+LINE_TERMINATOR = "lineterminator" if "lineterminator" in inspect.signature(pandas.DataFrame.to_csv).parameters \
+    else "line_terminator"
+
+
+class LegacyParagraph2CsvPipeline(Paragraph2CsvPipeline):
+    """ Paragraph2CsvPipeline before the buffered writer """
+
+    def open_spider(self, spider):
+        fullpath = os.path.join(spider.crawl_specification.output, spider.name + self.INCOMPLETE_FLAG + ".csv")
+
+        df = pandas.DataFrame(columns=["url", "content", "par_language", "page_language", "origin", "depth"])
+        df.to_csv(fullpath, sep=";", index=False, encoding="utf-8")
+
+    def close_spider(self, spider):
+        fullpath_inc = os.path.join(spider.crawl_specification.output, spider.name + self.INCOMPLETE_FLAG + ".csv")
+        fullpath_com = os.path.join(spider.crawl_specification.output, spider.name + ".csv")
+
+        shutil.move(fullpath_inc, fullpath_com)
+
+    def process_item(self, item, spider):
+        df_item = dict()
+        for key in item:
+            df_item[key] = [item[key]]
+
+        url = item['url']
+        domain = urlparse(url).netloc
+        if domain in spider.allowed_domains:
+            spider.s_log.debug("[process_item] - Adding content for {0} to {1}".format(str(url), str(spider.name)))
+
+            fullpath = os.path.join(spider.crawl_specification.output, spider.name + self.INCOMPLETE_FLAG + ".csv")
+
+            if os.path.exists(fullpath):
+                df = pandas.DataFrame.from_dict(df_item)
+                # an empty line terminator made former pandas versions fall back to os.linesep
+                df.to_csv(fullpath, mode="a", sep=";", index=False, encoding="utf-8", header=False,
+                          **{LINE_TERMINATOR: os.linesep})
+
+        return item
+
+
+def paragraph_items(count, seed=0):
+    rnd = random.Random(seed)
+    for i in range(count):
+        url = "http://www.example.com/page/{0}".format(i // 20)
+        yield ParagraphItem(url=url,
+                            content=" ".join(rnd.choice(SENTENCES) for _ in range(rnd.randint(1, 4))),
+                            par_lang=rnd.choice(["de", "en", None]),
+                            page_lang=rnd.choice(["de", "en"]),
+                            origin="//p",
+                            depth=rnd.randint(0, 5))
+
+
+def run(pipeline, items, output, name):
+    spider = SimpleNamespace(name=name,
+                             allowed_domains=["www.example.com"],
+                             crawl_specification=SimpleNamespace(output=output),
+                             s_log=simple_logger(name))
+    start = time.perf_counter()
+    pipeline.open_spider(spider)
+    for item in items:
+        pipeline.process_item(item, spider)
+    pipeline.close_spider(spider)
+    return time.perf_counter() - start, os.path.join(output, name + ".csv")
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--rows", type=int, default=1000000, help="number of paragraphs")
+    arg_parser.add_argument("--legacy-rows", type=int, default=10000,
+                            help="number of paragraphs written by the former implementation")
+    args = arg_parser.parse_args(argv)
+
+    items = list(paragraph_items(args.rows))
+    legacy_rows = min(args.legacy_rows, args.rows)
+
+    with tempfile.TemporaryDirectory() as output:
+        legacy_time, legacy_file = run(LegacyParagraph2CsvPipeline(), items[:legacy_rows], output, "legacy")
+        sample_time, sample_file = run(Paragraph2CsvPipeline(), items[:legacy_rows], output, "sample")
+        identical = filecmp.cmp(legacy_file, sample_file, shallow=False)
+        buffered_time, _ = run(Paragraph2CsvPipeline(), items, output, "buffered")
+
+    legacy_total = legacy_time / legacy_rows * args.rows
+    print("{0:<40} {1:>12.2f} s {2:>12.0f} rows/s".format("pandas per item ({0} rows, extrapolated)".format(
+        legacy_rows), legacy_total, args.rows / legacy_total))
+    print("{0:<40} {1:>12.2f} s {2:>12.0f} rows/s".format("buffered csv writer", buffered_time,
+                                                         args.rows / buffered_time))
+    print("speedup: {0:.1f}x, identical output on {1} rows: {2}".format(legacy_total / buffered_time, legacy_rows,
+                                                                        identical))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
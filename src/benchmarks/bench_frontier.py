@@ -0,0 +1,143 @@
+"""
+Benchmark of the memory held by the scheduler's request queue, scrapy's FifoMemoryQueue against the
+frontier.SpillingQueue.
+
+A synthetic download handler without network access serves a site of the same domain in which every page holds two
+paragraphs and links ``--fanout`` new pages. The spider stops after ``--pages`` pages (CLOSESPIDER_PAGECOUNT), at
+which point about pages * (fanout - 1) requests are queued. Each run takes place in a subprocess, which reports its
+wall time, peak memory (max RSS) and the frontier stats.
+
+Run from the src directory:
+    python -m benchmarks.bench_frontier [--fanout N] [--pages N [N ...]] [--head-size N]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+from scrapy.http import HtmlResponse
+from twisted.internet import defer
+
+FANOUT = 50
+
+# pages are padded to a common size, with tiny pages scrapy would keep thousands of responses in its scraper (up to
+# SCRAPER_SLOT_MAX_ACTIVE_SIZE), which outweighs the request queue
+PAGE = ("<html><head><script>/*" + "x" * 30000 + "*/</script></head><body>"
+        "<p>Die Stadtverwaltung informiert über die neuen Öffnungszeiten des Bürgerbüros.</p>"
+        "<p>Weitere Informationen erhalten Sie bei unserer Geschäftsstelle.</p>{0}</body></html>")
+
+
+class SyntheticHttpHandler:
+    """ Download handler that answers /page/<n>.html with PAGE, linking the pages n * FANOUT + 1 to (n + 1) * FANOUT """
+
+    lazy = False
+
+    def __init__(self, settings=None, crawler=None):
+        self.fanout = settings.getint("BENCH_FANOUT", FANOUT) if settings is not None else FANOUT
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings, crawler)
+
+    def download_request(self, request, spider):
+        path = urlparse(request.url).path
+        number = int(path[len("/page/"):-len(".html")]) if path.startswith("/page/") else 0
+        body = PAGE.format("".join("<a href='/page/{0}.html'>{0}</a>".format(i)
+                                   for i in range(number * self.fanout + 1, (number + 1) * self.fanout + 1)))
+        return defer.succeed(HtmlResponse(request.url, body=body.encode("utf-8"), encoding="utf-8", request=request,
+                                          headers={"Content-Type": "text/html; charset=utf-8"}))
+
+
+def run_child(fanout, pages, head_size, queue, directory):
+    """ Crawl the synthetic site in this process and write the measurements to <directory>/result.json """
+    from scrapy.crawler import CrawlerProcess
+
+    import scrapy_wrapper
+    from shared import CrawlSpecification
+
+    spec = CrawlSpecification(name="bench",
+                              output=os.path.join(directory, "out"),
+                              logs=os.path.join(directory, "logs"),
+                              urls=["http://frontier.test/page/0.html"],
+                              parser="parsers.ParagraphParser",
+                              parser_data={"allowed_languages": ["de", "en"], "xpaths": ["//p"]},
+                              pipelines={"pipelines.Paragraph2CsvPipeline": 300})
+    os.makedirs(spec.logs, exist_ok=True)
+
+    settings = scrapy_wrapper.GenericScrapySettings()
+    settings.set("ITEM_PIPELINES", spec.pipelines)
+    settings.set("LOG_FILE", os.path.join(spec.logs, "scrapy.log"))
+    settings.set("DOWNLOAD_HANDLERS", {"http": "benchmarks.bench_frontier.SyntheticHttpHandler"})
+    settings.set("TELNETCONSOLE_ENABLED", False)
+    settings.set("ROBOTSTXT_OBEY", False)
+    settings.set("CLOSESPIDER_PAGECOUNT", pages)
+    settings.set("BENCH_FANOUT", fanout)
+    settings.set("DEPTH_LIMIT", 0)
+    settings.set("FRONTIER_HEAD_SIZE", head_size)
+    settings.set("FRONTIER_SPILL_DIR", os.path.join(directory, "frontier"))
+    if queue == "fifo":
+        settings.set("SCHEDULER_MEMORY_QUEUE", "scrapy.squeues.FifoMemoryQueue")
+
+    result = {"error": None}
+    start = time.perf_counter()
+    try:
+        process = CrawlerProcess(settings=settings)
+        crawlers = scrapy_wrapper.add_spiders(process, spec)
+        process.start()
+        stats = crawlers[0].stats.get_stats()
+        result.update({key: value for key, value in stats.items() if key.startswith("frontier/")})
+    except Exception as exc:
+        result["error"] = "{0}: {1}".format(type(exc).__name__, exc)
+    result["time"] = time.perf_counter() - start
+    result["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    with open(os.path.join(directory, "result.json"), "w") as result_file:
+        json.dump(result, result_file)
+
+
+def measure(fanout, pages, head_size, queue):
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.devnull, "w") as devnull:
+            subprocess.run([sys.executable, "-m", "benchmarks.bench_frontier", "--child", str(fanout), str(pages),
+                            str(head_size), queue, directory], stdout=devnull, stderr=devnull)
+        result_path = os.path.join(directory, "result.json")
+        if not os.path.exists(result_path):
+            return {"error": "subprocess failed"}
+        with open(result_path) as result_file:
+            return json.load(result_file)
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--fanout", type=int, default=FANOUT, help="number of new pages linked by every page")
+    arg_parser.add_argument("--pages", type=int, nargs="+", default=[1000, 4000],
+                            help="numbers of pages after which the spider stops")
+    arg_parser.add_argument("--head-size", type=int, default=1000, help="FRONTIER_HEAD_SIZE of the spilling queue")
+    arg_parser.add_argument("--child", nargs=5, help=argparse.SUPPRESS)
+    args = arg_parser.parse_args(argv)
+
+    if args.child:
+        fanout, pages, head_size, queue, directory = args.child
+        run_child(int(fanout), int(pages), int(head_size), queue, directory)
+        return
+
+    print("{0:>7} {1:<10} {2:>10} {3:>12} {4:>12} {5:>12}".format("pages", "queue", "time [s]", "max rss [MB]",
+                                                                  "memory max", "disk max"))
+    for pages in args.pages:
+        for queue in ["fifo", "spilling"]:
+            result = measure(args.fanout, pages, args.head_size, queue)
+            if result.get("time") is None:
+                print("{0:>7} {1:<10} {2}".format(pages, queue, result["error"]))
+                continue
+            print("{0:>7} {1:<10} {2:>10.1f} {3:>12.0f} {4:>12} {5:>12}{6}".format(
+                pages, queue, result["time"], result["max_rss_mb"], result.get("frontier/memory_max", "-"),
+                result.get("frontier/disk_max", "-"), "  " + result["error"] if result["error"] else ""))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
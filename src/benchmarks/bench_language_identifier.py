@@ -0,0 +1,101 @@
+"""
+Benchmark of the page-level language identification used by parsers.ParagraphParser.
+
+Compares the former two-pass detection (langdetect.detect per paragraph followed by langdetect.detect_langs on the
+concatenated page) against the single-pass, cached language_identifier.LanguageIdentifier.
+Pages are reconstructed from a Paragraph2CsvPipeline output file of a previous crawl (paragraphs grouped by url), if no
+csv file is given, a synthetic de/en crawl with site-wide boilerplate paragraphs is generated.
+
+Run from the src directory:
+    python -m benchmarks.bench_language_identifier [<crawl result csv>] [--pages N]
+"""
+import argparse
+import csv
+import random
+import sys
+import time
+from collections import OrderedDict
+
+from langdetect import DetectorFactory, detect, detect_langs
+from langdetect.lang_detect_exception import LangDetectException
+
+from language_identifier import LanguageIdentifier
+
+
+DE_SENTENCES = ["Die Stadtverwaltung informiert über die neuen Öffnungszeiten des Bürgerbüros.",
+                "Im Rahmen des Projekts wurden zahlreiche Maßnahmen zur Förderung der Region umgesetzt.",
+                "Weitere Informationen erhalten Sie bei unserer Geschäftsstelle.",
+                "Die Ergebnisse der Umfrage werden im kommenden Monat veröffentlicht."]
+EN_SENTENCES = ["The city council announced new opening hours for the citizens' office.",
+                "Numerous measures to support the region were implemented within the project.",
+                "Please contact our office for further information.",
+                "The results of the survey will be published next month."]
+BOILERPLATE = ["Impressum", "Datenschutzerklärung", "Kontakt | Anfahrt | Sitemap",
+               "Diese Webseite verwendet Cookies, um Ihnen ein optimales Nutzererlebnis zu bieten.",
+               "This website uses cookies to ensure you get the best experience on our website.",
+               "© 2019 Alle Rechte vorbehalten."]
+
+
+def synthetic_pages(count, seed=0):
+    rnd = random.Random(seed)
+    pages = []
+    for _ in range(count):
+        sentences = DE_SENTENCES if rnd.random() < 0.6 else EN_SENTENCES
+        content = [" ".join(rnd.sample(sentences, 2)) for _ in range(rnd.randint(3, 12))]
+        pages.append(BOILERPLATE + content)
+    return pages
+
+
+def csv_pages(path, count):
+    pages = OrderedDict()
+    with open(path, encoding="utf-8", newline="") as csv_file:
+        for row in csv.DictReader(csv_file, delimiter=";"):
+            pages.setdefault(row["url"], []).append(row["content"])
+    return list(pages.values())[:count]
+
+
+def two_pass(pages):
+    for paragraphs in pages:
+        for par in paragraphs:
+            try:
+                detect(par)
+            except LangDetectException:
+                pass
+        try:
+            detect_langs(" ".join(paragraphs))
+        except LangDetectException:
+            pass
+
+
+def single_pass(pages, identifier):
+    for paragraphs in pages:
+        identifier.detect_page(paragraphs)
+
+
+def measure(name, func, pages):
+    start = time.perf_counter()
+    func(pages)
+    elapsed = time.perf_counter() - start
+    print("{0:<32} {1:>8} pages {2:>10.2f} s {3:>10.1f} pages/s".format(name, len(pages), elapsed,
+                                                                      len(pages) / elapsed))
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("csv", nargs="?", help="Paragraph2CsvPipeline output of a previous crawl")
+    arg_parser.add_argument("--pages", type=int, default=500)
+    args = arg_parser.parse_args(argv)
+
+    DetectorFactory.seed = 0
+    pages = csv_pages(args.csv, args.pages) if args.csv else synthetic_pages(args.pages)
+    detect("warm up language profiles")
+
+    measure("two-pass (detect + detect_langs)", two_pass, pages)
+    measure("LanguageIdentifier (no cache)", lambda p: single_pass(p, LanguageIdentifier(cache_size=0)), pages)
+    identifier = LanguageIdentifier()
+    measure("LanguageIdentifier", lambda p: single_pass(p, identifier), pages)
+    print("cache hits: {0}, misses: {1}".format(identifier.cache.hits, identifier.cache.misses))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
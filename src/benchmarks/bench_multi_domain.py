@@ -0,0 +1,149 @@
+"""
+Benchmark of crawls with many start urls, one spider per start url against a single multi-domain spider.
+
+Every start url is a domain of its own, served by a synthetic download handler without network access: the start
+page links two further pages, each page holds two paragraphs. Both modes crawl with the ParagraphParser and the
+Paragraph2CsvPipeline. Each run takes place in a subprocess, which reports its wall time, peak memory (max RSS) and
+the peak numbers of open file descriptors and threads.
+
+Run from the src directory:
+    python -m benchmarks.bench_multi_domain [--seeds N [N ...]] [--modes MODE [MODE ...]]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+from scrapy.http import HtmlResponse, Response
+from twisted.internet import defer
+
+
+PAGES = {
+    "/": "<html><body><p>Die Stadtverwaltung informiert über die neuen Öffnungszeiten des Bürgerbüros.</p>"
+         "<p>Weitere Informationen erhalten Sie bei unserer Geschäftsstelle.</p>"
+         "<a href='/a.html'>A</a> <a href='/b.html'>B</a></body></html>",
+    "/a.html": "<html><body><p>Im Rahmen des Projekts wurden zahlreiche Maßnahmen umgesetzt.</p>"
+               "<p>Die Ergebnisse werden im nächsten Monat veröffentlicht.</p></body></html>",
+    "/b.html": "<html><body><p>The results of the survey will be published next month.</p>"
+               "<p>Please contact our office for further information.</p></body></html>",
+}
+
+
+class SyntheticHttpHandler:
+    """ Download handler that answers every request with one of PAGES, or 404 """
+
+    lazy = False
+
+    def __init__(self, settings=None, crawler=None):
+        pass
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings, crawler)
+
+    def download_request(self, request, spider):
+        body = PAGES.get(urlparse(request.url).path)
+        if body is None:
+            return defer.succeed(Response(request.url, status=404, request=request))
+        return defer.succeed(HtmlResponse(request.url, body=body.encode("utf-8"), encoding="utf-8", request=request,
+                                          headers={"Content-Type": "text/html; charset=utf-8"}))
+
+
+def run_child(seeds, multi_domain, directory):
+    """ Crawl ``seeds`` synthetic domains in this process and write the measurements to <directory>/result.json """
+    from scrapy.crawler import CrawlerProcess
+    from twisted.internet import task
+
+    import scrapy_wrapper
+    from shared import CrawlSpecification
+
+    spec = CrawlSpecification(name="bench",
+                              output=os.path.join(directory, "out"),
+                              logs=os.path.join(directory, "logs"),
+                              urls=["http://seed{0}.test/".format(i) for i in range(seeds)],
+                              parser="parsers.ParagraphParser",
+                              parser_data={"allowed_languages": ["de", "en"], "xpaths": ["//p"]},
+                              pipelines={"pipelines.Paragraph2CsvPipeline": 300},
+                              multi_domain=multi_domain)
+    os.makedirs(spec.logs, exist_ok=True)
+
+    settings = scrapy_wrapper.GenericScrapySettings()
+    settings.set("ITEM_PIPELINES", spec.pipelines)
+    if multi_domain:
+        settings.set("ITEM_PROCESSOR", "pipelines.DomainPipelineManager")
+    settings.set("LOG_FILE", os.path.join(spec.logs, "scrapy.log"))
+    settings.set("DOWNLOAD_HANDLERS", {"http": "benchmarks.bench_multi_domain.SyntheticHttpHandler"})
+    settings.set("TELNETCONSOLE_ENABLED", False)
+
+    peaks = {"fds": 0, "threads": 0}
+
+    def sample():
+        peaks["fds"] = max(peaks["fds"], len(os.listdir("/proc/self/fd")))
+        peaks["threads"] = max(peaks["threads"], threading.active_count())
+
+    result = {"error": None}
+    start = time.perf_counter()
+    try:
+        process = CrawlerProcess(settings=settings)
+        scrapy_wrapper.add_spiders(process, spec)
+        sample()
+        task.LoopingCall(sample).start(0.1)
+        process.start()
+    except Exception as exc:
+        result["error"] = "{0}: {1}".format(type(exc).__name__, exc)
+    result["time"] = time.perf_counter() - start
+    result["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    result.update(peaks)
+    result["csv_files"] = len([f for f in os.listdir(spec.output) if f.endswith(".csv")]) \
+        if os.path.isdir(spec.output) else 0
+
+    with open(os.path.join(directory, "result.json"), "w") as result_file:
+        json.dump(result, result_file)
+
+
+def measure(seeds, mode):
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.devnull, "w") as devnull:
+            subprocess.run([sys.executable, "-m", "benchmarks.bench_multi_domain", "--child", str(seeds), mode,
+                            directory], stdout=devnull, stderr=devnull)
+        result_path = os.path.join(directory, "result.json")
+        if not os.path.exists(result_path):
+            return {"error": "subprocess failed"}
+        with open(result_path) as result_file:
+            return json.load(result_file)
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--seeds", type=int, nargs="+", default=[1000, 10000], help="numbers of start urls")
+    arg_parser.add_argument("--modes", nargs="+", default=["per_url", "multi_domain"],
+                            choices=["per_url", "multi_domain"], help="spider modes to compare")
+    arg_parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = arg_parser.parse_args(argv)
+
+    if args.child:
+        seeds, mode, directory = args.child
+        run_child(int(seeds), mode == "multi_domain", directory)
+        return
+
+    print("{0:>7} {1:<13} {2:>10} {3:>12} {4:>8} {5:>8} {6:>10}".format("seeds", "mode", "time [s]", "max rss [MB]",
+                                                                     "fds", "threads", "csv files"))
+    for seeds in args.seeds:
+        for mode in args.modes:
+            result = measure(seeds, mode)
+            if result.get("time") is None:
+                print("{0:>7} {1:<13} {2}".format(seeds, mode, result["error"]))
+                continue
+            print("{0:>7} {1:<13} {2:>10.1f} {3:>12.0f} {4:>8} {5:>8} {6:>10}{7}".format(
+                seeds, mode, result["time"], result["max_rss_mb"], result["fds"], result["threads"],
+                result["csv_files"], "  " + result["error"] if result["error"] else ""))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,52 @@
+"""
+Micro-benchmark of textract_pdf.utils.BaseParser.decode on large extracted texts.
+
+Compares the former full-body chardet detection against the fast path (declared encoding, strict UTF-8, chardet on a
+bounded sample) for UTF-8 and latin-1 encoded texts of several megabytes.
+
+Run from the src directory:
+    python -m benchmarks.bench_textract_decode [--size MB]
+"""
+import argparse
+import sys
+import time
+
+import chardet
+
+from textract_pdf.utils import BaseParser
+
+
+PARAGRAPH = ("Die Stadtverwaltung informiert über die neuen Öffnungszeiten des Bürgerbüros. "
+             "Weitere Informationen erhalten Sie bei unserer Geschäftsstelle in der Hauptstraße.\n")
+
+
+def full_chardet(text):
+    return text.decode(chardet.detect(text)['encoding'])
+
+
+def measure(name, func, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(text)
+    elapsed = (time.perf_counter() - start) / repeat
+    print("{0:<40} {1:>8.1f} MB {2:>10.4f} s {3:>10.1f} MB/s".format(name, len(text) / 1024 ** 2, elapsed,
+                                                                   len(text) / 1024 ** 2 / elapsed))
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--size", type=float, default=4, help="size of the extracted text in MB")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    text = PARAGRAPH * int(args.size * 1024 ** 2 / len(PARAGRAPH.encode("utf-8")))
+    parser = BaseParser()
+    for encoding in ("utf-8", "latin-1"):
+        encoded = text.encode(encoding)
+        measure("full chardet ({0})".format(encoding), full_chardet, encoded, args.repeat)
+        measure("declared encoding ({0})".format(encoding), lambda t: parser.decode(t, encoding), encoded, args.repeat)
+        measure("fast path, undeclared ({0})".format(encoding), parser.decode, encoded, args.repeat)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,159 @@
+"""
+Benchmark of the paragraphs collected within a fixed budget of pages, breadth-first order against yield priorities
+(YIELD_PRIORITY_ENABLED).
+
+A synthetic download handler without network access serves a site of the same domain with three sections, every page
+links two new pages of each section:
+
+* /artikel/: German paragraphs, links with descriptive anchor text
+* /kalender/: a calendar trap without paragraphs, links with dates as anchor text
+* /archiv/: French paragraphs, which the language filter rejects
+
+Every page is answered after a simulated network latency of 50 ms. The spider stops after ``--pages`` pages
+(CLOSESPIDER_PAGECOUNT). Each run takes place in a subprocess, which reports its wall time, the number of paragraphs
+and the paragraphs per page.
+
+Run from the src directory:
+    python -m benchmarks.bench_yield_priority [--pages N [N ...]] [--weight N]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
+
+from scrapy.http import HtmlResponse
+from twisted.internet import reactor, task
+
+SECTIONS = {
+    "artikel": ("<p>Die Stadtverwaltung informiert über die neuen Öffnungszeiten des Bürgerbüros am Marktplatz.</p>"
+                "<p>Weitere Informationen erhalten Sie bei unserer Geschäftsstelle in der Innenstadt.</p>"
+                "<p>Der Gemeinderat hat in seiner letzten Sitzung den Haushalt für das kommende Jahr beschlossen.</p>",
+                "Bericht über {0}"),
+    "kalender": ("", "{0}"),
+    "archiv": ("<p>La mairie informe les habitants des nouveaux horaires d'ouverture du bureau des citoyens.</p>"
+               "<p>Pour plus d'informations, veuillez contacter notre secrétariat au centre-ville.</p>",
+               "Archives {0}")
+}
+FANOUT = 2
+# without a network latency the downloads would outpace the parsing of the pages, the links of the pages with
+# paragraphs would then only be queued after those of the pages without
+LATENCY = 0.05
+
+PAGE = "<html><body>{0}{1}</body></html>"
+
+
+class SyntheticHttpHandler:
+    """
+    Download handler that answers /<section>/<id>.html after LATENCY seconds, every page links FANOUT new pages of each
+    section
+    """
+
+    lazy = False
+
+    def __init__(self, settings=None, crawler=None):
+        pass
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings, crawler)
+
+    def download_request(self, request, spider):
+        parts = urlparse(request.url).path.strip("/").split("/")
+        section, page_id = (parts[0], parts[1][:-len(".html")]) if len(parts) == 2 else ("artikel", "0")
+        links = "".join("<a href='/{0}/{1}-{2}{3}.html'>{4}</a>".format(
+            name, page_id, name[0], i, SECTIONS[name][1].format("{0}-{1}".format(page_id, i)))
+            for name in SECTIONS for i in range(FANOUT))
+        body = PAGE.format(SECTIONS.get(section, SECTIONS["artikel"])[0], links)
+        return task.deferLater(reactor, LATENCY, HtmlResponse, request.url, body=body.encode("utf-8"),
+                               encoding="utf-8", request=request, headers={"Content-Type": "text/html; charset=utf-8"})
+
+
+def run_child(pages, weight, order, directory):
+    """ Crawl the synthetic site in this process and write the measurements to <directory>/result.json """
+    from scrapy.crawler import CrawlerProcess
+
+    import scrapy_wrapper
+    from shared import CrawlSpecification
+
+    spec = CrawlSpecification(name="bench",
+                              output=os.path.join(directory, "out"),
+                              logs=os.path.join(directory, "logs"),
+                              urls=["http://yield.test/artikel/0.html"],
+                              parser="parsers.ParagraphParser",
+                              parser_data={"allowed_languages": ["de"], "xpaths": ["//p"]},
+                              pipelines={"pipelines.Paragraph2CsvPipeline": 300})
+    os.makedirs(spec.logs, exist_ok=True)
+
+    settings = scrapy_wrapper.GenericScrapySettings()
+    settings.set("ITEM_PIPELINES", spec.pipelines)
+    settings.set("LOG_FILE", os.path.join(spec.logs, "scrapy.log"))
+    settings.set("DOWNLOAD_HANDLERS", {"http": "benchmarks.bench_yield_priority.SyntheticHttpHandler"})
+    settings.set("TELNETCONSOLE_ENABLED", False)
+    settings.set("ROBOTSTXT_OBEY", False)
+    settings.set("CLOSESPIDER_PAGECOUNT", pages)
+    settings.set("DEPTH_LIMIT", 0)
+    settings.set("YIELD_PRIORITY_ENABLED", order == "yield")
+    settings.set("YIELD_PRIORITY_WEIGHT", weight)
+
+    result = {"error": None}
+    start = time.perf_counter()
+    try:
+        process = CrawlerProcess(settings=settings)
+        crawlers = scrapy_wrapper.add_spiders(process, spec)
+        process.start()
+        stats = crawlers[0].stats.get_stats()
+        result["pages"] = stats.get("response_received_count", 0)
+        result["items"] = stats.get("item_scraped_count", 0)
+    except Exception as exc:
+        result["error"] = "{0}: {1}".format(type(exc).__name__, exc)
+    result["time"] = time.perf_counter() - start
+
+    with open(os.path.join(directory, "result.json"), "w") as result_file:
+        json.dump(result, result_file)
+
+
+def measure(pages, weight, order):
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.devnull, "w") as devnull:
+            subprocess.run([sys.executable, "-m", "benchmarks.bench_yield_priority", "--child", str(pages),
+                            str(weight), order, directory], stdout=devnull, stderr=devnull)
+        result_path = os.path.join(directory, "result.json")
+        if not os.path.exists(result_path):
+            return {"error": "subprocess failed"}
+        with open(result_path) as result_file:
+            return json.load(result_file)
+
+
+def main(argv):
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--pages", type=int, nargs="+", default=[500, 2000],
+                            help="numbers of pages after which the spider stops")
+    arg_parser.add_argument("--weight", type=int, default=4, help="YIELD_PRIORITY_WEIGHT of the yield order")
+    arg_parser.add_argument("--child", nargs=4, help=argparse.SUPPRESS)
+    args = arg_parser.parse_args(argv)
+
+    if args.child:
+        pages, weight, order, directory = args.child
+        run_child(int(pages), int(weight), order, directory)
+        return
+
+    print("{0:>7} {1:<14} {2:>10} {3:>10} {4:>16}".format("pages", "order", "time [s]", "paragraphs",
+                                                           "paragraphs/page"))
+    for pages in args.pages:
+        for order in ["breadth-first", "yield"]:
+            result = measure(pages, args.weight, order)
+            if result.get("time") is None:
+                print("{0:>7} {1:<14} {2}".format(pages, order, result["error"]))
+                continue
+            print("{0:>7} {1:<14} {2:>10.1f} {3:>10} {4:>16.2f}{5}".format(
+                pages, order, result["time"], result.get("items", 0),
+                result.get("items", 0) / max(1, result.get("pages", 0)),
+                "  " + result["error"] if result["error"] else ""))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
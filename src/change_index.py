@@ -0,0 +1,137 @@
+"""
+Created on 18.10.2026
+
+@author: Maximilian Pensel
+
+Copyright 2019 Maximilian Pensel <maximilian.pensel@gmx.de>
+
+This file is part of OWS-scrapy-wrapper.
+
+OWS-scrapy-wrapper is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+OWS-scrapy-wrapper is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with OWS-scrapy-wrapper.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import hashlib
+import json
+import os
+from array import array
+
+
+class ChangeIndex:
+    """
+    ETag, Last-Modified header, body hash and followed links of the pages of one output (a spider, or a domain of a
+    multi-domain spider) in the previous crawl, and the same information of the current crawl, which replaces the
+    previous one once it is saved.
+
+    The index is stored in <directory>/<name>.changes.jsonl, one json list per url: [url, etag, last modified, body
+    hash, link ids]. Link ids are line numbers in the same file, urls that were only linked consist of [url] alone.
+    """
+
+    NEW = "new"
+    CHANGED = "changed"
+    UNCHANGED = "unchanged"
+    NOT_MODIFIED = "not_modified"
+
+    SUFFIX = ".changes.jsonl"
+
+    def __init__(self, directory, name):
+        self.path = os.path.join(directory, name + ChangeIndex.SUFFIX)
+
+        self.previous_urls = []  # urls of the previous crawl by id
+        self.previous = dict()  # url -> (etag, last modified, body hash, link ids) of the previous crawl
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as index_file:
+                for line in index_file:
+                    entry = json.loads(line)
+                    self.previous_urls.append(entry[0])
+                    if len(entry) > 1:
+                        self.previous[entry[0]] = (entry[1], entry[2], entry[3], array("I", entry[4]))
+
+        self.urls = []  # urls of the current crawl by id
+        self.ids = dict()
+        self.current = dict()  # url -> (etag, last modified, body hash, link ids) of the current crawl
+
+    def id(self, url):
+        if url not in self.ids:
+            self.ids[url] = len(self.urls)
+            self.urls.append(url)
+        return self.ids[url]
+
+    def conditional_headers(self, url):
+        """ Return the headers of a conditional request for ``url``, based on the previous crawl """
+        headers = dict()
+        if url in self.previous:
+            etag, last_modified, _, _ = self.previous[url]
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        return headers
+
+    @staticmethod
+    def body_hash(body):
+        return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+    def check(self, response):
+        """ Record ``response`` in the current crawl, returns whether it is NEW, CHANGED, UNCHANGED or NOT_MODIFIED """
+        url = response.url
+        if response.status == 304 and url in self.previous:
+            self.keep(url)
+            return ChangeIndex.NOT_MODIFIED
+
+        header = lambda name: response.headers.get(name, b"").decode("latin-1") or None
+        body_hash = ChangeIndex.body_hash(response.body)
+        self.current[url] = (header(b"ETag"), header(b"Last-Modified"), body_hash, array("I"))
+        if url not in self.previous:
+            return ChangeIndex.NEW
+        if self.previous[url][2] != body_hash:
+            return ChangeIndex.CHANGED
+        self.set_links(url, self.previous_links(url))
+        return ChangeIndex.UNCHANGED
+
+    def keep(self, url):
+        """ Take over the entry of ``url`` from the previous crawl """
+        etag, last_modified, body_hash, _ = self.previous[url]
+        self.current[url] = (etag, last_modified, body_hash, array("I"))
+        self.set_links(url, self.previous_links(url))
+
+    def previous_links(self, url):
+        """ Return the urls of the links followed from ``url`` in the previous crawl """
+        if url not in self.previous:
+            return []
+        return [self.previous_urls[link_id] for link_id in self.previous[url][3]]
+
+    def set_links(self, url, links):
+        """ Set the urls of the links followed from ``url`` in the current crawl """
+        self.current[url] = self.current[url][:3] + (array("I", (self.id(link) for link in links)),)
+
+    def save(self, complete=True):
+        """
+        Replace the previous crawl by the current one. Unless the current crawl is ``complete``, the entries of the
+        previous crawl are kept for all urls that were not crawled again.
+        """
+        if not complete:
+            for url in self.previous:
+                if url not in self.current:
+                    self.keep(url)
+        for url in self.current:
+            self.id(url)
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as index_file:
+            for url in self.urls:
+                entry = [url]
+                if url in self.current:
+                    etag, last_modified, body_hash, links = self.current[url]
+                    entry.extend((etag, last_modified, body_hash, links.tolist()))
+                index_file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.replace(self.path + ".tmp", self.path)
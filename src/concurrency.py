@@ -0,0 +1,130 @@
+"""
+Created on 18.10.2026
+
+@author: Maximilian Pensel
+
+Copyright 2019 Maximilian Pensel <maximilian.pensel@gmx.de>
+
+This file is part of OWS-scrapy-wrapper.
+
+OWS-scrapy-wrapper is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+OWS-scrapy-wrapper is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with OWS-scrapy-wrapper.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+class DomainState:
+    """ Concurrency of a domain and the observations of the current window """
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.responses = 0
+        self.errors = 0
+        self.latency = 0.0  # sum of the latencies of the window
+        self.latencies = 0  # number of responses with a latency
+        self.saturated = False  # whether all concurrent requests were in use during the window
+        self.cooldown = 0  # responses to requests sent before the last decrease, which are not judged again
+
+    def reset(self):
+        self.responses = 0
+        self.errors = 0
+        self.latency = 0.0
+        self.latencies = 0
+        self.saturated = False
+
+
+class AdaptiveConcurrency:
+    """
+    Chooses the number of concurrent requests per domain (download slot) in [min_concurrency, max_concurrency] by
+    additive increase and multiplicative decrease.
+
+    Responses '429 Too Many Requests' and '503 Service Unavailable' halve the concurrency of their domain right away.
+    All other responses are judged in windows of ``window`` responses: the concurrency is halved if more than
+    ``max_error_rate`` of them failed (server errors, timeouts and connection errors) or if their mean latency exceeds
+    ``target_latency`` seconds, and it is increased by one if the domain used all of its concurrent requests during
+    the window. Responses to requests that were sent before a decrease are not judged again.
+    """
+
+    INCREASE = "increase"
+    HOLD = "hold"
+    THROTTLED = "throttled"
+    ERRORS = "errors"
+    LATENCY = "latency"
+
+    THROTTLE_STATUS = {429, 503}
+    BACKOFF = 0.5
+
+    DEFAULT_MIN_CONCURRENCY = 1
+    DEFAULT_MAX_CONCURRENCY = 32
+    DEFAULT_TARGET_LATENCY = 2.0
+    DEFAULT_MAX_ERROR_RATE = 0.1
+    DEFAULT_WINDOW = 20
+
+    def __init__(self, min_concurrency=DEFAULT_MIN_CONCURRENCY, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 target_latency=DEFAULT_TARGET_LATENCY, max_error_rate=DEFAULT_MAX_ERROR_RATE, window=DEFAULT_WINDOW):
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.window = max(1, window)
+        self.domains = dict()
+
+    def concurrency(self, key, default):
+        """ Return the concurrency of the domain ``key``, which starts at ``default`` within the bounds """
+        if key not in self.domains:
+            self.domains[key] = DomainState(min(self.max_concurrency, max(self.min_concurrency, default)))
+        return self.domains[key].concurrency
+
+    def record(self, key, default, status=None, latency=None, in_use=0):
+        """
+        Record a response of the domain ``key`` with ``status`` (None for failed downloads) and ``latency``, while
+        ``in_use`` requests of the domain, including this one, were being downloaded. Returns the decision if the
+        concurrency of the domain was judged, None otherwise.
+        """
+        self.concurrency(key, default)
+        state = self.domains[key]
+        if state.cooldown > 0:
+            state.cooldown -= 1
+            return None
+
+        if status in AdaptiveConcurrency.THROTTLE_STATUS:
+            return self.decrease(state, AdaptiveConcurrency.THROTTLED, in_use)
+
+        state.responses += 1
+        if status is None or status >= 500:
+            state.errors += 1
+        if latency is not None:
+            state.latency += latency
+            state.latencies += 1
+        if in_use >= state.concurrency:
+            state.saturated = True
+
+        if state.responses < self.window:
+            return None
+        if state.errors > self.max_error_rate * state.responses:
+            return self.decrease(state, AdaptiveConcurrency.ERRORS, in_use)
+        if state.latencies and state.latency / state.latencies > self.target_latency:
+            return self.decrease(state, AdaptiveConcurrency.LATENCY, in_use)
+
+        decision = AdaptiveConcurrency.HOLD
+        if state.saturated and state.concurrency < self.max_concurrency:
+            state.concurrency += 1
+            decision = AdaptiveConcurrency.INCREASE
+        state.reset()
+        return decision
+
+    def decrease(self, state, reason, in_use):
+        # the other requests under way were sent at the former concurrency
+        state.cooldown = max(0, in_use - 1)
+        state.concurrency = max(self.min_concurrency, int(state.concurrency * AdaptiveConcurrency.BACKOFF))
+        state.reset()
+        return reason
@@ -0,0 +1,289 @@
+"""
+Created on 18.10.2026
+
+@author: Maximilian Pensel
+
+Copyright 2019 Maximilian Pensel <maximilian.pensel@gmx.de>
+
+This file is part of OWS-scrapy-wrapper.
+
+OWS-scrapy-wrapper is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+OWS-scrapy-wrapper is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with OWS-scrapy-wrapper.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import weakref
+from collections import deque
+
+import numpy as np
+from scrapy import signals
+from scrapy.dupefilters import BaseDupeFilter
+from scrapy.utils.job import job_dir
+
+
+class FingerprintSet:
+    """
+    Set of 64 bit request fingerprints at 8 bytes per fingerprint. Fingerprints are kept in a sorted array and found by
+    binary search, new fingerprints are collected in a set, which is merged into the array once it holds more than an
+    eighth of the sorted fingerprints. The set is saved to and loaded from a raw file of sorted uint64 values.
+    """
+
+    MIN_MERGE = 4096
+
+    def __init__(self, fingerprints=None):
+        self.sorted = np.zeros(0, dtype=np.uint64) if fingerprints is None else fingerprints
+        self.recent = set()
+
+    def __len__(self):
+        return len(self.sorted) + len(self.recent)
+
+    def __contains__(self, fingerprint):
+        if fingerprint in self.recent:
+            return True
+        position = np.searchsorted(self.sorted, np.uint64(fingerprint))
+        return position < len(self.sorted) and int(self.sorted[position]) == fingerprint
+
+    def add(self, fingerprint):
+        """ Add ``fingerprint``, returns False if it was already contained """
+        if fingerprint in self:
+            return False
+        self.recent.add(fingerprint)
+        if len(self.recent) >= max(FingerprintSet.MIN_MERGE, len(self.sorted) // 8):
+            self.merge()
+        return True
+
+    def merge(self):
+        if not self.recent:
+            return
+        new = np.fromiter(self.recent, dtype=np.uint64, count=len(self.recent))
+        new.sort()
+        self.sorted = np.insert(self.sorted, np.searchsorted(self.sorted, new), new)
+        self.recent = set()
+
+    def save(self, path):
+        self.merge()
+        self.sorted.tofile(path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        return cls(np.fromfile(path, dtype=np.uint64))
+
+
+class SeenRequestsFilter(BaseDupeFilter):
+    """
+    Duplicate request filter that keeps the fingerprints of seen requests in a FingerprintSet instead of scrapy's set
+    of hex strings. With a JOBDIR, the fingerprints are saved to <JOBDIR>/requests.fingerprints when the spider closes
+    and loaded again when the job is resumed.
+    """
+
+    FILENAME = "requests.fingerprints"
+
+    def __init__(self, path=None, debug=False, fingerprinter=None):
+        self.file = os.path.join(path, SeenRequestsFilter.FILENAME) if path else None
+        self.fingerprints = FingerprintSet.load(self.file) if self.file and os.path.exists(self.file) \
+            else FingerprintSet()
+        self.fingerprinter = fingerprinter
+        self.debug = debug
+        self.logdupes = True
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_settings(cls, settings, fingerprinter=None):
+        return cls(job_dir(settings), settings.getbool("DUPEFILTER_DEBUG"), fingerprinter)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls.from_settings(crawler.settings, getattr(crawler, "request_fingerprinter", None))
+
+    def fingerprint(self, request):
+        """ Return the first 64 bits of the request fingerprint as integer """
+        if self.fingerprinter is not None:
+            return int.from_bytes(self.fingerprinter.fingerprint(request)[:8], "big")
+        from scrapy.utils.request import request_fingerprint  # scrapy < 2.7
+        return int(request_fingerprint(request)[:16], 16)
+
+    def request_seen(self, request):
+        return not self.fingerprints.add(self.fingerprint(request))
+
+    def close(self, reason):
+        if self.file:
+            self.fingerprints.save(self.file)
+
+    def log(self, request, spider):
+        if self.debug:
+            self.logger.debug("Filtered duplicate request: %(request)s", {"request": request},
+                              extra={"spider": spider})
+        elif self.logdupes:
+            self.logger.debug("Filtered duplicate request: %(request)s - no more duplicates will be shown "
+                              "(see DUPEFILTER_DEBUG to show all duplicates)", {"request": request},
+                              extra={"spider": spider})
+            self.logdupes = False
+        spider.crawler.stats.inc_value("dupefilter/filtered", spider=spider)
+
+
+class HeadBudget:
+    """ Number of requests that the SpillingQueues of one downloader slot may keep in memory together """
+
+    def __init__(self, size):
+        self.size = size
+        self.used = 0
+
+    def available(self):
+        return self.size - self.used
+
+
+# budgets of the slots that have queues, by (id of the crawler, slot)
+_BUDGETS = weakref.WeakValueDictionary()
+
+
+def head_budget(crawler, key, size):
+    """
+    Return the budget shared by the queues of the downloader slot of ``key``. Scrapy's priority queues name their
+    downstream queues "<slot key>/<priority>", i.e. all priorities of a slot (or of the crawl without
+    DownloaderAwarePriorityQueue) share one budget.
+    """
+    if crawler is None:
+        return HeadBudget(size)
+    slot = (id(crawler), key.rpartition("/")[0])
+    budget = _BUDGETS.get(slot)
+    if budget is None:
+        budget = _BUDGETS[slot] = HeadBudget(size)
+    return budget
+
+
+class SpillingQueue:
+    """
+    FIFO request queue of the scheduler (SCHEDULER_MEMORY_QUEUE) that keeps requests in memory within a budget of
+    FRONTIER_HEAD_SIZE requests, which is shared by the queues of all priorities of a downloader slot. Further requests
+    are kept as (url, depth, priority) entries, which are written to segment files of FRONTIER_HEAD_SIZE entries each in
+    a temporary directory below FRONTIER_SPILL_DIR (default: the system's temporary directory). Once the requests in
+    memory are used up, entries are read back a segment at a time and turned into requests as far as the budget allows,
+    at least one at a time.
+
+    Only requests that the spider can rebuild from their entry are spilled, see frontier_entry and frontier_request of
+    the spiders of scrapy_wrapper, other requests (e.g. retries) are kept in memory beyond the budget and are popped
+    ahead of spilled requests. The numbers of requests in memory and of entries on disk (including those read back but
+    not turned into requests yet) over all queues of a crawler are kept in the scrapy stats (frontier/memory,
+    frontier/disk), together with their maximum (frontier/memory_max, frontier/disk_max).
+    """
+
+    DEFAULT_HEAD_SIZE = 1000
+    SEGMENT_SUFFIX = ".seg"
+
+    def __init__(self, crawler=None, key=""):
+        self.head = deque()  # requests in memory, in queue order
+        self.loaded = deque()  # entries read back from a segment that are not turned into requests yet
+        self.tail = []  # entries after the segments, which are not written yet
+        self.segments = deque()  # paths of the written segments, oldest first
+        self.spilled = 0  # number of entries in loaded, segments and tail
+        self.directory = None
+        self.written = 0
+
+        self.spider = getattr(crawler, "spider", None)
+        self.stats = getattr(crawler, "stats", None)
+        settings = getattr(crawler, "settings", None)
+        self.head_size = max(1, settings.getint("FRONTIER_HEAD_SIZE", SpillingQueue.DEFAULT_HEAD_SIZE)) \
+            if settings is not None else SpillingQueue.DEFAULT_HEAD_SIZE
+        self.budget = head_budget(crawler, key, self.head_size)
+        self.spill_dir = settings.get("FRONTIER_SPILL_DIR") if settings is not None else None
+        if not hasattr(self.spider, "frontier_entry"):
+            self.spider = None  # requests of other spiders can not be rebuilt, nothing is spilled
+        if crawler is not None:
+            # the scheduler only closes its memory queues once they are empty
+            crawler.signals.connect(self.close, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler, key="", *args, **kwargs):
+        return cls(crawler, key)
+
+    def __len__(self):
+        return len(self.head) + self.spilled
+
+    def count(self, name, change):
+        if name == "memory":
+            self.budget.used += change
+        if self.stats is None or not change:
+            return
+        key = "frontier/" + name
+        self.stats.inc_value(key, change, spider=self.spider)
+        self.stats.max_value(key + "_max", self.stats.get_value(key), spider=self.spider)
+
+    def push(self, request):
+        entry = None
+        if self.spider is not None and (self.spilled or self.budget.available() <= 0):
+            entry = self.spider.frontier_entry(request)
+        if entry is None:
+            self.head.append(request)
+            self.count("memory", 1)
+            return
+
+        self.tail.append(entry)
+        self.spilled += 1
+        self.count("disk", 1)
+        if len(self.tail) >= self.head_size:
+            self.write_segment()
+
+    def pop(self):
+        if not self.head and self.spilled:
+            self.load()
+        if not self.head:
+            return None
+        self.count("memory", -1)
+        return self.head.popleft()
+
+    def peek(self):
+        if not self.head and self.spilled:
+            self.load()
+        return self.head[0] if self.head else None
+
+    def write_segment(self):
+        if self.directory is None:
+            if self.spill_dir:
+                os.makedirs(self.spill_dir, exist_ok=True)
+            self.directory = tempfile.mkdtemp(prefix="frontier-", dir=self.spill_dir)
+        path = os.path.join(self.directory, str(self.written) + SpillingQueue.SEGMENT_SUFFIX)
+        with open(path, "w", encoding="utf-8") as segment:
+            segment.writelines("{1}\t{2}\t{0}\n".format(*entry) for entry in self.tail)
+        self.written += 1
+        self.segments.append(path)
+        self.tail = []
+
+    def load(self):
+        """ Turn the oldest entries into requests in memory, as many as the budget of the slot allows """
+        if not self.loaded:
+            if self.segments:
+                path = self.segments.popleft()
+                with open(path, "r", encoding="utf-8") as segment:
+                    entries = [line.rstrip("\n").split("\t", 2) for line in segment]
+                os.remove(path)
+                self.loaded.extend((url, int(depth), int(priority)) for depth, priority, url in entries)
+            else:
+                self.loaded, self.tail = deque(self.tail), []
+
+        count = min(len(self.loaded), max(1, self.budget.available()))
+        for _ in range(count):
+            self.head.append(self.spider.frontier_request(*self.loaded.popleft()))
+        self.spilled -= count
+        self.count("disk", -count)
+        self.count("memory", count)
+
+    def close(self):
+        self.count("memory", -len(self.head))
+        self.count("disk", -self.spilled)
+        self.head, self.loaded, self.tail, self.segments, self.spilled = deque(), deque(), [], deque(), 0
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
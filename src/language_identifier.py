@@ -0,0 +1,109 @@
+"""
+Created on 17.10.2026
+
+@author: Maximilian Pensel
+
+Copyright 2019 Maximilian Pensel <maximilian.pensel@gmx.de>
+
+This file is part of OWS-scrapy-wrapper.
+
+OWS-scrapy-wrapper is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+OWS-scrapy-wrapper is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with OWS-scrapy-wrapper.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import hashlib
+
+from langdetect import detect_langs
+from langdetect.language import Language
+from langdetect.lang_detect_exception import LangDetectException, ErrorCode
+
+import shared
+
+
+class LanguageIdentifier:
+    """
+    Language identification for all paragraphs of a page in a single pass.
+
+    Every paragraph is classified at most once per cache lifetime: results are stored in a bounded LRU cache keyed by
+    the hash of the whitespace-normalized paragraph, so that boilerplate repeated on every page of a site is only
+    detected once. The page-level distribution is not obtained by classifying the concatenated page again, instead
+    it is the length-weighted mixture of the paragraph distributions.
+    """
+
+    DEFAULT_CACHE_SIZE = 50000
+    DEFAULT_MIN_LENGTH = 0
+
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, min_length=DEFAULT_MIN_LENGTH):
+        self.cache = shared.LRUCache(cache_size)
+        self.min_length = min_length
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(text.split())
+
+    @staticmethod
+    def paragraph_key(normalized):
+        return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+
+    def detect_paragraph(self, text):
+        """
+        Return the language distribution of ``text`` as a list of langdetect Language objects, sorted by probability.
+        Returns None if the paragraph is shorter than the minimum length and the LangDetectException instance if
+        langdetect was unable to classify it.
+        """
+        normalized = LanguageIdentifier.normalize(text)
+        if len(normalized) < self.min_length:
+            return None
+
+        key = LanguageIdentifier.paragraph_key(normalized)
+        result = self.cache.get(key)
+        if result is None:
+            try:
+                result = detect_langs(normalized)
+            except LangDetectException as exc:
+                result = exc
+            self.cache.put(key, result)
+
+        return result
+
+    def detect_page(self, paragraphs):
+        """
+        Classify all ``paragraphs`` of a page at once.
+        :param paragraphs: list of paragraph strings
+        :return: tuple (paragraph_results, page_languages), where paragraph_results holds the result of
+                 :meth:`detect_paragraph` for every paragraph and page_languages is the page-level distribution as a
+                 sorted list of Language objects, or a LangDetectException if no paragraph could be classified.
+        """
+        paragraph_results = []
+        weights = dict()
+        total = 0
+        for text in paragraphs:
+            result = self.detect_paragraph(text)
+            paragraph_results.append(result)
+            if isinstance(result, list) and result:
+                length = len(text)
+                total += length
+                for lang in result:
+                    weights[lang.lang] = weights.get(lang.lang, 0) + lang.prob * length
+
+        if not total:
+            return paragraph_results, LangDetectException(ErrorCode.CantDetectError, "No features in text.")
+
+        page_languages = sorted([Language(lang, weight / total) for lang, weight in weights.items()], reverse=True)
+        return paragraph_results, page_languages
+
+    @staticmethod
+    def top_language(result):
+        """ Reduce a result of :meth:`detect_paragraph` to what langdetect.detect would have returned """
+        if isinstance(result, list):
+            return result[0].lang if result else "unknown"
+        return result
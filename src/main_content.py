@@ -0,0 +1,129 @@
+"""
+Created on 17.10.2026
+
+@author: Maximilian Pensel
+
+Copyright 2019 Maximilian Pensel <maximilian.pensel@gmx.de>
+
+This file is part of OWS-scrapy-wrapper.
+
+OWS-scrapy-wrapper is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+OWS-scrapy-wrapper is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with OWS-scrapy-wrapper.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import re
+
+
+class MainContentExtractor:
+    """
+    Separates the main content of an html page from boilerplate (navigation, cookie banners, footers, link lists).
+    Sections are recognized as boilerplate by their tag or by their id and class names, single text blocks by their
+    text and link density, similar to the densitometric approach of Kohlschuetter et al.
+
+    The tree is not modified, instead ``boilerplate`` returns the set of elements whose entire subtree is
+    boilerplate, so that the same tree can still be used for link extraction.
+    """
+
+    DEFAULT_MAX_LINK_DENSITY = 0.5
+    DEFAULT_MIN_TEXT_DENSITY = 5
+
+    # text density is measured in words per line of LINE_WIDTH characters
+    LINE_WIDTH = 80
+
+    # elements that are boilerplate by definition
+    BOILERPLATE_TAGS = {"nav", "footer", "aside", "menu"}
+    BOILERPLATE_NAMES = re.compile(r"(?:^|[\s_\-])(?:nav|navbar|navigation|menu|footer|sidebar|breadcrumbs?|"
+                                   r"cookies?|consent|banner|share|social|newsletter|skip)(?:$|[\s_\-])",
+                                   re.IGNORECASE)
+    # elements whose text is not part of the page text
+    INVISIBLE_TAGS = {"script", "style", "noscript", "template"}
+    # elements that are never classified as boilerplate
+    ROOT_TAGS = {"html", "body"}
+
+    def __init__(self, max_link_density=DEFAULT_MAX_LINK_DENSITY, min_text_density=DEFAULT_MIN_TEXT_DENSITY):
+        self.max_link_density = max_link_density
+        self.min_text_density = min_text_density
+
+    @staticmethod
+    def text_stats(text):
+        """ Return (characters, words) of ``text`` """
+        if not text:
+            return 0, 0
+        return len(text.strip()), len(text.split())
+
+    def block_stats(self, root):
+        """
+        Compute (characters, words, link characters) for every element below ``root`` in a single bottom-up pass over
+        the tree. Characters and words include the text of all descendants.
+        """
+        stats = dict()
+        for element in reversed(list(root.iter())):
+            if not isinstance(element.tag, str) or element.tag in MainContentExtractor.INVISIBLE_TAGS:
+                # comments, processing instructions and scripts only contribute their tail, see below
+                stats[element] = (0, 0, 0)
+                continue
+
+            chars, words = MainContentExtractor.text_stats(element.text)
+            link_chars = 0
+            for child in element:
+                child_chars, child_words, child_link_chars = stats[child]
+                tail_chars, tail_words = MainContentExtractor.text_stats(child.tail)
+                chars += child_chars + tail_chars
+                words += child_words + tail_words
+                link_chars += child_link_chars
+            if element.tag == "a":
+                link_chars = chars
+            stats[element] = (chars, words, link_chars)
+        return stats
+
+    def text_density(self, chars, words):
+        return words / max(1.0, chars / MainContentExtractor.LINE_WIDTH)
+
+    def is_boilerplate(self, element, chars, words, link_chars, page_chars, candidate=False):
+        if element.tag in MainContentExtractor.ROOT_TAGS:
+            return False
+
+        if element.tag in MainContentExtractor.BOILERPLATE_TAGS:
+            return True
+        if chars <= page_chars / 2:
+            # id and class names are only trusted if the element does not hold most of the page text, since page
+            # wrappers are often named after a state of the navigation (e.g. "nav-open")
+            names = " ".join((element.get("id", ""), element.get("class", "")))
+            if names.strip() and MainContentExtractor.BOILERPLATE_NAMES.search(names):
+                return True
+
+        if not candidate:
+            # containers are not judged by their density, a link list next to the article would discard the article
+            return False
+        if chars == 0:
+            return False  # empty blocks produce no paragraphs anyway
+        if link_chars / chars > self.max_link_density:
+            return True
+        return self.text_density(chars, words) < self.min_text_density
+
+    def boilerplate(self, root, candidates=()):
+        """
+        Return the set of elements below ``root`` that are classified as boilerplate. All elements are classified by
+        their tag, id and class, the elements in ``candidates`` (i.e. the matched paragraph nodes) also by their text
+        and link density.
+        """
+        stats = self.block_stats(root)
+        page_chars = stats[root][0]
+        candidates = set(candidates)
+
+        boilerplate = set()
+        for element, (chars, words, link_chars) in stats.items():
+            if not isinstance(element.tag, str):
+                continue
+            if self.is_boilerplate(element, chars, words, link_chars, page_chars, candidate=element in candidates):
+                boilerplate.add(element)
+        return boilerplate
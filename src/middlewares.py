@@ -0,0 +1,243 @@
+"""
+Created on 17.10.2026
+
+@author: Maximilian Pensel
+
+Copyright 2019 Maximilian Pensel <maximilian.pensel@gmx.de>
+
+This file is part of OWS-scrapy-wrapper.
+
+OWS-scrapy-wrapper is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+OWS-scrapy-wrapper is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with OWS-scrapy-wrapper.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+
+import scrapy
+from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+
+from concurrency import AdaptiveConcurrency
+
+try:
+    # scrapy >= 2.5 allows to stop downloads as soon as the response headers arrived
+    from scrapy.exceptions import StopDownload
+except ImportError:
+    StopDownload = None
+
+logger = logging.getLogger(__name__)
+
+
+class ContentGated(IgnoreRequest):
+    """ Raised when a response is dropped because its content type is not parsed or its body is too large """
+
+
+def is_gated(failure):
+    """ True if ``failure`` stems from a download cancelled by the ContentTypeGateMiddleware """
+    if StopDownload is not None and failure.check(StopDownload):
+        return True
+    return failure.check(ContentGated) is not None
+
+
+###
+# Downloader Middlewares
+###
+
+class ContentTypeGateMiddleware:
+    """
+    Cancels downloads whose content type has no callback in the spider's parser, or whose body exceeds the maximum
+    size configured for its content type (parser_data 'max_body_size'). Html pages always pass the content type
+    check, the spider follows their links even if the parser does not store them.
+
+    On scrapy >= 2.5, downloads are stopped as soon as the response headers arrived. Older versions can only abort
+    downloads at header time based on the declared Content-Length: if every accepted content type has a maximum size,
+    the largest of them is set as 'download_maxsize' of every request. All other unwanted responses are dropped after
+    the download, before they are parsed.
+    """
+
+    STATS_PREFIX = "content_gate"
+    LINK_CONTENT_TYPES = ["text/html", "application/xhtml+xml"]  # responses whose links are followed
+
+    def __init__(self, crawler):
+        self.stats = crawler.stats
+        self.header_stage = StopDownload is not None and hasattr(signals, "headers_received")
+        if self.header_stage:
+            crawler.signals.connect(self.headers_received, signal=signals.headers_received)
+        else:
+            logger.warning("Scrapy %s can not stop downloads at header time, unwanted content types are dropped after "
+                           "their download", scrapy.__version__)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    @staticmethod
+    def exempt(request, headers):
+        # robots.txt and redirects have to pass regardless of the parser
+        return request.meta.get("dont_obey_robotstxt", False) or b"Location" in headers
+
+    def rejection(self, parser, headers, body_length):
+        """ Return the reason to reject a response with the given headers and body length, None if it is accepted """
+        if not headers.get(b"Content-Type"):
+            return None  # nothing to decide on, leave it to the parser
+
+        content_type = headers.get(b"Content-Type").decode("latin-1").lower()
+        if parser.find_callback(content_type) is None and \
+                not any(ctype in content_type for ctype in ContentTypeGateMiddleware.LINK_CONTENT_TYPES):
+            return "content_type"
+
+        max_size = parser.max_body_size(content_type)
+        if max_size is not None and body_length is not None and body_length > max_size:
+            return "size"
+
+        return None
+
+    def process_request(self, request, spider):
+        parser = getattr(spider, "parser", None)
+        if parser is None or "download_maxsize" in request.meta or self.exempt(request, {}):
+            return None
+
+        max_size = self.max_download_size(parser)
+        if max_size is not None:
+            request.meta["download_maxsize"] = max_size
+
+    @staticmethod
+    def max_download_size(parser):
+        """ Return the largest maximum size of the accepted content types, None if any of them is unbounded """
+        sizes = [parser.max_body_size(ctype)
+                 for ctype in set(parser.callbacks) | set(ContentTypeGateMiddleware.LINK_CONTENT_TYPES)]
+        if not sizes or None in sizes:
+            return None
+        return max(sizes)
+
+    def headers_received(self, headers, body_length, request, spider):
+        parser = getattr(spider, "parser", None)
+        if parser is None or self.exempt(request, headers):
+            return
+
+        reason = self.rejection(parser, headers, body_length if body_length >= 0 else None)
+        if reason:
+            self.stats.inc_value("{0}/cancelled/{1}".format(ContentTypeGateMiddleware.STATS_PREFIX, reason),
+                                 spider=spider)
+            raise StopDownload(fail=True)
+
+    def process_response(self, request, response, spider):
+        parser = getattr(spider, "parser", None)
+        if parser is None or self.exempt(request, response.headers):
+            return response
+
+        reason = self.rejection(parser, response.headers, len(response.body))
+        if reason:
+            self.stats.inc_value("{0}/dropped/{1}".format(ContentTypeGateMiddleware.STATS_PREFIX, reason),
+                                 spider=spider)
+            raise ContentGated("{0} not accepted for {1}".format(reason.replace("_", " "), response))
+
+        return response
+
+
+class ConditionalRequestMiddleware:
+    """
+    Turns requests for pages of the previous crawl into conditional requests (If-None-Match, If-Modified-Since), based
+    on the change index of the spider (see change_index.ChangeIndex). Responses '304 Not Modified' are handed to the
+    spider, which follows the links of the previous crawl instead of parsing the page.
+    """
+
+    def process_request(self, request, spider):
+        find_change_index = getattr(spider, "find_change_index", None)
+        index = find_change_index(request.url) if find_change_index is not None else None
+        if index is None:
+            return None
+
+        headers = index.conditional_headers(request.url)
+        if headers:
+            for name, value in headers.items():
+                request.headers.setdefault(name, value)
+            if 304 not in request.meta.get("handle_httpstatus_list", []):
+                request.meta["handle_httpstatus_list"] = list(request.meta.get("handle_httpstatus_list", [])) + [304]
+
+
+class AdaptiveConcurrencyMiddleware:
+    """
+    Adjusts the number of concurrent requests of every download slot (by default one per domain) with a
+    concurrency.AdaptiveConcurrency controller, based on the latency, status and failures of its downloads. Enabled by
+    the setting ADAPTIVE_CONCURRENCY_ENABLED, the bounds and thresholds of the controller are read from the settings
+    ADAPTIVE_CONCURRENCY_MIN, _MAX, _TARGET_LATENCY, _MAX_ERROR_RATE and _WINDOW. Slots start at
+    CONCURRENT_REQUESTS_PER_DOMAIN (or _PER_IP).
+
+    The middleware has to be placed after the RetryMiddleware (i.e. with a higher order), which would otherwise hide
+    '429' and '503' responses and failed downloads from it. Decisions are counted in the scrapy stats, together with
+    the lowest and highest concurrency of any slot.
+    """
+
+    STATS_PREFIX = "adaptive_concurrency"
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.controller = AdaptiveConcurrency(
+            min_concurrency=settings.getint("ADAPTIVE_CONCURRENCY_MIN", AdaptiveConcurrency.DEFAULT_MIN_CONCURRENCY),
+            max_concurrency=settings.getint("ADAPTIVE_CONCURRENCY_MAX", AdaptiveConcurrency.DEFAULT_MAX_CONCURRENCY),
+            target_latency=settings.getfloat("ADAPTIVE_CONCURRENCY_TARGET_LATENCY",
+                                             AdaptiveConcurrency.DEFAULT_TARGET_LATENCY),
+            max_error_rate=settings.getfloat("ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE",
+                                             AdaptiveConcurrency.DEFAULT_MAX_ERROR_RATE),
+            window=settings.getint("ADAPTIVE_CONCURRENCY_WINDOW", AdaptiveConcurrency.DEFAULT_WINDOW))
+        self.default = settings.getint("CONCURRENT_REQUESTS_PER_IP") or \
+            settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN")
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("ADAPTIVE_CONCURRENCY_ENABLED"):
+            raise NotConfigured
+        return cls(crawler)
+
+    def slot(self, request):
+        downloader = getattr(self.crawler.engine, "downloader", None)
+        key = request.meta.get("download_slot")
+        if downloader is None or key is None:
+            return None, None
+        return key, downloader.slots.get(key)
+
+    def record(self, request, spider, status=None):
+        key, slot = self.slot(request)
+        if slot is None:
+            return
+
+        in_use = len(slot.transferring) + 1  # the request of this response is not transferring anymore
+        decision = self.controller.record(key, self.default, status=status,
+                                          latency=request.meta.get("download_latency"), in_use=in_use)
+        # slots are replaced with a default one after some idle time, so the concurrency is applied on every response
+        slot.concurrency = self.controller.concurrency(key, self.default)
+
+        if decision is None or decision == AdaptiveConcurrency.HOLD:
+            return
+        if decision == AdaptiveConcurrency.INCREASE:
+            self.stats.inc_value("{0}/increase".format(AdaptiveConcurrencyMiddleware.STATS_PREFIX), spider=spider)
+        else:
+            self.stats.inc_value("{0}/decrease/{1}".format(AdaptiveConcurrencyMiddleware.STATS_PREFIX, decision),
+                                 spider=spider)
+        self.stats.max_value("{0}/max".format(AdaptiveConcurrencyMiddleware.STATS_PREFIX), slot.concurrency,
+                             spider=spider)
+        self.stats.min_value("{0}/min".format(AdaptiveConcurrencyMiddleware.STATS_PREFIX), slot.concurrency,
+                             spider=spider)
+        spider.logger.debug("Concurrency of {0}: {1} ({2})".format(key, slot.concurrency, decision))
+
+    def process_response(self, request, response, spider):
+        self.record(request, spider, status=response.status)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        gated = isinstance(exception, IgnoreRequest) or (StopDownload is not None and
+                                                         isinstance(exception, StopDownload))
+        if not gated:
+            self.record(request, spider)
@@ -0,0 +1,168 @@
+"""
+Created on 17.10.2026
+
+@author: Maximilian Pensel
+
+Copyright 2019 Maximilian Pensel <maximilian.pensel@gmx.de>
+
+This file is part of OWS-scrapy-wrapper.
+
+OWS-scrapy-wrapper is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+OWS-scrapy-wrapper is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with OWS-scrapy-wrapper.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+from twisted.internet import defer, reactor
+from twisted.python.failure import Failure
+
+import shared
+
+# pools are shared by all spiders of a crawl that use the same parser configuration
+_POOLS = dict()
+
+# parser instance of a worker process, created once by _init_worker
+_WORKER_PARSER = None
+
+
+class _WorkerLog:
+    """
+    Stands in for the spider of a worker parser and collects its log messages for replay in the main process. Offers
+    the output directory of the spider as crawl_specification.output (e.g. for the spool directory of the RawParser).
+    """
+
+    def __init__(self, output=None):
+        self.s_log = self
+        self.messages = []
+        if output is not None:
+            self.crawl_specification = SimpleNamespace(output=output)
+
+    def log(self, level, message):
+        self.messages.append((level, message))
+
+
+def _init_worker(parser_path, data):
+    """ Load langdetect profiles and instantiate the parser once per worker process """
+    global _WORKER_PARSER
+    from langdetect import DetectorFactory
+    from langdetect.detector_factory import init_factory
+
+    DetectorFactory.seed = 0
+    init_factory()
+
+    _WORKER_PARSER = shared.get_class(parser_path)(data=data)
+
+
+def _ping():
+    return True
+
+
+def _parse_in_worker(url, body, status, headers, request_headers, meta, output):
+    """ Rebuild the response inside the worker process, parse it inline and return the items with all log messages """
+    from scrapy import Request
+    from scrapy.http import Headers
+    from scrapy.responsetypes import responsetypes
+
+    headers = Headers(headers)
+    response_class = responsetypes.from_args(headers=headers, url=url, body=body)
+    response = response_class(url=url, body=body, status=status, headers=headers,
+                              request=Request(url, headers=request_headers, meta=meta))
+
+    worker_log = _WorkerLog(output)
+    _WORKER_PARSER.spider = worker_log
+    items = _WORKER_PARSER.parse(response) or []
+
+    # exception values (e.g. langdetect errors as paragraph language) can not necessarily be unpickled
+    for item in items:
+        for key in item:
+            if isinstance(item[key], Exception):
+                item[key] = str(item[key])
+
+    return list(items), worker_log.messages
+
+
+class ParserProcessPool:
+    """
+    Pool of pre-warmed worker processes that run the CPU-bound part of a ResponseParser outside of the reactor thread.
+    At most ``max_in_flight`` responses are handed to the workers at the same time, further responses wait for a free
+    slot, which keeps the memory held by queued response bodies bounded.
+    """
+
+    def __init__(self, parser_path, data, size, max_in_flight):
+        self.size = size
+        self.max_in_flight = max_in_flight
+        self.semaphore = defer.DeferredSemaphore(max_in_flight)
+        self.executor = ProcessPoolExecutor(max_workers=size,
+                                            mp_context=multiprocessing.get_context("spawn"),
+                                            initializer=_init_worker,
+                                            initargs=(parser_path, data))
+        # spawn all worker processes right away, so that profile loading does not delay the first responses
+        for _ in range(size):
+            self.executor.submit(_ping)
+
+        reactor.addSystemEventTrigger("before", "shutdown", self.shutdown)
+
+    def parse(self, parser, response):
+        """ Parse ``response`` in a worker process, returns a Deferred that fires with the list of parsed items """
+        return self.semaphore.run(self._submit, parser, response)
+
+    def _submit(self, parser, response):
+        deferred = defer.Deferred()
+        future = self.executor.submit(_parse_in_worker, *ParserProcessPool.job(parser, response))
+        future.add_done_callback(lambda f: reactor.callFromThread(ParserProcessPool._fire, deferred, f))
+        return deferred.addCallback(ParserProcessPool._replay_log, parser)
+
+    @staticmethod
+    def job(parser, response):
+        """ Arguments of _parse_in_worker for ``response``, including the state of the spider that parsers use """
+        request_headers = dict(response.request.headers) if response.request is not None else dict()
+        crawl_specification = getattr(parser.spider, "crawl_specification", None)
+        return (response.url,
+                response.body,
+                response.status,
+                dict(response.headers),
+                request_headers,
+                {"depth": response.meta.get("depth", 0)},
+                getattr(crawl_specification, "output", None))
+
+    @staticmethod
+    def _fire(deferred, future):
+        exc = future.exception()
+        if exc is not None:
+            deferred.errback(Failure(exc))
+        else:
+            deferred.callback(future.result())
+
+    @staticmethod
+    def _replay_log(result, parser):
+        items, messages = result
+        for level, message in messages:
+            parser.log(level, message)
+        return items
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+def get_pool(parser, size, max_in_flight):
+    """ Return the process pool for the class and data of ``parser``, creating it on first request """
+    parser_path = ".".join((type(parser).__module__, type(parser).__qualname__))
+    worker_data = dict(parser.data)
+    worker_data[parser.KEY_PROCESS_POOL_SIZE] = 0
+    key = (parser_path, json.dumps(worker_data, sort_keys=True, default=str))
+
+    if key not in _POOLS:
+        _POOLS[key] = ParserProcessPool(parser_path, worker_data, size, max_in_flight)
+    return _POOLS[key]
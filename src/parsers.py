@@ -23,20 +23,35 @@ along with OWS-scrapy-wrapper.  If not, see <https://www.gnu.org/licenses/>.
 
 import logging
 import os
+import re
 import tempfile
+import uuid
 
 import textract_pdf
+import middlewares
+import parser_pool
+import pdf_extraction
 import pipelines
-from langdetect import detect, detect_langs
 from langdetect.lang_detect_exception import LangDetectException
+from language_identifier import LanguageIdentifier
+from main_content import MainContentExtractor
+from lxml import etree
 from scrapy import Item, Field
 from textract_pdf.exceptions import CommandLineError
+from twisted.internet import reactor
 
 
 class ResponseParser:
 
     ACCEPTED_PIPELINES = []
 
+    KEY_PROCESS_POOL_SIZE = "process_pool_size"
+    KEY_PROCESS_POOL_MAX_IN_FLIGHT = "process_pool_max_in_flight"
+    KEY_MAX_BODY_SIZE = "max_body_size"
+
+    DEFAULT_PROCESS_POOL_SIZE = 0  # parse inline on the reactor thread
+    DEFAULT_PROCESS_POOL_MAX_IN_FLIGHT = 16
+
     def __init__(self, callbacks=None, data: {} = None, spider=None):
         if callbacks is None:
             callbacks = dict()
@@ -46,13 +61,58 @@ class ResponseParser:
         self.data = data
         self.spider = spider
 
-    def parse(self, response):
-        content_type = str(response.headers.get(b"Content-Type", "").lower())
+        self.pool = None
+        if self.data.get(ResponseParser.KEY_PROCESS_POOL_SIZE, ResponseParser.DEFAULT_PROCESS_POOL_SIZE) > 0:
+            self.pool = parser_pool.get_pool(self,
+                                             self.data[ResponseParser.KEY_PROCESS_POOL_SIZE],
+                                             self.data.get(ResponseParser.KEY_PROCESS_POOL_MAX_IN_FLIGHT,
+                                                           ResponseParser.DEFAULT_PROCESS_POOL_MAX_IN_FLIGHT))
+
+    def find_callback(self, content_type):
+        """ Return the callback registered for the lower case ``content_type`` header value, None if there is none """
         for ctype in self.callbacks:
             if ctype in content_type:
-                return self.callbacks[ctype](response)
+                return self.callbacks[ctype]
+        return None
+
+    def get_callback(self, response):
+        content_type = str(response.headers.get(b"Content-Type", "").lower())
+        callback = self.find_callback(content_type)
+        if callback is None:
+            self.log(logging.WARN, "No callback found to parse content type '{0}'".format(content_type))
+        return callback
+
+    def max_body_sizes(self):
+        """ Return the configured maximum body sizes in bytes by content type """
+        return self.data.get(ResponseParser.KEY_MAX_BODY_SIZE, dict())
+
+    def max_body_size(self, content_type):
+        """ Return the maximum body size in bytes for the lower case ``content_type``, None if it is unbounded """
+        for ctype, max_size in self.max_body_sizes().items():
+            if ctype in content_type:
+                return max_size
+        return None
 
-        self.log(logging.WARN, "No callback found to parse content type '{0}'".format(content_type))
+    def parse(self, response):
+        """
+        Parse ``response`` with the callback registered for its content type. If a process pool is configured, the
+        response is parsed in a worker process and a Deferred is returned that fires with the parsed items.
+        """
+        callback = self.get_callback(response)
+        if callback is None:
+            return None
+
+        if self.pool is not None:
+            return self.pool.parse(self, response)
+
+        return callback(response)
+
+    def unchanged(self, response):
+        """
+        Called in place of parse for pages that did not change since the previous crawl of an incremental crawl, see
+        change_index.ChangeIndex. ``response`` has no body if the server answered '304 Not Modified'.
+        """
+        return None
 
     def log(self, level, message):
         if self.spider:
@@ -61,6 +121,9 @@ class ResponseParser:
             print("[{0}] {1}".format(level, message))
 
     def errback(self, failure):
+        if middlewares.is_gated(failure):
+            self.log(logging.INFO, f"Download cancelled for {failure.request.url}: {failure.value}")
+            return
         self.log(logging.WARN, f"Rule failure on {failure.request.url}: {failure.value}")
 
     @staticmethod
@@ -70,18 +133,41 @@ class ResponseParser:
 
 class ParagraphParser(ResponseParser):
 
-    ACCEPTED_PIPELINES = [pipelines.Paragraph2CsvPipeline]
+    ACCEPTED_PIPELINES = [pipelines.ParagraphDeduplicationPipeline,
+                          pipelines.Paragraph2CsvPipeline,
+                          pipelines.Paragraph2SqlitePipeline,
+                          pipelines.Item2SegmentPipeline]
 
     KEY_KEEP_LANGDETECT_ERRORS = "keep_langdetect_errors"
     KEY_LANGUAGES = "allowed_languages"
     KEY_XPATHS = "xpaths"
+    KEY_LANGDETECT_CACHE_SIZE = "langdetect_cache_size"
+    KEY_LANGDETECT_MIN_LENGTH = "langdetect_min_length"
+    KEY_PARSE_PDF = "parse_pdf"
+    KEY_PDF_MAX_PROCESSES = "pdf_max_processes"
+    KEY_PDF_TIMEOUT = "pdf_timeout"
+    KEY_PDF_CACHE_DIR = "pdf_cache_dir"
+    KEY_PDF_CACHE_MAX_SIZE = "pdf_cache_max_size"
+    KEY_PDF_FIRST_PAGE = "pdf_first_page"
+    KEY_PDF_LAST_PAGE = "pdf_last_page"
+    KEY_PDF_OCR = "pdf_ocr"
+    KEY_PDF_OCR_WORKERS = "pdf_ocr_workers"
+    KEY_PDF_OCR_TIME_BUDGET = "pdf_ocr_time_budget"
+    KEY_MAIN_CONTENT = "main_content"
+    KEY_MAIN_CONTENT_MAX_LINK_DENSITY = "main_content_max_link_density"
+    KEY_MAIN_CONTENT_MIN_TEXT_DENSITY = "main_content_min_text_density"
 
     DEFAULT_ALLOWED_LANGUAGES = ["de", "en"]
     DEFAULT_XPATHS = ["//p", "//td"]
+    DEFAULT_PDF_MAX_PROCESSES = 4
+    DEFAULT_PDF_TIMEOUT = 120  # seconds
+    DEFAULT_PDF_CACHE_MAX_SIZE = 1024 ** 3  # bytes
 
     V_DISABLED = "disabled"
     V_ANY = "any"
 
+    SIMPLE_TAG_XPATH = re.compile(r"^\s*//([A-Za-z][\w\-]*)\s*$")
+
     def __init__(self, data: {} = None, spider=None):
         super().__init__(data=data, spider=spider)
 
@@ -92,20 +178,134 @@ class ParagraphParser(ResponseParser):
             self.data[ParagraphParser.KEY_LANGUAGES] = ParagraphParser.DEFAULT_ALLOWED_LANGUAGES
         if ParagraphParser.KEY_KEEP_LANGDETECT_ERRORS not in self.data:
             self.data[ParagraphParser.KEY_KEEP_LANGDETECT_ERRORS] = True
+        if ParagraphParser.KEY_LANGDETECT_CACHE_SIZE not in self.data:
+            self.data[ParagraphParser.KEY_LANGDETECT_CACHE_SIZE] = LanguageIdentifier.DEFAULT_CACHE_SIZE
+        if ParagraphParser.KEY_LANGDETECT_MIN_LENGTH not in self.data:
+            self.data[ParagraphParser.KEY_LANGDETECT_MIN_LENGTH] = LanguageIdentifier.DEFAULT_MIN_LENGTH
+        if ParagraphParser.KEY_PARSE_PDF not in self.data:
+            self.data[ParagraphParser.KEY_PARSE_PDF] = False
+        if ParagraphParser.KEY_PDF_MAX_PROCESSES not in self.data:
+            self.data[ParagraphParser.KEY_PDF_MAX_PROCESSES] = ParagraphParser.DEFAULT_PDF_MAX_PROCESSES
+        if ParagraphParser.KEY_PDF_TIMEOUT not in self.data:
+            self.data[ParagraphParser.KEY_PDF_TIMEOUT] = ParagraphParser.DEFAULT_PDF_TIMEOUT
+        if ParagraphParser.KEY_PDF_CACHE_DIR not in self.data:
+            self.data[ParagraphParser.KEY_PDF_CACHE_DIR] = None
+        if ParagraphParser.KEY_PDF_CACHE_MAX_SIZE not in self.data:
+            self.data[ParagraphParser.KEY_PDF_CACHE_MAX_SIZE] = ParagraphParser.DEFAULT_PDF_CACHE_MAX_SIZE
+        if ParagraphParser.KEY_PDF_FIRST_PAGE not in self.data:
+            self.data[ParagraphParser.KEY_PDF_FIRST_PAGE] = None  # from the first page
+        if ParagraphParser.KEY_PDF_LAST_PAGE not in self.data:
+            self.data[ParagraphParser.KEY_PDF_LAST_PAGE] = None  # up to the last page
+        if ParagraphParser.KEY_PDF_OCR not in self.data:
+            self.data[ParagraphParser.KEY_PDF_OCR] = False
+        if ParagraphParser.KEY_PDF_OCR_WORKERS not in self.data:
+            self.data[ParagraphParser.KEY_PDF_OCR_WORKERS] = None  # one per cpu
+        if ParagraphParser.KEY_PDF_OCR_TIME_BUDGET not in self.data:
+            self.data[ParagraphParser.KEY_PDF_OCR_TIME_BUDGET] = None  # unbounded
+        if ParagraphParser.KEY_MAIN_CONTENT not in self.data:
+            self.data[ParagraphParser.KEY_MAIN_CONTENT] = False
+        if ParagraphParser.KEY_MAIN_CONTENT_MAX_LINK_DENSITY not in self.data:
+            self.data[ParagraphParser.KEY_MAIN_CONTENT_MAX_LINK_DENSITY] = \
+                MainContentExtractor.DEFAULT_MAX_LINK_DENSITY
+        if ParagraphParser.KEY_MAIN_CONTENT_MIN_TEXT_DENSITY not in self.data:
+            self.data[ParagraphParser.KEY_MAIN_CONTENT_MIN_TEXT_DENSITY] = \
+                MainContentExtractor.DEFAULT_MIN_TEXT_DENSITY
 
         self.callbacks["text/html"] = self.parse_html
-        # self.callbacks["application/pdf"] = self.parse_pdf
+        if self.data[ParagraphParser.KEY_PARSE_PDF]:
+            self.callbacks["application/pdf"] = self.parse_pdf
 
         self.detected_languages = dict()
+        self.language_identifier = LanguageIdentifier(
+            cache_size=self.data[ParagraphParser.KEY_LANGDETECT_CACHE_SIZE],
+            min_length=self.data[ParagraphParser.KEY_LANGDETECT_MIN_LENGTH])
+
+        self.pdf_cache = None
+        if self.data[ParagraphParser.KEY_PARSE_PDF] and self.data[ParagraphParser.KEY_PDF_CACHE_DIR]:
+            self.pdf_cache = pdf_extraction.get_cache(self.data[ParagraphParser.KEY_PDF_CACHE_DIR],
+                                                      self.data[ParagraphParser.KEY_PDF_CACHE_MAX_SIZE])
+
+        self.main_content = None
+        if self.data[ParagraphParser.KEY_MAIN_CONTENT]:
+            self.main_content = MainContentExtractor(
+                max_link_density=self.data[ParagraphParser.KEY_MAIN_CONTENT_MAX_LINK_DENSITY],
+                min_text_density=self.data[ParagraphParser.KEY_MAIN_CONTENT_MIN_TEXT_DENSITY])
+
+        self.compile_xpaths()
+
+    def compile_xpaths(self):
+        """
+        Compile all configured xpaths into a single union expression, which lxml evaluates in one pass and returns in
+        document order. The origin of a match is resolved by tag name for simple '//tag' expressions, only the
+        remaining expressions are compiled separately to determine which of them matched a node.
+        """
+        xpaths = self.data[ParagraphParser.KEY_XPATHS]
+        self.xpath_union = etree.XPath(" | ".join("({0})".format(xp) for xp in xpaths))
+        self.xpath_tag_origins = dict()
+        self.xpath_complex_origins = []
+        for xp in xpaths:
+            simple = ParagraphParser.SIMPLE_TAG_XPATH.match(xp)
+            if simple:
+                self.xpath_tag_origins.setdefault(simple.group(1), xp)
+            else:
+                self.xpath_complex_origins.append((xp, etree.XPath(xp)))
+
+    def extract_paragraphs(self, root):
+        """
+        Yield tuples (paragraph text, origin xpath) for all nodes matched by the configured xpaths in document order.
+        Nodes nested inside another matched node (e.g. a <p> inside a <td>) are skipped, since their text is already
+        part of the enclosing paragraph. In main content mode, nodes classified as boilerplate or nested inside
+        boilerplate are skipped as well.
+        """
+        nodes = self.xpath_union(root)
+        if not nodes:
+            return
+
+        complex_origins = [(xp, set(ParagraphParser.origin_key(match) for match in compiled(root)))
+                           for xp, compiled in self.xpath_complex_origins]
+        matched = set(node for node in nodes if not isinstance(node, str))
+        skipped = set(matched)
+        if self.main_content is not None:
+            boilerplate = self.main_content.boilerplate(root, candidates=matched)
+            skipped.update(boilerplate)
+        else:
+            boilerplate = set()
+
+        for node in nodes:
+            if not isinstance(node, str) and (node in boilerplate
+                                              or any(ancestor in skipped for ancestor in node.iterancestors())):
+                continue
+
+            origin = None
+            key = ParagraphParser.origin_key(node)
+            for xp, members in complex_origins:
+                if key in members:
+                    origin = xp
+                    break
+            if isinstance(node, str):
+                # string result of an expression selecting text() or attribute nodes
+                yield str(node), origin
+                continue
+            if origin is None:
+                origin = self.xpath_tag_origins.get(node.tag)
+
+            yield "".join(node.itertext()), origin
+
+    @staticmethod
+    def origin_key(match):
+        """
+        Identify an xpath match across evaluations: elements by themselves, string results (text() or attribute
+        nodes) by their position in the tree, since equal strings of different nodes compare equal.
+        """
+        if isinstance(match, etree._ElementUnicodeResult):
+            return match.getparent(), match.attrname, match.is_tail, str(match)
+        return match
 
     def parse_html(self, response):
         items = []
 
-        for xp in self.data[ParagraphParser.KEY_XPATHS]:
-            paragraphs = response.xpath(xp)
-            for par in paragraphs:
-                par_content = "".join(par.xpath(".//text()").extract())
-                items.extend(self.process_paragraph(response, par_content, origin=xp))
+        for par_content, origin in self.extract_paragraphs(response.selector.root):
+            items.extend(self.process_paragraph(response, par_content, origin=origin))
 
         self.log(logging.INFO, "[parse_html] - Matched {0} paragraphs in {1}".format(len(items), response.url))
 
@@ -114,26 +314,103 @@ class ParagraphParser(ResponseParser):
         return items
 
     def parse_pdf(self, response):
-        tmp_file = tempfile.NamedTemporaryFile(suffix=".pdf", prefix="scrapy_", delete=False)
-        tmp_file.write(response.body)
-        tmp_file.close()
+        """
+        Extract paragraphs from a pdf response. While the reactor is running, the text is extracted by an asynchronous
+        pdftotext process and a Deferred is returned. Tesseract OCR, and textract_pdf if pdftotext is not installed,
+        run in a thread of the reactor's thread pool instead, within the process limit of the pdftotext processes.
+        Otherwise (e.g. inside a parser_pool worker) the text is extracted synchronously by textract_pdf.
+        """
+        if not reactor.running:
+            return self.parse_pdf_sync(response)
+
+        extractor = pdf_extraction.get_extractor(self.data[ParagraphParser.KEY_PDF_MAX_PROCESSES],
+                                                 self.data[ParagraphParser.KEY_PDF_TIMEOUT])
+        if self.data[ParagraphParser.KEY_PDF_OCR]:
+            method = "tesseract"
+        else:
+            method = "pdftotext" if extractor.installed() else "textract"
+        content, cache_key = self.lookup_pdf_content(response, method)
+        if content is not None:
+            return self.process_pdf_content(content, response)
+
+        if method != "pdftotext":
+            deferred = extractor.run_in_thread(self.extract_pdf_text, response.body)
+        else:
+            deferred = extractor.extract(response.body, first_page=self.data[ParagraphParser.KEY_PDF_FIRST_PAGE],
+                                         last_page=self.data[ParagraphParser.KEY_PDF_LAST_PAGE])
+        if cache_key is not None:
+            deferred.addCallback(self.cache_pdf_content, cache_key)
+        deferred.addCallbacks(self.process_pdf_content, self.pdf_extraction_failed,
+                              callbackArgs=(response,), errbackArgs=(response,))
+        return deferred
+
+    def parse_pdf_sync(self, response):
+        method = "tesseract" if self.data[ParagraphParser.KEY_PDF_OCR] else "textract"
+        content, cache_key = self.lookup_pdf_content(response, method)
+        if content is not None:
+            return self.process_pdf_content(content, response)
 
         try:
-            content = textract_pdf.process(tmp_file.name)
+            content = self.extract_pdf_text(response.body)
         except CommandLineError as exc:  # Catching either ExtensionNotSupported or MissingFileError
             self.log(logging.ERROR, "[parse_pdf] - {0}: {1}".format(type(exc).__name__, exc))
+            return []  # In any case, text extraction failed so no items were parsed
+
+        if cache_key is not None:
+            self.cache_pdf_content(content, cache_key)
+
+        return self.process_pdf_content(content, response)
+
+    def extract_pdf_text(self, body):
+        """ Extract the text of the configured pages of the pdf ``body`` with textract_pdf, blocks until it is done """
+        kwargs = {"first_page": self.data[ParagraphParser.KEY_PDF_FIRST_PAGE],
+                  "last_page": self.data[ParagraphParser.KEY_PDF_LAST_PAGE]}
+        if self.data[ParagraphParser.KEY_PDF_OCR]:
+            kwargs.update(method="tesseract",
+                          ocr_workers=self.data[ParagraphParser.KEY_PDF_OCR_WORKERS],
+                          time_budget=self.data[ParagraphParser.KEY_PDF_OCR_TIME_BUDGET])
+
+        tmp_file = tempfile.NamedTemporaryFile(suffix=".pdf", prefix="scrapy_", delete=False)
+        tmp_file.write(body)
+        tmp_file.close()
+        try:
+            return textract_pdf.process(tmp_file.name, **kwargs)
+        finally:
             # Cleanup temporary pdf file
             os.unlink(tmp_file.name)
-            return []  # In any case, text extraction failed so no items were parsed
 
+    def lookup_pdf_content(self, response, method):
+        """ Return tuple (cached text or None, cache key), the cache key is None if no pdf cache is configured """
+        # OCR results cut short by the time budget are not cached
+        if self.pdf_cache is None or (method == "tesseract" and self.data[ParagraphParser.KEY_PDF_OCR_TIME_BUDGET]):
+            return None, None
+
+        if self.data[ParagraphParser.KEY_PDF_FIRST_PAGE] is not None \
+                or self.data[ParagraphParser.KEY_PDF_LAST_PAGE] is not None:
+            method += "-{0}-{1}".format(self.data[ParagraphParser.KEY_PDF_FIRST_PAGE] or "",
+                                        self.data[ParagraphParser.KEY_PDF_LAST_PAGE] or "")
+        cache_key = self.pdf_cache.key(response.body, method)
+        content = self.pdf_cache.get(cache_key)
+        if content is not None:
+            self.log(logging.DEBUG, "[parse_pdf] - Using cached text for {0}".format(response.url))
+        return content, cache_key
+
+    def cache_pdf_content(self, content, cache_key):
+        self.pdf_cache.put(cache_key, content)
+        return content
+
+    def pdf_extraction_failed(self, failure, response):
+        exc = failure.value
+        failure.trap(CommandLineError)
+        self.log(logging.ERROR, "[parse_pdf] - {0} on {1}: {2}".format(type(exc).__name__, response.url, exc))
+        return []
+
+    def process_pdf_content(self, content, response):
         content = content.decode("utf-8")  # convert byte string to utf-8 string
         items = []
         for par_content in content.splitlines():
             items.extend(self.process_paragraph(response, par_content, origin="pdf"))
 
-        # Cleanup temporary pdf file
-        os.unlink(tmp_file.name)
-
         self.log(logging.INFO, "[parse_pdf] - Matched {0} paragraphs in {1}".format(len(items), response.url))
 
         items = self.detect_language(items)
@@ -141,67 +418,65 @@ class ParagraphParser(ResponseParser):
         return items
 
     def process_paragraph(self, response, par_content, origin):
-        """ Supplement paragraph data with detected language, supplement with 'None' if disabled """
+        """ Wrap paragraph data in an item, languages are supplemented for the whole page by detect_language """
         items = []
 
         if par_content.strip():  # immediately ignore empty or only whitespace paragraphs
-            try:
-                if ParagraphParser.V_DISABLED in self.data[ParagraphParser.KEY_LANGUAGES]:
-                    lang = None
-                else:
-                    lang = detect(par_content)
-                # if "any" or lang in self.data[ParagraphParser.KEY_LANGUAGES]:
-                items.append(ParagraphItem(url=response.url,
-                                           content=par_content,
-                                           par_lang=lang,
-                                           page_lang=None,
-                                           origin=origin,
-                                           depth=response.meta["depth"]))
-                self.register_paragraph_language(lang)
-            except LangDetectException as exc:
-                self.log(logging.WARN, "[process_paragraph] - "
-                                       "{0} on langdetect input '{1}'."
-                                       .format(exc, par_content))
-                items.append(ParagraphItem(url=response.url,
-                                           content=par_content,
-                                           par_lang=exc,
-                                           page_lang=None,
-                                           origin=origin,
-                                           depth=response.meta["depth"]))
-                self.register_paragraph_language(str(exc))
+            items.append(ParagraphItem(url=response.url,
+                                       content=par_content,
+                                       par_lang=None,
+                                       page_lang=None,
+                                       origin=origin,
+                                       depth=response.meta.get("depth", 0)))
 
         return items
 
     def detect_language(self, items):
-        """ Filter out all items of a response depending on their detected language, don't filter if disabled """
+        """
+        Supplement paragraph and page languages of all items of a response in a single pass and filter out the items
+        depending on the page language, don't detect or filter if disabled
+        """
         if ParagraphParser.V_DISABLED in self.data[ParagraphParser.KEY_LANGUAGES]:
+            for item in items:
+                self.register_paragraph_language(None)
             return items
 
-        all_content = " ".join([item["content"] for item in items])
-        try:
-            languages = detect_langs(all_content)
-            self.log(logging.INFO,
-                     "[detect_language] - Language distribution on {0} paragraphs: {1}".format(len(items), languages))
-
-            if ParagraphParser.V_ANY in self.data[ParagraphParser.KEY_LANGUAGES]:
-                # if "any" language is accepted, store page language probabilities
-                for item in items:
-                    item["page_lang"] = str(languages)
-                return items
+        par_results, languages = self.language_identifier.detect_page([item["content"] for item in items])
+        for item, result in zip(items, par_results):
+            lang = LanguageIdentifier.top_language(result)
+            if isinstance(lang, LangDetectException):
+                self.log(logging.WARN, "[detect_language] - "
+                                       "{0} on langdetect input '{1}'."
+                                       .format(lang, item["content"]))
+                self.register_paragraph_language(str(lang))
             else:
-                # accept all paragraphs if the chance that their combination matches one of the accepted languages
-                # is greater than 0.5
-                for lang in languages:
-                    if lang.lang in self.data[ParagraphParser.KEY_LANGUAGES] and lang.prob > 0.5:
-                        # add page_lang info to each item
-                        for item in items:
-                            item["page_lang"] = lang.lang
-                        return items
-        except LangDetectException as exc:
+                self.register_paragraph_language(lang)
+            item["par_lang"] = lang
+
+        if isinstance(languages, LangDetectException):
             if self.data[ParagraphParser.KEY_KEEP_LANGDETECT_ERRORS]:
-                self.log(logging.WARN, "[process_paragraph] - {0} on langdetect input '{1}'.")
+                self.log(logging.WARN, "[detect_language] - {0} on page with {1} paragraphs."
+                                       .format(languages, len(items)))
                 return items
+            return []
 
+        self.log(logging.INFO,
+                 "[detect_language] - Language distribution on {0} paragraphs: {1}".format(len(items), languages))
+
+        if ParagraphParser.V_ANY in self.data[ParagraphParser.KEY_LANGUAGES]:
+            # if "any" language is accepted, store page language probabilities
+            for item in items:
+                item["page_lang"] = str(languages)
+            return items
+        else:
+            # accept all paragraphs if the chance that their combination matches one of the accepted languages
+            # is greater than 0.5
+            for lang in languages:
+                if lang.lang in self.data[ParagraphParser.KEY_LANGUAGES] and lang.prob > 0.5:
+                    # add page_lang info to each item
+                    for item in items:
+                        item["page_lang"] = lang.lang
+                    return items
 
         # none of the accepted languages was even remotely present
         return []
@@ -216,23 +491,46 @@ class ParagraphParser(ResponseParser):
     def generate_example_data():
         return {ParagraphParser.KEY_LANGUAGES: ["de", "en", "any", "disabled"],
                 ParagraphParser.KEY_KEEP_LANGDETECT_ERRORS: False,
-                ParagraphParser.KEY_XPATHS: ["//p", "//h1", "//h2"]}
+                ParagraphParser.KEY_XPATHS: ["//p", "//h1", "//h2"],
+                ParagraphParser.KEY_LANGDETECT_CACHE_SIZE: LanguageIdentifier.DEFAULT_CACHE_SIZE,
+                ParagraphParser.KEY_LANGDETECT_MIN_LENGTH: 20,
+                ParagraphParser.KEY_PARSE_PDF: True,
+                ParagraphParser.KEY_PDF_MAX_PROCESSES: ParagraphParser.DEFAULT_PDF_MAX_PROCESSES,
+                ParagraphParser.KEY_PDF_TIMEOUT: ParagraphParser.DEFAULT_PDF_TIMEOUT,
+                ParagraphParser.KEY_PDF_CACHE_DIR: "<Pdf Text Cache Directory>",
+                ParagraphParser.KEY_PDF_CACHE_MAX_SIZE: ParagraphParser.DEFAULT_PDF_CACHE_MAX_SIZE,
+                ParagraphParser.KEY_PDF_FIRST_PAGE: 1,
+                ParagraphParser.KEY_PDF_LAST_PAGE: 50,
+                ParagraphParser.KEY_PDF_OCR: False,
+                ParagraphParser.KEY_PDF_OCR_WORKERS: 4,
+                ParagraphParser.KEY_PDF_OCR_TIME_BUDGET: 300,
+                ParagraphParser.KEY_MAIN_CONTENT: True,
+                ParagraphParser.KEY_MAIN_CONTENT_MAX_LINK_DENSITY: MainContentExtractor.DEFAULT_MAX_LINK_DENSITY,
+                ParagraphParser.KEY_MAIN_CONTENT_MIN_TEXT_DENSITY: MainContentExtractor.DEFAULT_MIN_TEXT_DENSITY}
 
 
 class RawParser(ResponseParser):
 
-    ACCEPTED_PIPELINES = [pipelines.Raw2FilePipeline]
+    ACCEPTED_PIPELINES = [pipelines.Raw2FilePipeline, pipelines.Raw2WarcPipeline, pipelines.Item2SegmentPipeline]
 
     KEY_ALLOWED_CONTENT_TYPES = "allowed_content_type"
+    KEY_SPOOL_THRESHOLD = "spool_threshold"
+    KEY_SPOOL_DIR = "spool_dir"
 
     DEFAULT_ALLOWED_CONTENT_TYPES = ["text/html", "application/pdf"]
 
+    SPOOL_DIR_NAME = ".spool"
+
     def __init__(self, data: {} = None, spider=None):
         super().__init__(data=data, spider=spider)
 
         # set defaults
         if RawParser.KEY_ALLOWED_CONTENT_TYPES not in self.data:
             self.data[RawParser.KEY_ALLOWED_CONTENT_TYPES] = RawParser.DEFAULT_ALLOWED_CONTENT_TYPES
+        if RawParser.KEY_SPOOL_THRESHOLD not in self.data:
+            self.data[RawParser.KEY_SPOOL_THRESHOLD] = None  # keep all bodies in memory
+        if RawParser.KEY_SPOOL_DIR not in self.data:
+            self.data[RawParser.KEY_SPOOL_DIR] = None  # spool into the output directory
 
         for ct in self.data[RawParser.KEY_ALLOWED_CONTENT_TYPES]:
             self.callbacks[ct] = self.parse_response
@@ -242,11 +540,48 @@ class RawParser(ResponseParser):
 
         self.log(logging.INFO, f"Storing response {response}")
 
-        return [RawContentItem(url=response.url, content=cont, depth=response.meta["depth"])]
+        item = RawContentItem(url=response.url,
+                              content=cont,
+                              depth=response.meta.get("depth", 0),
+                              status=response.status,
+                              headers=RawParser.headers_dict(response.headers),
+                              request_headers=RawParser.headers_dict(response.request.headers)
+                              if response.request is not None else dict())
+
+        threshold = self.data[RawParser.KEY_SPOOL_THRESHOLD]
+        if threshold is not None and len(cont) > threshold:
+            item["content"] = None
+            item["content_file"] = self.spool(cont)
+
+        return [item]
+
+    @staticmethod
+    def headers_dict(headers):
+        """ Convert scrapy Headers to a plain dictionary of header name to list of values """
+        return {name.decode("latin-1"): [value.decode("latin-1") for value in values]
+                for name, values in headers.items()}
+
+    def spool_dir(self):
+        if self.data[RawParser.KEY_SPOOL_DIR]:
+            return self.data[RawParser.KEY_SPOOL_DIR]
+        if hasattr(self.spider, "crawl_specification"):
+            # same file system as the output, so that pipelines can move spooled bodies into place
+            return os.path.join(self.spider.crawl_specification.output, RawParser.SPOOL_DIR_NAME)
+        return os.path.join(tempfile.gettempdir(), "ows" + RawParser.SPOOL_DIR_NAME)
+
+    def spool(self, body):
+        """ Write ``body`` to a new spool file and return its path, the consuming pipeline takes ownership of it """
+        spool_dir = self.spool_dir()
+        os.makedirs(spool_dir, exist_ok=True)
+        spool_path = os.path.join(spool_dir, "body_" + uuid.uuid4().hex)
+        with open(spool_path, "xb") as spool_file:
+            spool_file.write(body)
+        return spool_path
 
     @staticmethod
     def generate_example_data():
-        return {RawParser.KEY_ALLOWED_CONTENT_TYPES: RawParser.DEFAULT_ALLOWED_CONTENT_TYPES}
+        return {RawParser.KEY_ALLOWED_CONTENT_TYPES: RawParser.DEFAULT_ALLOWED_CONTENT_TYPES,
+                RawParser.KEY_SPOOL_THRESHOLD: 1048576}
 
 
 ###
@@ -260,9 +595,14 @@ class ParagraphItem(Item):
     page_lang = Field()
     origin = Field()
     depth = Field()
+    near_duplicate = Field()
 
 
 class RawContentItem(Item):
     url = Field()
     content = Field()
+    content_file = Field()  # path of the spooled body, if content was too large to be kept in memory
     depth = Field()
+    status = Field()
+    headers = Field()  # response headers, name -> list of values
+    request_headers = Field()
@@ -0,0 +1,235 @@
+"""
+Created on 17.10.2026
+
+@author: Maximilian Pensel
+
+Copyright 2019 Maximilian Pensel <maximilian.pensel@gmx.de>
+
+This file is part of OWS-scrapy-wrapper.
+
+OWS-scrapy-wrapper is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+OWS-scrapy-wrapper is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with OWS-scrapy-wrapper.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from twisted.internet import defer, protocol, reactor, threads
+
+from textract_pdf.exceptions import ShellError, ShellTimeoutError
+from textract_pdf.pdf_parser import page_range_args
+
+# extractors and caches are shared by all spiders of a crawl, so that the process limit holds for the entire crawl
+_EXTRACTORS = dict()
+_CACHES = dict()
+
+# paths of the executables looked up by this process, None if they are not installed
+_EXECUTABLES = dict()
+
+
+def find_executable(name):
+    """ Return the path of the executable ``name``, None if it is not installed. Looked up once per process. """
+    if name not in _EXECUTABLES:
+        _EXECUTABLES[name] = shutil.which(name)
+    return _EXECUTABLES[name]
+
+
+class _ExtractorProtocol(protocol.ProcessProtocol):
+    """ Feeds the pdf body to the extractor over stdin and collects its output """
+
+    def __init__(self, deferred, command, body, timeout):
+        self.deferred = deferred
+        self.command = command
+        self.body = body
+        self.timeout = timeout
+        self.timed_out = False
+        self.timeout_call = None
+        self.stdout = []
+        self.stderr = []
+
+    def connectionMade(self):
+        self.transport.write(self.body)
+        self.transport.closeStdin()
+        self.body = None
+        if self.timeout:
+            self.timeout_call = reactor.callLater(self.timeout, self.kill)
+
+    def kill(self):
+        self.timed_out = True
+        self.transport.signalProcess("KILL")
+
+    def outReceived(self, data):
+        self.stdout.append(data)
+
+    def errReceived(self, data):
+        self.stderr.append(data)
+
+    def processEnded(self, reason):
+        if self.timeout_call is not None and self.timeout_call.active():
+            self.timeout_call.cancel()
+
+        stdout = b"".join(self.stdout)
+        stderr = b"".join(self.stderr)
+        exit_code = reason.value.exitCode
+        if self.timed_out:
+            self.deferred.errback(ShellTimeoutError(self.command, self.timeout, stdout, stderr))
+        elif exit_code == 0:
+            self.deferred.callback(stdout)
+        else:
+            self.deferred.errback(ShellError(self.command, exit_code if exit_code is not None else -1, stdout, stderr))
+
+
+class AsyncPdfExtractor:
+    """
+    Extracts text from pdf bodies with ``pdftotext`` without blocking the reactor. The body is piped into the
+    extractor over stdin, the UTF-8 encoded text is read from stdout. At most ``max_processes`` extractors run at the
+    same time, every extractor that does not finish within ``timeout`` seconds is killed. Extractions that have to
+    block (textract_pdf without pdftotext, OCR) run in threads of the reactor's thread pool within the same limit.
+    """
+
+    EXECUTABLE = "pdftotext"
+
+    def __init__(self, max_processes=4, timeout=60):
+        self.max_processes = max_processes
+        self.timeout = timeout
+        self.semaphore = defer.DeferredSemaphore(max_processes)
+
+    def extract(self, body, first_page=None, last_page=None):
+        """
+        Return a Deferred that fires with the extracted text of the pages ``first_page`` to ``last_page`` (all pages
+        by default) as utf-8 byte string
+        """
+        return self.semaphore.run(self._spawn, body, first_page, last_page)
+
+    def installed(self):
+        """ Return True if pdftotext is installed """
+        return find_executable(AsyncPdfExtractor.EXECUTABLE) is not None
+
+    def run_in_thread(self, func, *args, **kwargs):
+        """ Return a Deferred that fires with the result of func(*args, **kwargs), called in a thread """
+        return self.semaphore.run(threads.deferToThread, func, *args, **kwargs)
+
+    def _spawn(self, body, first_page=None, last_page=None):
+        args = [AsyncPdfExtractor.EXECUTABLE, "-enc", "UTF-8"] + page_range_args(first_page, last_page) + ["-", "-"]
+        command = " ".join(args)
+        executable = find_executable(AsyncPdfExtractor.EXECUTABLE)
+        if executable is None:
+            # equivalent to exit code 127 from sh, see textract_pdf.utils.ShellParser.run
+            return defer.fail(ShellError(command, 127, "", ""))
+
+        deferred = defer.Deferred()
+        reactor.spawnProcess(_ExtractorProtocol(deferred, command, body, self.timeout), executable, args,
+                             env=os.environ)
+        return deferred
+
+
+class PdfTextCache:
+    """
+    On-disk cache of extracted pdf texts, addressed by the sha256 hash of the pdf body and the extraction method.
+    Entries are stored in sharded subdirectories of ``path``. Once the cached texts exceed ``max_size`` bytes, the
+    least recently used entries are evicted until the cache is below 90% of its maximum size again.
+    """
+
+    SUFFIX = ".txt"
+
+    def __init__(self, path, max_size=1024 ** 3):
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.entries = dict()  # file path -> (last access time, size)
+        self.size = 0
+
+        os.makedirs(self.path, exist_ok=True)
+        for root, _, files in os.walk(self.path):
+            for filename in files:
+                if not filename.endswith(PdfTextCache.SUFFIX):
+                    continue
+                file_path = os.path.join(root, filename)
+                stat = os.stat(file_path)
+                self.entries[file_path] = (stat.st_mtime, stat.st_size)
+                self.size += stat.st_size
+
+    def key(self, body, method):
+        return hashlib.sha256(body).hexdigest() + "-" + method
+
+    def _file_path(self, key):
+        return os.path.join(self.path, key[:2], key + PdfTextCache.SUFFIX)
+
+    def get(self, key):
+        """ Return the cached text for ``key`` or None """
+        file_path = self._file_path(key)
+        try:
+            with open(file_path, "rb") as text_file:
+                text = text_file.read()
+        except FileNotFoundError:
+            # evicted by another process sharing the cache directory
+            self._account(file_path, None)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        os.utime(file_path)
+        # entries written by other processes sharing the cache directory are counted on their first hit
+        self._account(file_path, len(text))
+        return text
+
+    def put(self, key, text):
+        file_path = self._file_path(key)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        # write to a temporary file first, so that concurrent readers never see partial entries
+        handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path))
+        with os.fdopen(handle, "wb") as text_file:
+            text_file.write(text)
+        os.replace(tmp_path, file_path)
+
+        self._account(file_path, len(text))
+        if self.size > self.max_size:
+            self.evict(int(self.max_size * 0.9))
+
+    def _account(self, file_path, size):
+        """ Replace the entry of ``file_path`` by one of ``size`` bytes accessed now, remove it if size is None """
+        entry = self.entries.pop(file_path, None)
+        if entry is not None:
+            self.size -= entry[1]
+        if size is not None:
+            self.entries[file_path] = (os.path.getmtime(file_path), size)
+            self.size += size
+
+    def evict(self, target_size):
+        for file_path, (_, size) in sorted(self.entries.items(), key=lambda entry: entry[1][0]):
+            if self.size <= target_size:
+                break
+            try:
+                os.unlink(file_path)
+            except FileNotFoundError:
+                pass
+            del self.entries[file_path]
+            self.size -= size
+
+
+def get_extractor(max_processes, timeout):
+    """ Return the extractor shared by all parsers with the same limits, creating it on first request """
+    key = (max_processes, timeout)
+    if key not in _EXTRACTORS:
+        _EXTRACTORS[key] = AsyncPdfExtractor(max_processes=max_processes, timeout=timeout)
+    return _EXTRACTORS[key]
+
+
+def get_cache(path, max_size):
+    """ Return the text cache located at ``path``, creating it on first request """
+    path = os.path.abspath(path)
+    if path not in _CACHES:
+        _CACHES[path] = PdfTextCache(path, max_size=max_size)
+    return _CACHES[path]
@@ -21,20 +21,44 @@ You should have received a copy of the GNU General Public License
 along with OWS-scrapy-wrapper.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import base64
+import csv
+import gzip
+import hashlib
+import http.client
+import io
 import os
+import queue
 import shutil
+import sqlite3
 import sys
+import tempfile
+import threading
+import uuid
+import zlib
+from datetime import datetime, timezone
 from urllib.parse import urlparse
 
 import math
 import numpy as np
-import pandas
+from twisted.internet import defer, reactor
 
+import record_store
 import shared
+from scrapy.exceptions import DropItem
+from scrapy.pipelines import ItemPipelineManager
+from simhash import SimHashIndex, simhash
 from shared import CrawlSpecification
 
 from remote.finalizers import finalize_paragraphs, finalize_raw
 
+# sqlite stores are shared by all spiders of a crawl, see get_sqlite_store
+_SQLITE_STORES = dict()
+# content stores are shared by all spiders of a crawl, see get_content_store
+_CONTENT_STORES = dict()
+# simhash indexes are shared by all spiders of a crawl, see get_simhash_index
+_SIMHASH_INDEXES = dict()
+
 ###
 # Crawl Finalizers
 ###
@@ -69,80 +93,967 @@ class RemoteCrawlFinalizer(CrawlFinalizer):
 
         return finalized_flag
 
+###
+# Background Writers
+###
+
+class BackgroundWriter:
+    """
+    Executes the disk writes of a pipeline on dedicated writer threads, so that slow disks do not block the reactor.
+
+    Jobs are handed to the threads through one queue per thread, of at most ``max_queue_size`` jobs over all threads.
+    While the queue of a job is full, ``submit`` returns a Deferred that fires once the job could be queued, pipelines
+    return it from process_item, which makes scrapy wait before it passes further items. Jobs submitted with the same
+    ``key`` (e.g. the path they write) run on the same thread in submission order, other jobs go to the thread with the
+    shortest queue. With a single thread, all jobs are executed in submission order. Outside of a running reactor
+    (e.g. in benchmarks), ``submit`` blocks instead.
+    """
+
+    DEFAULT_MAX_QUEUE_SIZE = 100
+
+    def __init__(self, name, max_queue_size=DEFAULT_MAX_QUEUE_SIZE, threads=1, log=None):
+        self.name = name
+        self.log = log
+        self.queues = [queue.Queue(maxsize=max(1, max_queue_size // threads)) for _ in range(threads)]
+        self.waiting = []  # (job, key, Deferred) that did not fit into their queue yet, in submission order
+        self.pending = 0  # jobs submitted but not yet executed, maintained in the reactor thread
+        self.drained = []  # Deferreds returned by drain, fired once no job is pending
+        self.failed = 0
+
+        self.threads = [threading.Thread(target=self.run, args=(jobs,), name="{0}-{1}".format(name, i), daemon=True)
+                        for i, jobs in enumerate(self.queues)]
+        for thread in self.threads:
+            thread.start()
+
+    def select(self, key):
+        """ Return the queue of the thread that executes jobs with ``key`` """
+        if key is None:
+            return min(self.queues, key=lambda jobs: jobs.qsize())
+        return self.queues[hash(key) % len(self.queues)]
+
+    def submit(self, func, *args, key=None, **kwargs):
+        """ Queue the call func(*args, **kwargs), return None if it was queued, otherwise a Deferred """
+        job = (func, args, kwargs)
+        if not reactor.running:
+            self.select(key).put(job)
+            return None
+
+        self.pending += 1
+        if not self.waiting:
+            try:
+                self.select(key).put_nowait(job)
+                return None
+            except queue.Full:
+                pass
+
+        deferred = defer.Deferred()
+        self.waiting.append((job, key, deferred))
+        return deferred
+
+    def run(self, jobs):
+        while True:
+            job = jobs.get()
+            if job is None:
+                jobs.task_done()
+                return
+
+            func, args, kwargs = job
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                self.failed += 1
+                if self.log is not None:
+                    self.log.exception("[{0}] - Write failed".format(self.name))
+            finally:
+                jobs.task_done()
+                if reactor.running:
+                    reactor.callFromThread(self.job_done)
+
+    def job_done(self):
+        self.pending -= 1
+        while self.waiting:
+            job, key, deferred = self.waiting[0]
+            jobs = self.select(key)
+            if jobs.full():
+                break
+            self.waiting.pop(0)
+            jobs.put_nowait(job)
+            deferred.callback(None)
+
+        if self.pending <= 0 and self.drained:
+            drained, self.drained = self.drained, []
+            for deferred in drained:
+                deferred.callback(None)
+
+    def drain(self):
+        """ Return a Deferred that fires once all submitted jobs are executed """
+        if not reactor.running:
+            for jobs in self.queues:
+                jobs.join()
+            return defer.succeed(None)
+        if self.pending <= 0:
+            return defer.succeed(None)
+
+        deferred = defer.Deferred()
+        self.drained.append(deferred)
+        return deferred
+
+    def close(self):
+        """ Execute all submitted jobs and stop the writer threads, returns a Deferred """
+        return self.drain().addCallback(self.stop)
+
+    def stop(self, _=None):
+        for jobs in self.queues:
+            jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+class SqliteParagraphStore:
+    """
+    SQLite database of paragraphs in WAL mode, shared by the spiders of a crawl. All statements run on one
+    BackgroundWriter thread, rows are inserted in batches of one transaction each. Paragraphs with a url and content
+    that is already stored are ignored (unique index on url and content hash).
+    """
+
+    SCHEMA = ["""CREATE TABLE IF NOT EXISTS paragraphs (
+                    id INTEGER PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    content_hash BLOB NOT NULL,
+                    par_language TEXT,
+                    page_language TEXT,
+                    origin TEXT,
+                    depth INTEGER,
+                    spider TEXT)""",
+              "CREATE UNIQUE INDEX IF NOT EXISTS paragraphs_url_content ON paragraphs (url, content_hash)",
+              "CREATE INDEX IF NOT EXISTS paragraphs_page_language ON paragraphs (page_language)",
+              "CREATE INDEX IF NOT EXISTS paragraphs_par_language ON paragraphs (par_language)",
+              "CREATE INDEX IF NOT EXISTS paragraphs_depth ON paragraphs (depth)"]
+
+    INSERT = "INSERT OR IGNORE INTO paragraphs " \
+             "(url, content, content_hash, par_language, page_language, origin, depth, spider) " \
+             "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+
+    WRITER_QUEUE_SIZE = 16  # batches
+
+    def __init__(self, path, log=None):
+        self.path = path
+        self.users = 0
+        self.connection = None
+        self.writer = BackgroundWriter("sqlite-" + os.path.basename(path),
+                                       max_queue_size=SqliteParagraphStore.WRITER_QUEUE_SIZE,
+                                       log=log)
+        self.writer.submit(self.connect)
+
+    @staticmethod
+    def content_hash(content):
+        return hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+    def connect(self):
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            for statement in SqliteParagraphStore.SCHEMA:
+                self.connection.execute(statement)
+
+    def insert(self, rows):
+        """ Queue the insertion of ``rows``, returns a Deferred if the writer is busy, see BackgroundWriter.submit """
+        return self.writer.submit(self.insert_rows, rows)
+
+    def insert_rows(self, rows):
+        with self.connection:
+            self.connection.executemany(SqliteParagraphStore.INSERT, rows)
+
+    def close(self):
+        """ Insert all queued rows and close the database, returns a Deferred """
+        self.writer.submit(self.disconnect)
+        return self.writer.close()
+
+    def disconnect(self):
+        self.connection.close()
+        self.connection = None
+
+
+def get_sqlite_store(path, log=None):
+    """ Return the store of the database at ``path`` and register a user, see release_sqlite_store """
+    path = os.path.abspath(path)
+    if path not in _SQLITE_STORES:
+        _SQLITE_STORES[path] = SqliteParagraphStore(path, log=log)
+    _SQLITE_STORES[path].users += 1
+    return _SQLITE_STORES[path]
+
+
+def release_sqlite_store(store):
+    """ Unregister a user of ``store`` and close it once it has no users left, returns a Deferred """
+    store.users -= 1
+    if store.users > 0:
+        return defer.succeed(None)
+    del _SQLITE_STORES[store.path]
+    return store.close()
+
+
+class ContentAddressedStore:
+    """
+    Stores bodies under the sha256 hash of their content in the sharded directories ``<path>/ab/cd/<hash>``,
+    optionally gzip-compressed (``<hash>.gz``), so that identical bodies of different urls are stored once. The hashes
+    of all stored bodies are kept in memory, the directory is only scanned once when the store is created.
+    Bodies are stored from BackgroundWriter threads, access to the index is synchronized.
+    """
+
+    GZIP_SUFFIX = ".gz"
+    CHUNK_SIZE = 1024 ** 2
+
+    def __init__(self, path, compress=False):
+        self.path = path
+        self.compress = compress
+        self.lock = threading.Lock()
+        self.hashes = set()
+
+        os.makedirs(self.path, exist_ok=True)
+        for _, _, files in os.walk(self.path):
+            for filename in files:
+                if not filename.startswith("tmp"):
+                    self.hashes.add(filename[:64])
+
+    def object_path(self, digest):
+        return os.path.join(self.path, digest[:2], digest[2:4], digest + (self.GZIP_SUFFIX if self.compress else ""))
+
+    @staticmethod
+    def find(path, digest):
+        """ Return the path of the body with hash ``digest`` in the store at ``path``, None if it is not stored """
+        for suffix in ("", ContentAddressedStore.GZIP_SUFFIX):
+            object_path = os.path.join(path, digest[:2], digest[2:4], digest + suffix)
+            if os.path.exists(object_path):
+                return object_path
+        return None
+
+    @staticmethod
+    def read(path, digest):
+        """ Return the body with hash ``digest`` from the store at ``path`` """
+        object_path = ContentAddressedStore.find(path, digest)
+        if object_path is None:
+            raise KeyError(digest)
+        opener = gzip.open if object_path.endswith(ContentAddressedStore.GZIP_SUFFIX) else open
+        with opener(object_path, "rb") as object_file:
+            return object_file.read()
+
+    def chunks(self, content, content_file):
+        if content_file is None:
+            yield content
+            return
+        with open(content_file, "rb") as spooled:
+            for chunk in iter(lambda: spooled.read(ContentAddressedStore.CHUNK_SIZE), b""):
+                yield chunk
+
+    def put(self, content=None, content_file=None):
+        """
+        Store ``content``, or the content of the spool file ``content_file``, which is removed afterwards. Return
+        (hash, size, new), where new is False if the same content was already stored.
+        """
+        sha256 = hashlib.sha256()
+        size = 0
+        for chunk in self.chunks(content, content_file):
+            sha256.update(chunk)
+            size += len(chunk)
+        digest = sha256.hexdigest()
+
+        with self.lock:
+            new = digest not in self.hashes
+            self.hashes.add(digest)  # reserve, so that no other writer thread stores the same content
+
+        try:
+            if new:
+                self.write(digest, content, content_file)
+        except Exception:
+            with self.lock:
+                self.hashes.discard(digest)
+            raise
+        finally:
+            if content_file is not None and os.path.exists(content_file):
+                os.unlink(content_file)
+
+        return digest, size, new
+
+    def write(self, digest, content, content_file):
+        object_path = self.object_path(digest)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+
+        if content_file is not None and not self.compress:
+            # spooled body, move it into place without copying if output and spool share a file system
+            shutil.move(content_file, object_path)
+            return
+
+        # write to a temporary file first, so that the store never holds partial bodies
+        handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(object_path))
+        with os.fdopen(handle, "wb") as tmp_file:
+            target = gzip.GzipFile(fileobj=tmp_file, mode="wb", mtime=0) if self.compress else tmp_file
+            for chunk in self.chunks(content, content_file):
+                target.write(chunk)
+            if self.compress:
+                target.close()
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, object_path)
+
+
+def get_content_store(path, compress=False):
+    """ Return the content store located at ``path``, creating it on first request """
+    path = os.path.abspath(path)
+    if path not in _CONTENT_STORES:
+        _CONTENT_STORES[path] = ContentAddressedStore(path, compress=compress)
+    return _CONTENT_STORES[path]
+
+
+def get_simhash_index(name, distance, capacity):
+    """ Return the simhash index of the crawl ``name`` and register a user, see release_simhash_index """
+    if name not in _SIMHASH_INDEXES:
+        _SIMHASH_INDEXES[name] = [SimHashIndex(distance=distance, capacity=capacity), 0]
+    _SIMHASH_INDEXES[name][1] += 1
+    return _SIMHASH_INDEXES[name][0]
+
+
+def release_simhash_index(name):
+    """ Unregister a user of the simhash index of the crawl ``name`` and drop it once it has no users left """
+    _SIMHASH_INDEXES[name][1] -= 1
+    if _SIMHASH_INDEXES[name][1] <= 0:
+        del _SIMHASH_INDEXES[name]
+
+
+###
+# Item Processors
+###
+
+# sent by a multi-domain spider once no request of a domain is pending anymore, with the argument 'context'
+domain_finished = object()
+
+# sent by spiders of incremental crawls for pages that did not change since the previous crawl, with the arguments
+# 'response' and 'spider'
+page_unchanged = object()
+
+
+class DomainPipelineManager(ItemPipelineManager):
+    """
+    Item processor (scrapy setting ITEM_PROCESSOR) of multi-domain crawls, in which a single spider crawls all start
+    urls. Items are routed to the DomainContext of their domain, which is handed to the pipelines in place of the
+    spider, so that the pipelines keep writing one output per start url. The pipelines are opened for a domain with
+    its first item, and closed once the spider signals domain_finished and all items of the domain passed the
+    pipelines. Spiders without the attribute 'multi_domain' are passed through to the pipelines unchanged.
+
+    Pages that did not change since the previous crawl (signal page_unchanged) are handed to the page_unchanged
+    method of the pipelines that have one, in the same way as items.
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        manager = super().from_crawler(crawler)
+        crawler.signals.connect(manager.domain_finished, signal=domain_finished)
+        crawler.signals.connect(manager.page_unchanged, signal=page_unchanged)
+        return manager
+
+    def open_spider(self, spider):
+        if not getattr(spider, "multi_domain", False):
+            return super().open_spider(spider)
+
+        self.spider = spider
+        self.contexts = dict()  # domain contexts with open pipelines by name
+        self.in_flight = dict()  # number of items per domain context name that are in the pipelines
+        self.finished = set()  # names of finished domain contexts, whose pipelines are closed once in_flight is 0
+        self.closing = dict()  # Deferreds of pipelines that are still closing by domain context name
+        return defer.succeed(None)
+
+    def process_item(self, item, spider):
+        if not getattr(spider, "multi_domain", False):
+            return super().process_item(item, spider)
+
+        context = spider.domain_context(item.get("url"))
+        if context is None:
+            # not from a domain that is being crawled, per-url spiders would not write it either
+            return defer.succeed(item)
+        return self.process_in_context(context, lambda: ItemPipelineManager.process_item(self, item, context))
+
+    def process_in_context(self, context, process):
+        """ Open the pipelines for ``context`` if necessary and call ``process``, the domain is busy until it is done """
+        opened = defer.succeed(None)
+        if context.name not in self.contexts:
+            self.contexts[context.name] = context
+            opened = super().open_spider(context)
+
+        self.in_flight[context.name] = self.in_flight.get(context.name, 0) + 1
+        processed = opened.addCallback(lambda _: process())
+        return processed.addBoth(self.item_processed, context)
+
+    def page_unchanged(self, response, spider):
+        unchanged = lambda context: [pipeline.page_unchanged(response, context) for pipeline in self.middlewares
+                                     if hasattr(pipeline, "page_unchanged")]
+        if not getattr(spider, "multi_domain", False):
+            unchanged(spider)
+            return
+
+        context = spider.domain_context(response.url)
+        if context is not None:
+            self.process_in_context(context, lambda: unchanged(context))
+
+    def item_processed(self, result, context):
+        self.in_flight[context.name] -= 1
+        if self.in_flight[context.name] == 0:
+            del self.in_flight[context.name]
+            if context.name in self.finished:
+                self.close_domain(context)
+        return result
+
+    def domain_finished(self, context):
+        if context.name not in self.contexts:
+            return  # no items at all
+        if context.name in self.in_flight:
+            self.finished.add(context.name)
+        else:
+            self.close_domain(context)
+
+    def close_domain(self, context):
+        self.finished.discard(context.name)
+        del self.contexts[context.name]
+        closing = super().close_spider(context)
+        self.closing[context.name] = closing
+        closing.addErrback(lambda failure: self.spider.s_log.error(
+            "[close_domain] - Closing the pipelines of {0} failed: {1}".format(context.name, failure.value)))
+        closing.addBoth(self.domain_closed, context)
+
+    def domain_closed(self, _, context):
+        del self.closing[context.name]
+
+    def close_spider(self, spider):
+        if not getattr(spider, "multi_domain", False):
+            return super().close_spider(spider)
+
+        for context in list(self.contexts.values()):
+            self.close_domain(context)
+        return defer.DeferredList(list(self.closing.values()))
+
+
 ###
 # Pipelines
 ###
 
 class ContentPipeline:
 
+    last_url = None
+    last_url_allowed = False
+
+    def url_allowed(self, url, spider):
+        """ Return True if items of ``url`` belong to the output of ``spider``, i.e. to one of its allowed domains """
+        # items of a page arrive one after another, only check the domain once per page
+        if url != self.last_url:
+            self.last_url = url
+            self.last_url_allowed = urlparse(url).netloc in spider.allowed_domains
+        return self.last_url_allowed
+
     def open_spider(self, spider):
         spider.s_log.info(f" vvvvvvvvvvvvvvvvvvvvvvvvvvvv OPENING SPIDER {spider.name} vvvvvvvvvvvvvvvvvvvvvvvvvvvv")
 
     def close_spider(self, spider):
         spider.s_log.info(f" ^^^^^^^^^^^^^^^^^^^^^^^^^^^^ CLOSING SPIDER {spider.name} ^^^^^^^^^^^^^^^^^^^^^^^^^^^^")
 
+    @staticmethod
+    def remove_spool_dir(spider):
+        parser = getattr(spider, "parser", None)
+        if hasattr(parser, "spool_dir"):
+            try:
+                os.rmdir(parser.spool_dir())
+            except OSError:
+                pass  # not spooled at all, or still in use by other spiders
+
+
+class ParagraphDeduplicationPipeline(ContentPipeline):
+    """
+    Detects paragraphs that are near-duplicates of a paragraph seen before in the same crawl, i.e. whose 64 bit
+    SimHash differs in at most 'simhash_distance' bits (pipeline_data). Near-duplicates are dropped, or with
+    'simhash_action' "flag" passed on with the item field near_duplicate set. The fingerprints of all spiders of a
+    crawl are kept in a shared SimHashIndex of at most 'simhash_max_fingerprints' fingerprints, the oldest half is
+    forgotten once it is full. Has to run ahead of the pipelines writing the paragraphs (i.e. with a lower order).
+    """
+
+    KEY_DISTANCE = "simhash_distance"
+    KEY_ACTION = "simhash_action"
+    KEY_MAX_FINGERPRINTS = "simhash_max_fingerprints"
+
+    ACTION_DROP = "drop"
+    ACTION_FLAG = "flag"
+
+    STATS_PREFIX = "simhash"
+
+    def __init__(self, stats=None):
+        self.stats = stats
+        self.indexes = dict()
+        self.actions = dict()
+        self.counts = dict()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
+
+    def count(self, spider, key):
+        self.counts[spider.name][key] += 1
+        if self.stats is not None:
+            self.stats.inc_value("{0}/{1}".format(ParagraphDeduplicationPipeline.STATS_PREFIX, key), spider=spider)
+
+    def process_item(self, item, spider):
+        fingerprint = simhash(item.get("content") or "")
+        if fingerprint is None or not self.indexes[spider.name].check(fingerprint):
+            self.count(spider, "unique")
+            return item
+
+        if self.actions[spider.name] == ParagraphDeduplicationPipeline.ACTION_FLAG:
+            self.count(spider, "flagged")
+            item["near_duplicate"] = True
+            return item
+
+        self.count(spider, "dropped")
+        raise DropItem("Near-duplicate paragraph on {0}".format(item["url"]))
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        pipeline_data = getattr(spider.crawl_specification, "pipeline_data", None) or dict()
+
+        action = pipeline_data.get(ParagraphDeduplicationPipeline.KEY_ACTION,
+                                   ParagraphDeduplicationPipeline.ACTION_DROP)
+        if action not in (ParagraphDeduplicationPipeline.ACTION_DROP, ParagraphDeduplicationPipeline.ACTION_FLAG):
+            raise ValueError("Unknown {0} '{1}'".format(ParagraphDeduplicationPipeline.KEY_ACTION, action))
+
+        self.actions[spider.name] = action
+        self.indexes[spider.name] = get_simhash_index(
+            spider.crawl_specification.name,
+            distance=pipeline_data.get(ParagraphDeduplicationPipeline.KEY_DISTANCE, SimHashIndex.DEFAULT_DISTANCE),
+            capacity=pipeline_data.get(ParagraphDeduplicationPipeline.KEY_MAX_FINGERPRINTS,
+                                       SimHashIndex.DEFAULT_CAPACITY))
+        self.counts[spider.name] = {"unique": 0, "dropped": 0, "flagged": 0}
+
+    def close_spider(self, spider):
+        super().close_spider(spider)
+
+        counts = self.counts.pop(spider.name)
+        total = sum(counts.values())
+        duplicates = counts["dropped"] + counts["flagged"]
+        spider.s_log.info("[close_spider] - {0} of {1} paragraphs were near-duplicates ({2:.1f}%), {3} dropped, "
+                          "{4} flagged".format(duplicates, total, 100.0 * duplicates / max(1, total),
+                                               counts["dropped"], counts["flagged"]))
+
+        del self.indexes[spider.name]
+        del self.actions[spider.name]
+        release_simhash_index(spider.crawl_specification.name)
+
 
 class Paragraph2CsvPipeline(ContentPipeline):
+    """
+    Writes paragraph items to one csv file per spider. The file is kept open while the spider runs, rows are buffered
+    and written in batches once FLUSH_ROWS rows or FLUSH_BYTES bytes of content are buffered, and at close_spider.
+    Batches are written by a BackgroundWriter thread.
+
+    With the pipeline_data options 'csv_max_rows' or 'csv_max_size', the output is split into the parts
+    <spider name>.00000.csv, <spider name>.00001.csv, ... A part is completed once it reaches either limit (the size is
+    checked after every batch), it is then renamed from <part>-INCOMPLETE.csv and appended to the tab-separated
+    manifest <spider name>.manifest.tsv with its number of rows, size and sha256 hash, so that completed parts can be
+    consumed while the spider is still running.
+
+    Spiders of resumed crawls append to the csv file of the interrupted crawl, or continue with the next part.
+
+    In incremental crawls, pages that did not change since the previous crawl are not parsed again. The output of the
+    previous crawl is moved to the directory <spider name>.previous when the spider opens, and the rows of the
+    unchanged pages are copied from it into the new output at close_spider. The directory is removed afterwards, unless
+    the crawl is resumable, then it is kept until the next crawl that is not a resume.
+    """
 
     INCOMPLETE_FLAG = "-INCOMPLETE"
+    MANIFEST_SUFFIX = ".manifest.tsv"
+    PREVIOUS_SUFFIX = ".previous"
 
-    def process_item(self, item, spider):
+    KEY_MAX_ROWS = "csv_max_rows"
+    KEY_MAX_SIZE = "csv_max_size"
+
+    HEADER = ["url", "content", "par_language", "page_language", "origin", "depth"]
+    FIELDS = ["url", "content", "par_lang", "page_lang", "origin", "depth"]
 
-        df_item = dict()
-        for key in item:
-            # df_item = {"url": [url], "content": [content], "origin": [origin], "depth": [depth]}
-            df_item[key] = [item[key]]
+    FLUSH_ROWS = 1000
+    FLUSH_BYTES = 1024 ** 2
+    WRITER_QUEUE_SIZE = 16  # batches
 
-        url = item['url']
-        domain = urlparse(url).netloc
-        if domain in spider.allowed_domains:
-            spider.s_log.debug("[process_item] - Adding content for {0} to {1}".format(str(url), str(spider.name)))
+    def __init__(self):
+        self.background_writers = dict()
+        self.files = dict()
+        self.parts = dict()  # number, rows, size and hash of the current part of a spider
+        self.limits = dict()  # maximum rows and size of the parts of a spider, None if the output is not split
+        self.buffers = dict()
+        self.buffered_bytes = dict()
+        self.unchanged = dict()  # urls of unchanged pages per spider, their previous rows are carried over
 
-            fullpath = os.path.join(spider.crawl_specification.output, spider.name + self.INCOMPLETE_FLAG + ".csv")
+    @staticmethod
+    def csv_writer(file):
+        # same dialect as pandas.DataFrame.to_csv(sep=";"), so that the finalizers can read the files with pandas
+        return csv.writer(file, delimiter=";", quotechar='"', quoting=csv.QUOTE_MINIMAL, lineterminator=os.linesep)
 
-            # careful, csv file may not exist for some reason (moved, deleted, ..)
-            if os.path.exists(fullpath):
-                df = pandas.DataFrame.from_dict(df_item)
-                df.to_csv(fullpath, mode="a", sep=";", index=False, encoding="utf-8", header=False, line_terminator="")
+    @staticmethod
+    def encode_rows(rows):
+        text = io.StringIO(newline="")
+        Paragraph2CsvPipeline.csv_writer(text).writerows(rows)
+        return text.getvalue().encode("utf-8")
+
+    def process_item(self, item, spider):
+        url = item["url"]
+        if self.url_allowed(url, spider):
+            row = [item.get(field) for field in Paragraph2CsvPipeline.FIELDS]
+            self.buffers[spider.name].append(["" if value is None else value for value in row])
+            self.buffered_bytes[spider.name] += len(item.get("content") or "")
+
+            if len(self.buffers[spider.name]) >= Paragraph2CsvPipeline.FLUSH_ROWS \
+                    or self.buffered_bytes[spider.name] >= Paragraph2CsvPipeline.FLUSH_BYTES:
+                queued = self.flush(spider)
+                if queued is not None:
+                    # writer queue is full, hold back further items until the batch is queued
+                    return queued.addCallback(lambda _: item)
 
         return item
 
+    def page_unchanged(self, response, spider):
+        if self.url_allowed(response.url, spider):
+            self.unchanged[spider.name].add(response.url)
+
+    def flush(self, spider):
+        """ Hand all buffered rows of ``spider`` to its writer thread, returns a Deferred if the writer is busy """
+        rows = self.buffers[spider.name]
+        self.buffers[spider.name] = []
+        self.buffered_bytes[spider.name] = 0
+        if rows:
+            return self.background_writers[spider.name].submit(self.write_rows, spider, rows)
+        return None
+
+    def write_rows(self, spider, rows):
+        count = len(rows)
+        limits = self.limits[spider.name]
+        while rows:
+            batch = rows
+            if limits is not None and limits[0] is not None:
+                # split the batch at the row limit of the current part, every part gets at least one row
+                batch = rows[:max(1, limits[0] - self.parts[spider.name]["rows"])]
+            rows = rows[len(batch):]
+            self.write(spider, Paragraph2CsvPipeline.encode_rows(batch), len(batch))
+
+            part = self.parts[spider.name]
+            if limits is not None and ((limits[0] is not None and part["rows"] >= limits[0])
+                                       or (limits[1] is not None and part["size"] >= limits[1])):
+                self.finish_part(spider)
+                self.open_part(spider, part["number"] + 1)
+        spider.s_log.debug("[write_rows] - Added {0} paragraphs to {1}".format(count, str(spider.name)))
+
+    def write(self, spider, data, rows):
+        part = self.parts[spider.name]
+        self.files[spider.name].write(data)
+        self.files[spider.name].flush()
+        part["hash"].update(data)
+        part["size"] += len(data)
+        part["rows"] += rows
+
+    def part_path(self, spider, number, complete=True):
+        name = spider.name
+        if self.limits[spider.name] is not None:
+            name = "{0}.{1:05d}".format(spider.name, number)
+        return os.path.join(spider.crawl_specification.output,
+                            name + ("" if complete else Paragraph2CsvPipeline.INCOMPLETE_FLAG) + ".csv")
+
+    def open_part(self, spider, number):
+        self.files[spider.name] = open(self.part_path(spider, number, complete=False), "wb")
+        self.parts[spider.name] = {"number": number, "rows": 0, "size": 0, "hash": hashlib.sha256()}
+        self.write(spider, Paragraph2CsvPipeline.encode_rows([Paragraph2CsvPipeline.HEADER]), 0)
+
+    def resume_part(self, spider):
+        """ Reopen the csv file completed by the interrupted crawl of ``spider``, or start its next part """
+        if self.limits[spider.name] is not None:
+            manifest_path = os.path.join(spider.crawl_specification.output,
+                                         spider.name + Paragraph2CsvPipeline.MANIFEST_SUFFIX)
+            completed = len(list(Paragraph2CsvPipeline.read_manifest(manifest_path))) \
+                if os.path.exists(manifest_path) else 0
+            self.open_part(spider, completed)
+            return
+
+        path = self.part_path(spider, 0)
+        if not os.path.exists(path):
+            self.open_part(spider, 0)
+            return
+        os.replace(path, self.part_path(spider, 0, complete=False))
+        part = {"number": 0, "rows": 0, "size": 0, "hash": hashlib.sha256()}
+        self.files[spider.name] = open(self.part_path(spider, 0, complete=False), "a+b")
+        self.files[spider.name].seek(0)
+        for chunk in iter(lambda: self.files[spider.name].read(Paragraph2CsvPipeline.FLUSH_BYTES), b""):
+            part["hash"].update(chunk)
+            part["size"] += len(chunk)
+        self.parts[spider.name] = part
+        spider.s_log.info("[resume_part] - Appending to {0}".format(os.path.basename(path)))
+
+    def finish_part(self, spider):
+        """ Close the current part of ``spider``, rename it and add it to the manifest """
+        self.files.pop(spider.name).close()
+        part = self.parts[spider.name]
+        fullpath_com = self.part_path(spider, part["number"])
+        os.replace(self.part_path(spider, part["number"], complete=False), fullpath_com)
+
+        if self.limits[spider.name] is not None:
+            manifest_path = os.path.join(spider.crawl_specification.output,
+                                         spider.name + Paragraph2CsvPipeline.MANIFEST_SUFFIX)
+            with open(manifest_path, "a", encoding="utf-8", newline="") as manifest:
+                manifest.write("\t".join((os.path.basename(fullpath_com), str(part["rows"]), str(part["size"]),
+                                          part["hash"].hexdigest())) + "\n")
+            spider.s_log.info("[finish_part] - Completed {0} with {1} paragraphs".format(
+                os.path.basename(fullpath_com), part["rows"]))
+
+    def previous_path(self, spider):
+        return os.path.join(spider.crawl_specification.output, spider.name + Paragraph2CsvPipeline.PREVIOUS_SUFFIX)
+
+    def output_files(self, spider):
+        """ Return the names of the existing output files of a previous crawl of ``spider``, parts and manifest """
+        output = spider.crawl_specification.output
+        manifest_path = os.path.join(output, spider.name + Paragraph2CsvPipeline.MANIFEST_SUFFIX)
+        filenames = [spider.name + ".csv"]
+        if os.path.exists(manifest_path):
+            filenames += [filename for filename, _, _, _ in Paragraph2CsvPipeline.read_manifest(manifest_path)]
+            filenames.append(os.path.basename(manifest_path))
+        return [filename for filename in filenames if os.path.exists(os.path.join(output, filename))]
+
+    def remove_previous(self, spider):
+        """ Remove the output of the previous crawl of ``spider``, so that no stale parts remain in the manifest """
+        for filename in self.output_files(spider):
+            os.unlink(os.path.join(spider.crawl_specification.output, filename))
+
+    def move_previous(self, spider):
+        """ Move the output of the previous crawl of ``spider`` aside, the rows of unchanged pages are taken from it """
+        previous_path = self.previous_path(spider)
+        shutil.rmtree(previous_path, ignore_errors=True)
+        output = spider.crawl_specification.output
+        for filename in self.output_files(spider):
+            os.makedirs(previous_path, exist_ok=True)
+            os.replace(os.path.join(output, filename), os.path.join(previous_path, filename))
+
+    def read_previous(self, spider):
+        """ Yield the rows of the previous output of ``spider``, in the order they were written """
+        previous_path = self.previous_path(spider)
+        manifest_path = os.path.join(previous_path, spider.name + Paragraph2CsvPipeline.MANIFEST_SUFFIX)
+        if os.path.exists(manifest_path):
+            filenames = [filename for filename, _, _, _ in Paragraph2CsvPipeline.read_manifest(manifest_path)]
+        else:
+            filenames = [spider.name + ".csv"]
+        for filename in filenames:
+            path = os.path.join(previous_path, filename)
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8", newline="") as previous:
+                reader = csv.reader(previous, delimiter=";", quotechar='"')
+                next(reader, None)  # header
+                yield from reader
+
+    def carry_over(self, spider, urls):
+        """ Write the rows of the previous output of ``spider`` that belong to the unchanged pages ``urls`` """
+        batch = []
+        carried = 0
+        for row in self.read_previous(spider):
+            if row and row[0] in urls:
+                batch.append(row)
+                if len(batch) >= Paragraph2CsvPipeline.FLUSH_ROWS:
+                    carried += len(batch)
+                    self.write_rows(spider, batch)
+                    batch = []
+        if batch:
+            carried += len(batch)
+            self.write_rows(spider, batch)
+        spider.s_log.info("[carry_over] - Carried over {0} paragraphs of {1} unchanged pages".format(
+            carried, len(urls)))
+
+    @staticmethod
+    def read_manifest(path):
+        """ Yield (file name, rows, size, sha256 hash) of all completed parts listed in the manifest at ``path`` """
+        with open(path, "r", encoding="utf-8", newline="") as manifest:
+            for line in manifest:
+                filename, rows, size, digest = line.rstrip("\n").split("\t")
+                yield filename, int(rows), int(size), digest
+
     def open_spider(self, spider):
         super().open_spider(spider)
+        pipeline_data = getattr(spider.crawl_specification, "pipeline_data", None) or dict()
+
         # make sure output directory exists
         if not os.path.exists(spider.crawl_specification.output):
             os.makedirs(spider.crawl_specification.output, exist_ok=True)
 
-        # initialize necessary csv data file
-        fullpath = os.path.join(spider.crawl_specification.output, spider.name + self.INCOMPLETE_FLAG + ".csv")
+        max_rows = pipeline_data.get(Paragraph2CsvPipeline.KEY_MAX_ROWS, None)
+        max_size = pipeline_data.get(Paragraph2CsvPipeline.KEY_MAX_SIZE, None)
+        for key, limit in [(Paragraph2CsvPipeline.KEY_MAX_ROWS, max_rows),
+                           (Paragraph2CsvPipeline.KEY_MAX_SIZE, max_size)]:
+            if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit <= 0):
+                raise ValueError("{0} has to be a positive integer, got '{1}'".format(key, limit))
+        self.limits[spider.name] = (max_rows, max_size) if max_rows is not None or max_size is not None else None
 
-        df = pandas.DataFrame(columns=["url", "content", "par_language", "page_language", "origin", "depth"])
-        df.to_csv(fullpath, sep=";", index=False, encoding="utf-8")
+        # initialize necessary csv data file
+        if getattr(spider, "resumed", False):
+            self.resume_part(spider)
+        else:
+            if getattr(spider, "change_index", None) is not None:
+                self.move_previous(spider)
+            else:
+                self.remove_previous(spider)
+            self.open_part(spider, 0)
+        self.buffers[spider.name] = []
+        self.buffered_bytes[spider.name] = 0
+        self.unchanged[spider.name] = set()
+        self.background_writers[spider.name] = BackgroundWriter("csv-" + spider.name,
+                                                                max_queue_size=Paragraph2CsvPipeline.WRITER_QUEUE_SIZE,
+                                                                log=spider.s_log)
 
     def close_spider(self, spider):
         super().close_spider(spider)
 
-        fullpath_inc = os.path.join(spider.crawl_specification.output, spider.name + self.INCOMPLETE_FLAG + ".csv")
-        fullpath_com = os.path.join(spider.crawl_specification.output, spider.name + ".csv")
+        self.flush(spider)
+        background_writer = self.background_writers.pop(spider.name)
+        unchanged = self.unchanged.pop(spider.name)
+        if unchanged:
+            # after all rows of the crawl, in the writer thread since the previous output may be large
+            background_writer.submit(self.carry_over, spider, unchanged)
+        return background_writer.close().addCallback(lambda _: self.finish_file(spider))
+
+    def finish_file(self, spider):
+        part = self.parts[spider.name]
+        if part["rows"] == 0 and part["number"] > 0:
+            # the previous part reached the limit with the last batch
+            self.files.pop(spider.name).close()
+            os.unlink(self.part_path(spider, part["number"], complete=False))
+        else:
+            self.finish_part(spider)
+
+        del self.parts[spider.name]
+        del self.limits[spider.name]
+        del self.buffers[spider.name]
+        del self.buffered_bytes[spider.name]
+
+        # resumed runs of a resumable crawl still carry over the rows of the pages they find unchanged
+        if not getattr(spider, "job_dir", None):
+            shutil.rmtree(self.previous_path(spider), ignore_errors=True)
+
+
+class Paragraph2SqlitePipeline(ContentPipeline):
+    """
+    Writes paragraph items to the SQLite database <crawl name>.sqlite in the output directory, which is shared by all
+    spiders of the crawl. Rows are buffered and inserted in batches of FLUSH_ROWS rows, and at close_spider.
+    """
+
+    FLUSH_ROWS = 1000
+
+    def __init__(self):
+        self.stores = dict()
+        self.buffers = dict()
 
-        shutil.move(fullpath_inc, fullpath_com)
+    def process_item(self, item, spider):
+        if self.url_allowed(item["url"], spider):
+            content = item.get("content") or ""
+            par_lang = item.get("par_lang")
+            self.buffers[spider.name].append((item["url"],
+                                              content,
+                                              SqliteParagraphStore.content_hash(content),
+                                              None if par_lang is None else str(par_lang),
+                                              item.get("page_lang"),
+                                              item.get("origin"),
+                                              item.get("depth"),
+                                              spider.name))
+
+            if len(self.buffers[spider.name]) >= Paragraph2SqlitePipeline.FLUSH_ROWS:
+                queued = self.flush(spider)
+                if queued is not None:
+                    # writer queue is full, hold back further items until the batch is queued
+                    return queued.addCallback(lambda _: item)
+
+        return item
+
+    def flush(self, spider):
+        rows = self.buffers[spider.name]
+        self.buffers[spider.name] = []
+        if rows:
+            return self.stores[spider.name].insert(rows)
+        return None
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        # make sure output directory exists
+        if not os.path.exists(spider.crawl_specification.output):
+            os.makedirs(spider.crawl_specification.output, exist_ok=True)
+
+        path = os.path.join(spider.crawl_specification.output, spider.crawl_specification.name + ".sqlite")
+        self.stores[spider.name] = get_sqlite_store(path, log=spider.s_log)
+        self.buffers[spider.name] = []
+
+    def close_spider(self, spider):
+        super().close_spider(spider)
+
+        self.flush(spider)
+        del self.buffers[spider.name]
+        return release_sqlite_store(self.stores.pop(spider.name))
 
 
 class Raw2FilePipeline(ContentPipeline):
+    """
+    Writes the body of every raw content item to a file in the spider's output directory. Files are written by
+    WRITER_THREADS BackgroundWriter threads, items written to the same file by the same thread in their order.
+
+    With the pipeline_data option 'content_addressed', bodies are instead stored once per distinct content in the
+    ContentAddressedStore <output>/objects, shared by all spiders of the crawl, and the url, hash, size and depth of
+    every item are appended to the tab-separated manifest <output>/<spider name>/manifest.tsv (in the order in which
+    the writer threads finish).
+    """
+
+    KEY_CONTENT_ADDRESSED = "content_addressed"
+    KEY_CONTENT_COMPRESSION = "content_compression"
+
+    OBJECTS_DIR = "objects"
+    MANIFEST = "manifest.tsv"
+
+    WRITER_THREADS = 4
+    WRITER_QUEUE_SIZE = 64  # files
+
+    def __init__(self):
+        self.background_writers = dict()
+        self.abbreviated = dict()  # abbreviated file names per spider whose write is still pending
+        self.content_stores = dict()
+        self.manifests = dict()
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        self.background_writers[spider.name] = BackgroundWriter("raw-" + spider.name,
+                                                                max_queue_size=Raw2FilePipeline.WRITER_QUEUE_SIZE,
+                                                                threads=Raw2FilePipeline.WRITER_THREADS,
+                                                                log=spider.s_log)
+        self.abbreviated[spider.name] = set()
+
+        pipeline_data = getattr(spider.crawl_specification, "pipeline_data", None) or dict()
+        if pipeline_data.get(Raw2FilePipeline.KEY_CONTENT_ADDRESSED, False):
+            self.content_stores[spider.name] = get_content_store(
+                os.path.join(spider.crawl_specification.output, Raw2FilePipeline.OBJECTS_DIR),
+                compress=pipeline_data.get(Raw2FilePipeline.KEY_CONTENT_COMPRESSION, False))
+            domain_data_dir = os.path.join(spider.crawl_specification.output, spider.name)
+            os.makedirs(domain_data_dir, exist_ok=True)
+            # resumed crawls continue the manifest of the interrupted crawl, other crawls replace it
+            mode = "a" if getattr(spider, "resumed", False) else "w"
+            self.manifests[spider.name] = (open(os.path.join(domain_data_dir, Raw2FilePipeline.MANIFEST), mode,
+                                                encoding="utf-8", newline=""),
+                                           threading.Lock())
 
     def process_item(self, item, spider):
         url = item["url"]
         content = item["content"]
+        content_file = item.get("content_file")
 
         p_url = urlparse(url)
-        domain = p_url.netloc
-        if domain in spider.allowed_domains:
+        allowed = self.url_allowed(url, spider)
+        if allowed and spider.name in self.content_stores:
+            item["content_file"] = None
+            queued = self.background_writers[spider.name].submit(self.store_content, spider, item, content,
+                                                                 content_file)
+        elif allowed:
             domain_data_dir = os.path.join(spider.crawl_specification.output, spider.name)
 
-            # careful, csv file may not exist for some reason (moved, deleted, ..)
-            if not os.path.exists(domain_data_dir):
-                os.makedirs(domain_data_dir, exist_ok=True)
-
             if "." in p_url.path.split("/")[-1]:
                 filename = shared.url2filename(p_url.path)
             else:
@@ -162,14 +1073,400 @@ class Raw2FilePipeline(ContentPipeline):
                 filename = filename[:front] + insert + filename[-back:]
                 fn_unique = filename
                 unique = 1
-                while os.path.exists(os.path.join(domain_data_dir, fn_unique)):
+                # files of abbreviated names that were queued, but are not yet written, have to be avoided as well
+                while fn_unique in self.abbreviated[spider.name] \
+                        or os.path.exists(os.path.join(domain_data_dir, fn_unique)):
                     fn_unique = ".".join(filename.split(".")[:-1]) + f" ({unique})." + filename.split(".")[-1]
                     unique += 1
                 filename = fn_unique
+                pending = self.abbreviated[spider.name]
+                pending.add(filename)
+            else:
+                pending = None
+
+            if content_file:
+                item["content_file"] = os.path.join(domain_data_dir, filename)
+            # urls that map to the same file (e.g. differing in their query only) are written in the order of the items
+            queued = self.background_writers[spider.name].submit(Raw2FilePipeline.write_file, spider, url,
+                                                                 domain_data_dir, filename, content, content_file,
+                                                                 pending, key=os.path.join(domain_data_dir, filename))
+        elif content_file:
+            item["content_file"] = None
+            queued = self.background_writers[spider.name].submit(os.unlink, content_file)
+        else:
+            queued = None
+
+        if queued is not None:
+            # writer queue is full, hold back further items until the file is queued
+            return queued.addCallback(lambda _: item)
+        return item
+
+    def store_content(self, spider, item, content, content_file):
+        digest, size, new = self.content_stores[spider.name].put(content=content, content_file=content_file)
+
+        manifest, lock = self.manifests[spider.name]
+        with lock:
+            manifest.write("\t".join((item["url"], digest, str(size), str(item.get("depth", "")))) + "\n")
+            manifest.flush()
+        spider.s_log.debug(f"[store_content] - {'Added' if new else 'Referenced'} content {digest} for "
+                           f"{item['url']} in {spider.name}")
+
+    @staticmethod
+    def read_manifest(path):
+        """ Yield (url, hash, size, depth) of all entries of the manifest at ``path`` """
+        with open(path, "r", encoding="utf-8", newline="") as manifest:
+            for line in manifest:
+                url, digest, size, depth = line.rstrip("\n").split("\t")
+                yield url, digest, int(size), int(depth) if depth else None
+
+    @staticmethod
+    def write_file(spider, url, domain_data_dir, filename, content, content_file, pending=None):
+        """ Write the body of ``url`` to ``filename``, which is then removed from the set of pending names """
+        try:
+            # careful, output directory may not exist for some reason (moved, deleted, ..)
+            os.makedirs(domain_data_dir, exist_ok=True)
+
+            if content_file:
+                # spooled body, move it into place without copying if output and spool share a file system
+                shutil.move(content_file, os.path.join(domain_data_dir, filename))
+                spider.s_log.debug(f"[write_file] - Moved spooled content for {url} to {spider.name}")
+            else:
+                with open(os.path.join(domain_data_dir, filename), "wb") as file:
+                    file.write(content)
+                    spider.s_log.debug(f"[write_file] - Added content for {url} to {spider.name}")
+        finally:
+            # the file is on disk now, which the collision check of abbreviated names sees as well
+            if pending is not None:
+                pending.discard(filename)
+
+    def close_spider(self, spider):
+        super().close_spider(spider)
+
+        del self.abbreviated[spider.name]
+        return self.background_writers.pop(spider.name).close().addCallback(lambda _: self.finish_files(spider))
+
+    def finish_files(self, spider):
+        self.content_stores.pop(spider.name, None)
+        if spider.name in self.manifests:
+            self.manifests.pop(spider.name)[0].close()
+        self.remove_spool_dir(spider)
+
+
+class Raw2WarcPipeline(ContentPipeline):
+    """
+    Writes a request and a response record for every raw content item to the WARC files
+    <output>/<spider name>-<number>.warc.gz, each record is a gzip member of its own. A new file is started once a file
+    exceeds the pipeline_data option 'warc_max_size'. At close_spider, the CDX index <output>/<spider name>.cdx of all
+    response records is written, sorted by url key, which gives the file, offset and length of every record.
+
+    Scrapy decompresses bodies before they are parsed, so Content-Encoding and Transfer-Encoding are removed from the
+    recorded response headers and Content-Length is set to the length of the recorded body.
+    """
+
+    KEY_WARC_MAX_SIZE = "warc_max_size"
+
+    DEFAULT_WARC_MAX_SIZE = 1024 ** 3
 
+    CDX_HEADER = " CDX N b a m s k r M S V g\n"
+    DROPPED_HEADERS = {"content-encoding", "transfer-encoding", "content-length"}
+    CHUNK_SIZE = 1024 ** 2
 
-            with open(os.path.join(domain_data_dir, filename), "wb") as file:
-                file.write(content)
-                spider.s_log.debug(f"[process_item] - Added content for {url} to {spider.name}")
+    WRITER_QUEUE_SIZE = 64  # records
 
+    def __init__(self):
+        self.background_writers = dict()
+        self.warc_files = dict()  # spider name -> [file number, file]
+        self.cdx_lines = dict()
+        self.max_sizes = dict()
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        os.makedirs(spider.crawl_specification.output, exist_ok=True)
+        pipeline_data = getattr(spider.crawl_specification, "pipeline_data", None) or dict()
+
+        self.max_sizes[spider.name] = pipeline_data.get(Raw2WarcPipeline.KEY_WARC_MAX_SIZE,
+                                                        Raw2WarcPipeline.DEFAULT_WARC_MAX_SIZE)
+        self.cdx_lines[spider.name] = []
+        if getattr(spider, "resumed", False) and os.path.exists(self.cdx_path(spider)):
+            # the records of the interrupted crawl stay in their WARC files
+            with open(self.cdx_path(spider), "r", encoding="utf-8", newline="") as cdx_file:
+                self.cdx_lines[spider.name].extend(line for line in cdx_file if line != Raw2WarcPipeline.CDX_HEADER)
+        self.warc_files[spider.name] = [-1, None]
+        self.background_writers[spider.name] = BackgroundWriter("warc-" + spider.name,
+                                                                max_queue_size=Raw2WarcPipeline.WRITER_QUEUE_SIZE,
+                                                                log=spider.s_log)
+
+    def process_item(self, item, spider):
+        content_file = item.get("content_file")
+        if self.url_allowed(item["url"], spider):
+            queued = self.background_writers[spider.name].submit(self.write_records, spider, dict(item))
+        elif content_file:
+            queued = self.background_writers[spider.name].submit(os.unlink, content_file)
+        else:
+            queued = None
+        item["content_file"] = None
+
+        if queued is not None:
+            # writer queue is full, hold back further items until the records are queued
+            return queued.addCallback(lambda _: item)
         return item
+
+    def cdx_path(self, spider):
+        return os.path.join(spider.crawl_specification.output, spider.name + ".cdx")
+
+    def warc_path(self, spider, number):
+        return os.path.join(spider.crawl_specification.output, "{0}-{1:05d}.warc.gz".format(spider.name, number))
+
+    def warc_file(self, spider):
+        """ Return the current WARC file of ``spider``, start a new one if the current one is full """
+        number, warc_file = self.warc_files[spider.name]
+        if warc_file is not None and warc_file.tell() < self.max_sizes[spider.name]:
+            return warc_file
+
+        if warc_file is not None:
+            warc_file.close()
+        number += 1
+        while os.path.exists(self.warc_path(spider, number)):
+            number += 1  # never overwrite the files of a previous crawl
+        warc_file = open(self.warc_path(spider, number), "xb")
+        self.warc_files[spider.name] = [number, warc_file]
+
+        info = "software: OWS-scrapy-wrapper\r\nformat: WARC File Format 1.0\r\n".encode("utf-8")
+        Raw2WarcPipeline.write_record(warc_file,
+                                      Raw2WarcPipeline.warc_headers("warcinfo", None, "application/warc-fields",
+                                                                    len(info),
+                                                                    filename=os.path.basename(warc_file.name)),
+                                      info)
+        return warc_file
+
+    @staticmethod
+    def warc_headers(record_type, url, content_type, length, record_id=None, date=None, **fields):
+        headers = [("WARC-Type", record_type),
+                   ("WARC-Record-ID", record_id or Raw2WarcPipeline.record_id()),
+                   ("WARC-Date", date or datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"))]
+        if url is not None:
+            headers.append(("WARC-Target-URI", url))
+        for name, value in fields.items():
+            # e.g. payload_digest -> WARC-Payload-Digest
+            headers.append(("WARC-" + "-".join(part.capitalize() for part in name.split("_")), value))
+        headers.append(("Content-Type", content_type))
+        headers.append(("Content-Length", str(length)))
+        return headers
+
+    @staticmethod
+    def record_id():
+        return "<urn:uuid:{0}>".format(uuid.uuid4())
+
+    @staticmethod
+    def http_head(first_line, headers):
+        lines = [first_line]
+        for name, values in headers:
+            lines.extend("{0}: {1}".format(name, value) for value in values)
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1", errors="replace")
+
+    @staticmethod
+    def body_chunks(item):
+        if item.get("content_file"):
+            with open(item["content_file"], "rb") as spooled:
+                for chunk in iter(lambda: spooled.read(Raw2WarcPipeline.CHUNK_SIZE), b""):
+                    yield chunk
+        elif item.get("content"):
+            yield item["content"]
+
+    @staticmethod
+    def write_record(warc_file, warc_headers, head, body_chunks=()):
+        """ Write a record as a gzip member of its own, return its offset and length in the file """
+        offset = warc_file.tell()
+        warc_head = "WARC/1.0\r\n" + "".join("{0}: {1}\r\n".format(name, value) for name, value in warc_headers)
+        with gzip.GzipFile(fileobj=warc_file, mode="wb") as member:
+            member.write((warc_head + "\r\n").encode("utf-8"))
+            member.write(head)
+            for chunk in body_chunks:
+                member.write(chunk)
+            member.write(b"\r\n\r\n")
+        warc_file.flush()
+        return offset, warc_file.tell() - offset
+
+    def write_records(self, spider, item):
+        url = item["url"]
+        p_url = urlparse(url)
+        date = datetime.now(timezone.utc)
+        warc_date = date.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        sha1 = hashlib.sha1()
+        length = 0
+        for chunk in Raw2WarcPipeline.body_chunks(item):
+            sha1.update(chunk)
+            length += len(chunk)
+        payload_digest = "sha1:" + base64.b32encode(sha1.digest()).decode("ascii")
+
+        status = item.get("status") or 200
+        headers = item.get("headers") or dict()
+        response_head = Raw2WarcPipeline.http_head(
+            "HTTP/1.1 {0} {1}".format(status, http.client.responses.get(status, "")),
+            [(name, values) for name, values in headers.items()
+             if name.lower() not in Raw2WarcPipeline.DROPPED_HEADERS] + [("Content-Length", [str(length)])])
+        request_head = Raw2WarcPipeline.http_head(
+            "GET {0} HTTP/1.1".format((p_url.path or "/") + ("?" + p_url.query if p_url.query else "")),
+            [("Host", [p_url.netloc])] + [(name, values) for name, values in (item.get("request_headers") or {}).items()
+                                          if name.lower() != "host"])
+
+        warc_file = self.warc_file(spider)
+        response_id = Raw2WarcPipeline.record_id()
+        offset, record_length = Raw2WarcPipeline.write_record(
+            warc_file,
+            Raw2WarcPipeline.warc_headers("response", url, "application/http; msgtype=response",
+                                          len(response_head) + length, record_id=response_id, date=warc_date,
+                                          payload_digest=payload_digest),
+            response_head,
+            Raw2WarcPipeline.body_chunks(item))
+        Raw2WarcPipeline.write_record(
+            warc_file,
+            Raw2WarcPipeline.warc_headers("request", url, "application/http; msgtype=request", len(request_head),
+                                          date=warc_date, concurrent_to=response_id),
+            request_head)
+        if item.get("content_file"):
+            os.unlink(item["content_file"])
+
+        mime = "-"
+        for name, values in headers.items():
+            if name.lower() == "content-type" and values:
+                mime = values[0].split(";")[0].strip() or "-"
+        self.cdx_lines[spider.name].append(" ".join((Raw2WarcPipeline.url_key(url), date.strftime("%Y%m%d%H%M%S"), url,
+                                                     mime, str(status), payload_digest[5:], "-", "-",
+                                                     str(record_length), str(offset),
+                                                     os.path.basename(warc_file.name))) + "\n")
+        spider.s_log.debug(f"[write_records] - Added records for {url} to {os.path.basename(warc_file.name)}")
+
+    @staticmethod
+    def url_key(url):
+        """ Return the SURT form of ``url`` used as CDX sort key, e.g. com,example)/path?query """
+        p_url = urlparse(url)
+        host = (p_url.hostname or "").lower()
+        if host.startswith("www."):
+            host = host[4:]
+        key = ",".join(reversed(host.split("."))) + ")" + (p_url.path or "/").lower()
+        if p_url.query:
+            key += "?" + p_url.query.lower()
+        return key
+
+    @staticmethod
+    def read_record(path, offset, length):
+        """ Return the uncompressed WARC record of ``length`` compressed bytes at ``offset`` of the file at ``path`` """
+        with open(path, "rb") as warc_file:
+            warc_file.seek(offset)
+            return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(warc_file.read(length))
+
+    def close_spider(self, spider):
+        super().close_spider(spider)
+        return self.background_writers.pop(spider.name).close().addCallback(lambda _: self.finish_files(spider))
+
+    def finish_files(self, spider):
+        _, warc_file = self.warc_files.pop(spider.name)
+        if warc_file is not None:
+            warc_file.close()
+        del self.max_sizes[spider.name]
+
+        cdx_lines = self.cdx_lines.pop(spider.name)
+        cdx_lines.sort()
+        cdx_path = self.cdx_path(spider)
+        with open(cdx_path + ".tmp", "w", encoding="utf-8", newline="") as cdx_file:
+            cdx_file.write(Raw2WarcPipeline.CDX_HEADER)
+            cdx_file.writelines(cdx_lines)
+        os.replace(cdx_path + ".tmp", cdx_path)
+        self.remove_spool_dir(spider)
+
+
+class Item2SegmentPipeline(ContentPipeline):
+    """
+    Writes paragraph or raw content items to the record store <spider name> in the output directory, see
+    record_store. Binary item content (raw bodies) is stored as record data, all other fields as record meta data.
+    Records are handed to a BackgroundWriter thread in batches of about one block.
+    """
+
+    KEY_SEGMENT_SIZE = "segment_size"
+    KEY_BLOCK_SIZE = "segment_block_size"
+    KEY_COMPRESSION = "segment_compression"
+
+    WRITER_QUEUE_SIZE = 16  # batches
+
+    def __init__(self):
+        self.background_writers = dict()
+        self.segment_writers = dict()
+        self.buffers = dict()
+        self.buffered_bytes = dict()
+
+    def process_item(self, item, spider):
+        content_file = item.get("content_file")
+        if not self.url_allowed(item["url"], spider):
+            if content_file:
+                item["content_file"] = None
+                return self.queued(self.background_writers[spider.name].submit(os.unlink, content_file), item)
+            return item
+
+        meta = {key: value for key, value in item.items() if key != "content_file"}
+        data = b""
+        if isinstance(meta.get("content"), bytes) or content_file:
+            data = meta.pop("content") or b""
+        self.buffers[spider.name].append((meta, data, content_file))
+        self.buffered_bytes[spider.name] += len(data) + len(str(meta.get("content") or ""))
+
+        if self.buffered_bytes[spider.name] >= self.segment_writers[spider.name].block_size or content_file:
+            return self.queued(self.flush(spider), item)
+        return item
+
+    @staticmethod
+    def queued(deferred, item):
+        if deferred is not None:
+            # writer queue is full, hold back further items until the batch is queued
+            return deferred.addCallback(lambda _: item)
+        return item
+
+    def flush(self, spider):
+        records = self.buffers[spider.name]
+        self.buffers[spider.name] = []
+        self.buffered_bytes[spider.name] = 0
+        if records:
+            return self.background_writers[spider.name].submit(self.write_records, spider, records)
+        return None
+
+    def write_records(self, spider, records):
+        segment_writer = self.segment_writers[spider.name]
+        for meta, data, content_file in records:
+            if content_file:
+                # spooled body, the record store replaces the spool file
+                with open(content_file, "rb") as spooled:
+                    data = spooled.read()
+                os.unlink(content_file)
+            segment_writer.append(meta, data)
+        spider.s_log.debug("[write_records] - Added {0} records to {1}".format(len(records), str(spider.name)))
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        pipeline_data = getattr(spider.crawl_specification, "pipeline_data", None) or dict()
+
+        self.segment_writers[spider.name] = record_store.SegmentWriter(
+            spider.crawl_specification.output,
+            spider.name,
+            segment_size=pipeline_data.get(Item2SegmentPipeline.KEY_SEGMENT_SIZE,
+                                           record_store.SegmentWriter.DEFAULT_SEGMENT_SIZE),
+            block_size=pipeline_data.get(Item2SegmentPipeline.KEY_BLOCK_SIZE,
+                                         record_store.SegmentWriter.DEFAULT_BLOCK_SIZE),
+            compression=pipeline_data.get(Item2SegmentPipeline.KEY_COMPRESSION, None))
+        self.background_writers[spider.name] = BackgroundWriter("segments-" + spider.name,
+                                                                max_queue_size=Item2SegmentPipeline.WRITER_QUEUE_SIZE,
+                                                                log=spider.s_log)
+        self.buffers[spider.name] = []
+        self.buffered_bytes[spider.name] = 0
+
+    def close_spider(self, spider):
+        super().close_spider(spider)
+
+        self.flush(spider)
+        del self.buffers[spider.name]
+        del self.buffered_bytes[spider.name]
+        return self.background_writers.pop(spider.name).close().addCallback(lambda _: self.finish_store(spider))
+
+    def finish_store(self, spider):
+        self.segment_writers.pop(spider.name).close()
+        ContentPipeline.remove_spool_dir(spider)
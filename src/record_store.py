@@ -0,0 +1,295 @@
+"""
+Created on 17.10.2026
+
+@author: Maximilian Pensel
+
+Copyright 2019 Maximilian Pensel <maximilian.pensel@gmx.de>
+
+This file is part of OWS-scrapy-wrapper.
+
+OWS-scrapy-wrapper is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+OWS-scrapy-wrapper is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with OWS-scrapy-wrapper.  If not, see <https://www.gnu.org/licenses/>.
+
+Append-only store of crawl records in segment files.
+
+A store ``<name>`` in a directory consists of the segments ``<name>.00000.seg``, ``<name>.00001.seg``, ... Each
+segment is a sequence of blocks, a block holds a number of records and may be zlib-compressed:
+
+    block:  magic (4 bytes) | flags (1 byte) | raw length (4 bytes) | stored length (4 bytes) | payload
+    record: meta length (4 bytes) | data length (4 bytes) | meta (utf-8 json) | data (bytes)
+
+Next to every segment, the index ``<segment>.idx`` holds one fixed-size entry per record (offset of its block,
+offset of the record in the uncompressed block, record length). Index entries are only written once their block is
+written, so that readers only ever see complete records, even while the segment is still being written.
+"""
+import json
+import mmap
+import os
+import re
+import struct
+import zlib
+
+BLOCK_MAGIC = b"OWSB"
+BLOCK_HEADER = struct.Struct("<4sBII")
+RECORD_HEADER = struct.Struct("<II")
+INDEX_ENTRY = struct.Struct("<QII")
+
+FLAG_ZLIB = 1
+
+SEGMENT_SUFFIX = ".seg"
+INDEX_SUFFIX = ".idx"
+SEGMENT_PATTERN = re.compile(r"^(?P<name>.+)\.(?P<number>\d{5})" + re.escape(SEGMENT_SUFFIX) + "$")
+
+
+class CorruptSegmentError(Exception):
+    """ Raised when a block of a segment does not match its index """
+
+
+def segment_path(directory, name, number):
+    return os.path.join(directory, "{0}.{1:05d}{2}".format(name, number, SEGMENT_SUFFIX))
+
+
+def encode_record(meta, data=b""):
+    meta = json.dumps(meta, ensure_ascii=False, default=str).encode("utf-8")
+    return RECORD_HEADER.pack(len(meta), len(data)) + meta + data
+
+
+def decode_record(buffer, offset=0):
+    """ Return (meta, data) of the record at ``offset`` in ``buffer`` """
+    meta_length, data_length = RECORD_HEADER.unpack_from(buffer, offset)
+    start = offset + RECORD_HEADER.size
+    meta = json.loads(bytes(buffer[start:start + meta_length]).decode("utf-8"))
+    data = bytes(buffer[start + meta_length:start + meta_length + data_length])
+    return meta, data
+
+
+class SegmentWriter:
+    """
+    Appends records to the segments of the store ``name`` in ``directory``. Records are collected in blocks of about
+    ``block_size`` bytes, which are compressed with zlib if a ``compression`` level is given. Once a segment exceeds
+    ``segment_size`` bytes, the next segment is started. Existing segments of the store are never overwritten.
+    """
+
+    DEFAULT_SEGMENT_SIZE = 256 * 1024 ** 2
+    DEFAULT_BLOCK_SIZE = 1024 ** 2
+
+    def __init__(self, directory, name, segment_size=DEFAULT_SEGMENT_SIZE, block_size=DEFAULT_BLOCK_SIZE,
+                 compression=None):
+        self.directory = directory
+        self.name = name
+        self.segment_size = segment_size
+        self.block_size = block_size
+        self.compression = compression
+
+        self.block = bytearray()
+        self.block_entries = []  # (offset in block, length) of the records in the current block
+        self.segment = None
+        self.index = None
+        self.number = max((number for number, _ in list_segments(directory, name)), default=-1) + 1
+
+        os.makedirs(directory, exist_ok=True)
+        self.open_segment()
+
+    def open_segment(self):
+        path = segment_path(self.directory, self.name, self.number)
+        self.segment = open(path, "xb")
+        self.index = open(path + INDEX_SUFFIX, "xb")
+
+    def close_segment(self):
+        self.segment.close()
+        self.index.close()
+
+    def append(self, meta, data=b""):
+        record = encode_record(meta, data)
+        self.block_entries.append((len(self.block), len(record)))
+        self.block.extend(record)
+        if len(self.block) >= self.block_size:
+            self.write_block()
+
+    def write_block(self):
+        if not self.block_entries:
+            return
+
+        flags = 0
+        payload = bytes(self.block)
+        if self.compression is not None:
+            flags |= FLAG_ZLIB
+            payload = zlib.compress(payload, self.compression)
+
+        block_offset = self.segment.tell()
+        self.segment.write(BLOCK_HEADER.pack(BLOCK_MAGIC, flags, len(self.block), len(payload)))
+        self.segment.write(payload)
+        self.segment.flush()
+        self.index.write(b"".join(INDEX_ENTRY.pack(block_offset, offset, length)
+                                  for offset, length in self.block_entries))
+        self.index.flush()
+
+        self.block = bytearray()
+        self.block_entries = []
+
+        if self.segment.tell() >= self.segment_size:
+            self.close_segment()
+            self.number += 1
+            self.open_segment()
+
+    def close(self):
+        self.write_block()
+        self.close_segment()
+
+
+class SegmentReader:
+    """
+    Random access to the records of a single segment. The segment is memory-mapped and record boundaries are taken
+    from its index, so the segment is never parsed as a whole. Records of uncompressed segments are sliced from the
+    mapping directly, compressed blocks are decompressed on access (the last decompressed block is kept).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path + INDEX_SUFFIX, "rb") as index_file:
+            self.index = index_file.read()
+        # a crash while the index was written may leave an incomplete entry at its end
+        self.count = len(self.index) // INDEX_ENTRY.size
+
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.cached_block = (None, None)
+
+    def __len__(self):
+        return self.count
+
+    def entry(self, i):
+        """ Return (block offset, offset in block, length) of record ``i`` """
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return INDEX_ENTRY.unpack_from(self.index, i * INDEX_ENTRY.size)
+
+    def block(self, block_offset):
+        """ Return a buffer of the uncompressed payload of the block at ``block_offset`` """
+        if self.cached_block[0] == block_offset:
+            return self.cached_block[1]
+
+        magic, flags, raw_length, stored_length = BLOCK_HEADER.unpack_from(self.map, block_offset)
+        if magic != BLOCK_MAGIC:
+            raise CorruptSegmentError("No block at offset {0} of {1}".format(block_offset, self.path))
+        start = block_offset + BLOCK_HEADER.size
+        payload = memoryview(self.map)[start:start + stored_length]
+        if flags & FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+        if len(payload) != raw_length:
+            raise CorruptSegmentError("Block at offset {0} of {1} is truncated".format(block_offset, self.path))
+
+        self.cached_block = (block_offset, payload)
+        return payload
+
+    def record_bytes(self, i):
+        """ Return the encoded record ``i`` """
+        block_offset, offset, length = self.entry(i)
+        return bytes(self.block(block_offset)[offset:offset + length])
+
+    def record(self, i):
+        """ Return (meta, data) of record ``i`` """
+        block_offset, offset, _ = self.entry(i)
+        return decode_record(self.block(block_offset), offset)
+
+    def records(self, start=0, stop=None):
+        """ Yield (meta, data) of the records ``start`` to ``stop`` (exclusive) """
+        stop = self.count if stop is None else min(stop, self.count)
+        for i in range(start, stop):
+            yield self.record(i)
+
+    def __iter__(self):
+        return self.records()
+
+    def chunks(self, max_bytes):
+        """
+        Yield ranges (start, stop) of consecutive records whose encoded size adds up to at most ``max_bytes``, a single
+        record larger than ``max_bytes`` forms a chunk of its own. Only the index is read.
+        """
+        start = 0
+        size = 0
+        for i in range(self.count):
+            length = INDEX_ENTRY.unpack_from(self.index, i * INDEX_ENTRY.size)[2]
+            if i > start and size + length > max_bytes:
+                yield start, i
+                start = i
+                size = 0
+            size += length
+        if start < self.count:
+            yield start, self.count
+
+    def close(self):
+        if isinstance(self.cached_block[1], memoryview):
+            self.cached_block[1].release()  # the mapping can not be closed while views on it exist
+        self.cached_block = (None, None)
+        if isinstance(self.map, mmap.mmap):
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class RecordStore:
+    """ Read access to all segments of the store ``name`` in ``directory`` """
+
+    def __init__(self, directory, name):
+        self.directory = directory
+        self.name = name
+
+    def segment_paths(self):
+        return [path for _, path in list_segments(self.directory, self.name)]
+
+    def __iter__(self):
+        for path in self.segment_paths():
+            with SegmentReader(path) as reader:
+                yield from reader
+
+    def chunk_ranges(self, max_bytes):
+        """ Return (segment path, start, stop) of all chunks of at most ``max_bytes``, see SegmentReader.chunks """
+        ranges = []
+        for path in self.segment_paths():
+            with SegmentReader(path) as reader:
+                ranges.extend((path, start, stop) for start, stop in reader.chunks(max_bytes))
+        return ranges
+
+    def chunks(self, max_bytes):
+        """ Yield lists of (meta, data) of at most ``max_bytes`` encoded bytes, see SegmentReader.chunks """
+        for path in self.segment_paths():
+            with SegmentReader(path) as reader:
+                for start, stop in reader.chunks(max_bytes):
+                    yield list(reader.records(start, stop))
+
+
+def list_segments(directory, name=None):
+    """ Return (number, path) of all segments in ``directory`` (of the store ``name``) ordered by number """
+    if not os.path.isdir(directory):
+        return []
+    segments = []
+    for filename in os.listdir(directory):
+        match = SEGMENT_PATTERN.match(filename)
+        if match and (name is None or match.group("name") == name):
+            segments.append((int(match.group("number")), os.path.join(directory, filename)))
+    return sorted(segments)
+
+
+def list_stores(directory):
+    """ Return the names of all stores in ``directory`` """
+    names = set()
+    for _, path in list_segments(directory):
+        names.add(SEGMENT_PATTERN.match(os.path.basename(path)).group("name"))
+    return sorted(names)
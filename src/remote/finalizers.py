@@ -4,10 +4,17 @@ Either paragraphs or raw html.
 
 """
 
+import io
+import math
 import os
+import numpy as np
 import pandas
 import shutil
 import time
+from urllib.parse import urlparse
+
+import record_store
+import shared
 from remote.result_producer import send_result
 
 
@@ -25,49 +32,45 @@ def finalize_paragraphs(crawl_name, data_path, log_path, logger):
     data['raw'] = False
     data['crawl'] = crawl_name
 
+    from pipelines import Paragraph2CsvPipeline
+
+    # parts of split csv files are sent in the order of their manifest
+    manifests = [filename for filename in sorted(os.listdir(data_path))
+                 if filename.endswith(Paragraph2CsvPipeline.MANIFEST_SUFFIX)]
+    parts = set()
+    for manifest_filename in manifests:
+        spider_name = manifest_filename[:-len(Paragraph2CsvPipeline.MANIFEST_SUFFIX)]
+        manifest_path = os.path.join(data_path, manifest_filename)
+        for csv_filename, rows, size, digest in Paragraph2CsvPipeline.read_manifest(manifest_path):
+            parts.add(csv_filename)
+            data['url'] = spider_name
+            send_csv(data, os.path.join(data_path, csv_filename), csv_filename[:-4], max_message_size, logger)
+
     # fetching crawl results
     for csv_filename in os.listdir(data_path):
+        # only completed csv files, record stores are sent below
+        if not csv_filename.endswith('.csv') or csv_filename in parts \
+                or csv_filename.endswith(Paragraph2CsvPipeline.INCOMPLETE_FLAG + '.csv'):
+            continue
         # create filename without extension
-        filename = ""
-        if csv_filename.endswith('.csv'):
-            filename = csv_filename[:-4]
-        # create csv file path
-        csv_filepath = os.path.join(data_path, csv_filename)
-        # initialize data
+        filename = csv_filename[:-4]
         data['url'] = filename
-        data['filename'] = filename
-        logger.info("data: {}".format(data))
+        send_csv(data, os.path.join(data_path, csv_filename), filename, max_message_size, logger)
 
-        # read df
-        df = pandas.read_csv(csv_filepath, sep=';',
-                             quotechar='"', encoding="utf-8")
-        # logger.info(df)
-        # get filesize to estimate number of required messages
-        result_size = os.path.getsize(csv_filepath)
-        logger.info("Result size: {}".format(result_size))
+    # fetching crawl results from record stores, chunks are taken from the record index
+    for store_name in record_store.list_stores(data_path):
+        data['url'] = store_name
+        data['filename'] = store_name
+        logger.info("data: {}".format(data))
 
-        # split df into chunks if size is larger than max_message_size
-        if result_size > max_message_size:
+        chunk_ranges = record_store.RecordStore(data_path, store_name).chunk_ranges(max_message_size)
+        if len(chunk_ranges) > 1:
             logger.info("Multiple messages required!")
-            # number of required chunks
-            chunk_count = math.ceil(result_size / max_message_size)
-            chunks = np.array_split(df, chunk_count)
-            # logger.info(chunks)
-            # send all chunks to queue
-            for index, chunk in enumerate(chunks):
-                # logger.info(chunk)
-                filename_part = "{}_part{}_{}".format(
-                  filename, index + 1, chunk_count)
-                data['filename'] = filename_part
-                data['data'] = chunk.to_csv(index=False, sep=';')
-                # logger.info(data['data'])
-                time.sleep(0.1)
-                send_flag = send_result(data)
-        # send complete dictionary
-        else:
-            logger.info("One message required!")
-            data['data'] = df.to_csv(index=False, sep=';')
-            # logger.info(data['data'])
+        for index, (segment_path, start, stop) in enumerate(chunk_ranges):
+            if len(chunk_ranges) > 1:
+                data['filename'] = "{}_part{}_{}".format(store_name, index + 1, len(chunk_ranges))
+            with record_store.SegmentReader(segment_path) as reader:
+                data['data'] = paragraphs_to_csv(meta for meta, _ in reader.records(start, stop))
             time.sleep(0.1)
             send_flag = send_result(data)
 
@@ -110,9 +113,20 @@ def finalize_raw(crawl_name, data_path, log_path, logger):
     # get top level folders
     root, dirs, files = next(os.walk(data_path))
 
+    from pipelines import ContentAddressedStore, Paragraph2CsvPipeline, Raw2FilePipeline
+
     # read data of all dirs (only 1 if 1 url per task)
     for dir in dirs:
+        # bodies of content addressed crawls are sent along the manifests, previous csv outputs are no pages
+        if dir == Raw2FilePipeline.OBJECTS_DIR or dir.endswith(Paragraph2CsvPipeline.PREVIOUS_SUFFIX):
+            continue
         data['url'] = dir
+        manifest_path = os.path.join(root, dir, Raw2FilePipeline.MANIFEST)
+        if os.path.exists(manifest_path):
+            objects_path = os.path.join(root, Raw2FilePipeline.OBJECTS_DIR)
+            for url, digest, size, depth in Raw2FilePipeline.read_manifest(manifest_path):
+                send_text_body(data, url, ContentAddressedStore.read(objects_path, digest))
+            continue
         # read all files in url folder
         for filename in os.listdir(os.path.join(root, dir)):
             # set filename in rmq data
@@ -127,6 +141,12 @@ def finalize_raw(crawl_name, data_path, log_path, logger):
                     time.sleep(0.1)
                     send_flag = send_result(data)
 
+    # read data of all record stores, only bodies that are valid utf-8 text are sent
+    for store_name in record_store.list_stores(data_path):
+        data['url'] = store_name
+        for meta, body in record_store.RecordStore(data_path, store_name):
+            send_text_body(data, meta['url'], body)
+
     # Clear directories
     cleared_flag = clear_directories(data_path, log_path, logger)
 
@@ -135,6 +155,70 @@ def finalize_raw(crawl_name, data_path, log_path, logger):
     return True
 
 
+def send_csv(data, csv_filepath, filename, max_message_size, logger):
+    """Send a csv file of paragraphs, split into several messages if it exceeds max_message_size."""
+    # initialize data
+    data['filename'] = filename
+    logger.info("data: {}".format(data))
+
+    # read df
+    df = pandas.read_csv(csv_filepath, sep=';',
+                         quotechar='"', encoding="utf-8")
+    # logger.info(df)
+    # get filesize to estimate number of required messages
+    result_size = os.path.getsize(csv_filepath)
+    logger.info("Result size: {}".format(result_size))
+
+    # split df into chunks if size is larger than max_message_size
+    if result_size > max_message_size:
+        logger.info("Multiple messages required!")
+        # number of required chunks
+        chunk_count = math.ceil(result_size / max_message_size)
+        chunks = np.array_split(df, chunk_count)
+        # logger.info(chunks)
+        # send all chunks to queue
+        for index, chunk in enumerate(chunks):
+            # logger.info(chunk)
+            filename_part = "{}_part{}_{}".format(
+              filename, index + 1, chunk_count)
+            data['filename'] = filename_part
+            data['data'] = chunk.to_csv(index=False, sep=';')
+            # logger.info(data['data'])
+            time.sleep(0.1)
+            send_flag = send_result(data)
+    # send complete dictionary
+    else:
+        logger.info("One message required!")
+        data['data'] = df.to_csv(index=False, sep=';')
+        # logger.info(data['data'])
+        time.sleep(0.1)
+        send_flag = send_result(data)
+
+
+def send_text_body(data, url, body):
+    """Send a raw body, unless it is not valid utf-8 text (e.g. pdf documents)."""
+    try:
+        data['data'] = body.decode('utf-8')
+    except UnicodeDecodeError:
+        return False
+    data['filename'] = shared.url2filename(urlparse(url).path)
+    time.sleep(0.1)
+    return send_result(data)
+
+
+def paragraphs_to_csv(paragraphs):
+    """Compose the csv text of paragraph records, in the format of Paragraph2CsvPipeline."""
+    from pipelines import Paragraph2CsvPipeline
+
+    text = io.StringIO(newline='')
+    writer = Paragraph2CsvPipeline.csv_writer(text)
+    writer.writerow(Paragraph2CsvPipeline.HEADER)
+    for paragraph in paragraphs:
+        writer.writerow(["" if paragraph.get(field) is None else paragraph.get(field)
+                         for field in Paragraph2CsvPipeline.FIELDS])
+    return text.getvalue()
+
+
 def clear_directories(data_path, log_path, logger):
     """Clear result and log data."""
 
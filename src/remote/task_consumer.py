@@ -1,10 +1,67 @@
+import os
+
 import pika
 
 from common.config import config
 from common.logger import log
 
 from common.messaging.consumer import Consumer
-from scrapy_wrapper import run_crawl
+from scrapy_wrapper import JOBS_DIR, load_settings, run_crawl
+from shared import CrawlSpecification
+
+# runs of a resumable task that may end without acknowledging it (e.g. a worker killed for lack of memory), further
+# deliveries of the task are rejected
+MAX_UNFINISHED_RUNS = 3
+RUNS_SUFFIX = ".runs"
+
+
+def read_specification(body):
+    """Return the crawl specification of a task (json string or file path), None if it can not be read."""
+    try:
+        if os.path.exists(body):
+            return load_settings(body)
+        crawl_specification = CrawlSpecification()
+        crawl_specification.deserialize(body)
+        return crawl_specification
+    except Exception:
+        return None
+
+
+def is_resumable(crawl_specification):
+    """Return True if an interrupted crawl of the specification is resumed, see scrapy_wrapper.job_directory."""
+    return crawl_specification is not None and bool(getattr(crawl_specification, "resume", False)) \
+        and bool(crawl_specification.logs)
+
+
+def runs_path(crawl_specification):
+    """Path of the file counting the runs of a resumable crawl that did not end, next to its job directories."""
+    return os.path.join(crawl_specification.logs, JOBS_DIR, (crawl_specification.name or "crawl") + RUNS_SUFFIX)
+
+
+def unfinished_runs(crawl_specification):
+    """Return the number of runs of a resumable crawl that started but did not end."""
+    try:
+        with open(runs_path(crawl_specification), "r") as runs_file:
+            return int(runs_file.read() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def start_run(crawl_specification):
+    """Count a run of a resumable crawl, it remains counted unless end_runs is reached."""
+    runs = unfinished_runs(crawl_specification) + 1
+    os.makedirs(os.path.dirname(runs_path(crawl_specification)), exist_ok=True)
+    with open(runs_path(crawl_specification), "w") as runs_file:
+        runs_file.write(str(runs))
+
+
+def end_runs(crawl_specification):
+    """Forget the runs of a resumable crawl, its last run ended (finished or interrupted gracefully)."""
+    try:
+        os.remove(runs_path(crawl_specification))
+    except FileNotFoundError:
+        pass
+
 
 class TaskConsumer(Consumer):
     """Consumes crawl tasks."""
@@ -19,23 +76,51 @@ class TaskConsumer(Consumer):
         log.info("Received task with body {}".format(body))
 
         try:
-            # Ignore messages that are redelivered
-            if method.redelivered == True:
+            crawl_specification = read_specification(body)
+            resumable = is_resumable(crawl_specification)
+            # Tasks are redelivered if a worker stopped before acknowledging them, only resumable crawls continue then
+            if method.redelivered == True and not resumable:
                 log.info("Task discarded as copy")
                 ch.basic_ack(delivery_tag=method.delivery_tag)
-            else:
-                log.info("Start processing task")
-                # Execute crawling task
-                log.info("Execute crawl with spec: {}".format(body))
+                return
+            if method.redelivered == True:
+                if unfinished_runs(crawl_specification) >= MAX_UNFINISHED_RUNS:
+                    # dead-lettered if the queue has a dead letter exchange
+                    log.error("Task rejected, {} runs of the crawl ended without finishing".format(
+                        MAX_UNFINISHED_RUNS))
+                    end_runs(crawl_specification)
+                    ch.basic_reject(delivery_tag=method.delivery_tag, requeue=False)
+                    return
+                log.info("Task is redelivered, resuming crawl")
+
+            log.info("Start processing task")
+            # Execute crawling task
+            log.info("Execute crawl with spec: {}".format(body))
+            if resumable:
+                start_run(crawl_specification)
+            try:
                 finished = run_crawl(body, worker_flag=True)
-                log.info("Scrapy worker finished: {}".format(finished))
-                # Unsubscribe before sending ack to avoid accepting a task on closing
-                log.info("Unsubscribing task queue.")
-                self.channel.basic_cancel(self.consumer_tag)
+            except SystemExit:
+                # the crawl specification could not be loaded
+                finished = None
+            if resumable:
+                end_runs(crawl_specification)
+            log.info("Scrapy worker finished: {}".format(finished))
+            # Unsubscribe before sending ack to avoid accepting a task on closing
+            log.info("Unsubscribing task queue.")
+            self.channel.basic_cancel(self.consumer_tag)
+            if finished is None:
+                ch.basic_reject(delivery_tag=method.delivery_tag, requeue=False)
+                log.info("Rejected task, the crawl specification is invalid")
+            elif finished:
                 # send acc before closing
                 ch.basic_ack(delivery_tag=method.delivery_tag)
                 log.info("Finished processing task")
-                exit()
+            else:
+                # the crawl was interrupted, return the task to the queue to have it resumed
+                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+                log.info("Interrupted processing task, task is requeued")
+            exit()
 
         except Exception as e:
             log.exception(e)
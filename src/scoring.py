@@ -0,0 +1,135 @@
+"""
+Created on 18.10.2026
+
+@author: Maximilian Pensel
+
+Copyright 2019 Maximilian Pensel <maximilian.pensel@gmx.de>
+
+This file is part of OWS-scrapy-wrapper.
+
+OWS-scrapy-wrapper is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+OWS-scrapy-wrapper is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with OWS-scrapy-wrapper.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import re
+from urllib.parse import urlparse
+
+from shared import LRUCache
+
+_WORDS = re.compile(r"\w{3,}")
+
+
+class YieldScorer:
+    """
+    Learns the yield (items, e.g. accepted paragraphs, per page) of the pages crawled so far and estimates the yield of
+    links from three signals:
+
+    * the url prefix: the yield of the pages below the host and the first ``prefix_depth`` directories of the url, each
+      level shrunk towards the level above it, so that a prefix with few pages is judged by its parent
+    * the anchor text: the mean yield of the pages linked with the words of the anchor text (links without text, e.g.
+      images, are learned as a word of their own)
+    * the language of the linking page: the yield of pages linked from pages with items (i.e. in an accepted language)
+      or without items
+
+    The estimate is turned into a priority between 0 and ``weight``, half of ``weight`` for the mean yield of all pages
+    so far. Statistics are kept for at most ``max_keys`` prefixes and words, least recently used ones are forgotten.
+    """
+
+    NO_TEXT = ""  # word of links without anchor text
+    MAX_WORDS = 8  # anchor text words that are taken into account
+    PRIOR_PAGES = 5  # pseudo count of pages with the yield of the level above
+
+    DEFAULT_WEIGHT = 4
+    DEFAULT_PREFIX_DEPTH = 2
+    DEFAULT_MAX_KEYS = 100000
+
+    def __init__(self, weight=DEFAULT_WEIGHT, prefix_depth=DEFAULT_PREFIX_DEPTH, max_keys=DEFAULT_MAX_KEYS):
+        self.weight = weight
+        self.prefix_depth = prefix_depth
+        self.prefixes = LRUCache(maxsize=max_keys)  # prefix -> [pages, items]
+        self.words = LRUCache(maxsize=max_keys)  # anchor text word -> [pages, items]
+        self.languages = {True: [0, 0], False: [0, 0]}  # linking page has items -> [pages, items]
+        self.pages = 0
+        self.items = 0
+
+    @classmethod
+    def from_settings(cls, settings):
+        """ Return the scorer configured by the YIELD_PRIORITY settings, None if yield priorities are disabled """
+        if not settings.getbool("YIELD_PRIORITY_ENABLED"):
+            return None
+        return cls(weight=settings.getint("YIELD_PRIORITY_WEIGHT", YieldScorer.DEFAULT_WEIGHT),
+                   prefix_depth=settings.getint("YIELD_PRIORITY_PREFIX_DEPTH", YieldScorer.DEFAULT_PREFIX_DEPTH))
+
+    def url_prefixes(self, url):
+        """ Return the prefixes of ``url`` from its host to its deepest considered directory """
+        parsed_url = urlparse(url)
+        directories = parsed_url.path.split("/")[1:-1][:self.prefix_depth]
+        return [parsed_url.netloc + "".join("/" + directory for directory in directories[:level])
+                for level in range(len(directories) + 1)]
+
+    def anchor_words(self, text):
+        words = _WORDS.findall(text.lower()) if text else []
+        return list(dict.fromkeys(words))[:YieldScorer.MAX_WORDS] or [YieldScorer.NO_TEXT]
+
+    def mean(self):
+        return self.items / self.pages if self.pages else 0.0
+
+    @staticmethod
+    def shrink(counts, prior):
+        """ Mean yield of ``counts``, shrunk towards ``prior`` """
+        if counts is None:
+            return prior
+        pages, items = counts
+        return (items + YieldScorer.PRIOR_PAGES * prior) / (pages + YieldScorer.PRIOR_PAGES)
+
+    def estimate(self, url, text, linked_from_items):
+        """
+        Return the estimated yield of a link to ``url`` with anchor ``text`` from a page with or without items
+        (``linked_from_items``, None if unknown)
+        """
+        mean = self.mean()
+        prefix_estimate = mean
+        for prefix in self.url_prefixes(url):
+            prefix_estimate = self.shrink(self.prefixes.get(prefix), prefix_estimate)
+        words = self.anchor_words(text)
+        text_estimate = sum(self.shrink(self.words.get(word), mean) for word in words) / len(words)
+        language_estimate = mean if linked_from_items is None else self.shrink(self.languages[linked_from_items], mean)
+        return (prefix_estimate + text_estimate + language_estimate) / 3
+
+    def priority(self, url, text, linked_from_items):
+        """ Return the priority of a link between 0 and weight """
+        mean = self.mean()
+        if not mean:
+            return self.weight // 2
+        return min(self.weight, int(self.weight / 2 * self.estimate(url, text, linked_from_items) / mean + 0.5))
+
+    def record(self, url, text, linked_from_items, items):
+        """ Learn from a crawled page at ``url``, linked with anchor ``text``, that yielded ``items`` """
+        self.pages += 1
+        self.items += items
+        for prefix in self.url_prefixes(url):
+            self.add(self.prefixes, prefix, items)
+        if text is not None:
+            for word in self.anchor_words(text):
+                self.add(self.words, word, items)
+        if linked_from_items is not None:
+            self.languages[linked_from_items][0] += 1
+            self.languages[linked_from_items][1] += items
+
+    @staticmethod
+    def add(cache, key, items):
+        counts = cache.get(key)
+        if counts is None:
+            cache.put(key, [1, items])
+        else:
+            counts[0] += 1
+            counts[1] += items
@@ -25,15 +25,31 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with OWS-scrapy-wrapper.  If not, see <https://www.gnu.org/licenses/>.
 """
+import itertools
 import json
 import logging
+import multiprocessing
+import shutil
 import sys
 import os
+import time
 
-from scrapy import Request
+from collections import Counter, OrderedDict
 
+from scrapy import Request, signals
+from scrapy.exceptions import DontCloseSpider
+from scrapy.http import HtmlResponse
+from scrapy.link import Link
+from scrapy.utils.spider import iterate_spider_output
+from twisted.internet.defer import Deferred
+
+import pipelines
 import shared
+import url_filter
+from change_index import ChangeIndex
+from concurrency import AdaptiveConcurrency
 from parsers import ParagraphParser
+from scoring import YieldScorer
 from shared import CrawlSpecification
 
 import pandas
@@ -42,7 +58,7 @@ from scrapy.linkextractors.lxmlhtml import LxmlLinkExtractor
 from scrapy.crawler import CrawlerProcess
 from urllib.parse import urlparse
 from scrapy.settings import Settings
-from scrapy.utils.url import url_is_from_any_domain, url_has_any_extension
+from scrapy.utils.url import url_is_from_any_domain
 from langdetect import DetectorFactory
 
 
@@ -67,6 +83,31 @@ VERSION = "0.4.2"
 MLOG = shared.simple_logger(loger_name="scrapy_wrapper")
 MLOG.info("Running scrapy_wrapper on version {}".format(VERSION))
 
+# job directories of resumable crawls are kept in <logs>/JOBS_DIR/<crawl name>/<spider name>
+JOBS_DIR = "jobs"
+CHECKPOINT = "checkpoint"
+
+# keys of the 'performance' section of the crawl specification and the scrapy settings they set
+PERFORMANCE_SETTINGS = {
+    "concurrent_requests": "CONCURRENT_REQUESTS",
+    "concurrent_requests_per_domain": "CONCURRENT_REQUESTS_PER_DOMAIN",
+    "download_delay": "DOWNLOAD_DELAY",
+    "download_timeout": "DOWNLOAD_TIMEOUT",
+    "autothrottle": "AUTOTHROTTLE_ENABLED",
+    "autothrottle_target_concurrency": "AUTOTHROTTLE_TARGET_CONCURRENCY",
+    "adaptive_concurrency": "ADAPTIVE_CONCURRENCY_ENABLED",
+    "min_concurrency": "ADAPTIVE_CONCURRENCY_MIN",
+    "max_concurrency": "ADAPTIVE_CONCURRENCY_MAX",
+    "target_latency": "ADAPTIVE_CONCURRENCY_TARGET_LATENCY",
+    "max_error_rate": "ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE",
+    "window": "ADAPTIVE_CONCURRENCY_WINDOW",
+    "frontier_head_size": "FRONTIER_HEAD_SIZE",
+    "frontier_spill_dir": "FRONTIER_SPILL_DIR",
+    "yield_priority": "YIELD_PRIORITY_ENABLED",
+    "yield_priority_weight": "YIELD_PRIORITY_WEIGHT",
+    "yield_priority_prefix_depth": "YIELD_PRIORITY_PREFIX_DEPTH"
+}
+
 
 def load_settings(settings_path) -> CrawlSpecification:
     """
@@ -90,6 +131,12 @@ def load_settings(settings_path) -> CrawlSpecification:
 
 
 class VerboseLxmlLinkExtractor(LxmlLinkExtractor):
+    """
+    Link extractor whose link decisions are taken by a compiled, caching url_filter.UrlFilter. Rejected links are
+    counted per reason, the counts are logged every REPORT_INTERVAL seconds and at the end of the crawl.
+    """
+
+    REPORT_INTERVAL = 60  # seconds
 
     def __init__(self, logname="scrapy_wrapper", spec=None, **kwargs):
         super().__init__(**kwargs)
@@ -97,37 +144,79 @@ class VerboseLxmlLinkExtractor(LxmlLinkExtractor):
             self.logger = shared.simple_logger(loger_name="linkextractor",
                                                file_path=os.path.join(spec.logs, logname + ".log")
                                               )
+        else:
+            self.logger = shared.simple_logger(loger_name="linkextractor")
 
-    def _link_allowed(self, link):
-        _matches = lambda url, regexs: any(r.search(url) for r in regexs)
-        _is_valid_url = lambda url: url.split('://', 1)[0] in {'http', 'https', 'file', 'ftp'}
+        self.url_filter = url_filter.get_url_filter(allow=self.allow_res, deny=self.deny_res,
+                                                    allow_domains=self.allow_domains,
+                                                    deny_domains=self.deny_domains,
+                                                    deny_extensions=self.deny_extensions)
+        self.rejections = Counter()
+        self.last_report = time.monotonic()
 
-        if not _is_valid_url(link.url):
-            self.logger.warning(f"Not allowed: {link.url} // no valid url")
-            return False
-        if self.allow_res and not _matches(link.url, self.allow_res):
-            self.logger.warning(f"Not allowed: {link.url} // does not match whitelist")
-            return False
-        if self.deny_res and _matches(link.url, self.deny_res):
-            self.logger.warning(f"Not allowed: {link.url} // matches blacklist")
-            return False
-        parsed_url = urlparse(link.url)
-        if self.allow_domains and not url_is_from_any_domain(parsed_url, self.allow_domains):
-            self.logger.warning(f"Not allowed: {link.url} // domain not listed as allowed")
-            return False
-        if self.deny_domains and url_is_from_any_domain(parsed_url, self.deny_domains):
-            self.logger.warning(f"Not allowed: {link.url} // domain is listed as denied")
-            return False
-        if self.deny_extensions and url_has_any_extension(parsed_url, self.deny_extensions):
-            self.logger.warning(f"Not allowed: {link.url} // extension is denied")
+    def _link_allowed(self, link):
+        reason = self.url_filter.rejection(link.url)
+        if reason is not None:
+            self.rejections[reason] += 1
+            if time.monotonic() - self.last_report >= VerboseLxmlLinkExtractor.REPORT_INTERVAL:
+                self.report()
             return False
-        if self.restrict_text and not _matches(link.text, self.restrict_text):
+        if self.restrict_text and not any(r.search(link.text) for r in self.restrict_text):
             return False
         return True
 
+    def report(self):
+        """ Log the number of rejected links per reason """
+        self.last_report = time.monotonic()
+        if self.rejections:
+            self.logger.info("Not allowed: {0} (url filter cache hits: {1}, misses: {2})".format(
+                ", ".join("{0} {1}".format(count, reason) for reason, count in self.rejections.most_common()),
+                self.url_filter.cache.hits, self.url_filter.cache.misses))
+
+
+def job_directory(crawl_specification, spider_name):
+    """ Return the job directory of the spider ``spider_name``, None if the crawl is not resumable """
+    if not getattr(crawl_specification, "resume", False):
+        return None
+    if not crawl_specification.logs:
+        MLOG.warning("Crawls without a log directory can not be resumed")
+        return None
+    return os.path.join(crawl_specification.logs, JOBS_DIR, crawl_specification.name or "crawl", spider_name)
+
+
+def prepare_job_directory(path):
+    """
+    Return True if the job in ``path`` was checkpointed by an interrupted crawl and is resumed. The state of a job
+    without checkpoint (the crawl finished, or it crashed before the state could be saved) is removed.
+    """
+    if path is None:
+        return False
+    checkpoint = os.path.join(path, CHECKPOINT)
+    if os.path.exists(checkpoint):
+        # until the next checkpoint, the job state is only valid while the crawl runs
+        os.remove(checkpoint)
+        return True
+    shutil.rmtree(path, ignore_errors=True)
+    return False
+
+
+def open_change_index(crawl_specification, name):
+    """ Return the change index of the output ``name``, None if the crawl is not incremental """
+    directory = getattr(crawl_specification, "change_index", None)
+    return ChangeIndex(directory, name) if directory else None
+
+
 def create_spider(settings, start_url, crawler_name):
     class GenericCrawlSpider(CrawlSpider):
 
+        CHANGE_META = "page_change"  # ChangeIndex.check result of incremental crawls
+        ITEMS_META = "page_items"  # number of items of a response, if yield priorities are enabled
+        LINKED_FROM_ITEMS_META = "linked_from_items"  # whether the page of a followed link had items
+        # meta keys of link requests that are rebuilt by frontier_request
+        FRONTIER_META = {"rule", "link_text", "depth", LINKED_FROM_ITEMS_META}
+
+        scorer = None  # scoring.YieldScorer of crawls with yield priorities
+
         crawl_specification = settings
 
         # load parser from specification
@@ -151,7 +240,7 @@ def create_spider(settings, start_url, crawler_name):
                              'm4a', 'm4v', 'flv', 'xls', 'xlsx', 'ppt', 'pptx', 'pps', 'doc', 'docx', 'odt', 'ods',
                              'odg', 'odp', 'css', 'exe', 'bin', 'rss', 'zip', 'rar', 'gz', 'tar'
                              ]
-        if isinstance(crawl_specification.parser, ParagraphParser):
+        if isinstance(parser, ParagraphParser) and not parser.data[ParagraphParser.KEY_PARSE_PDF]:
             denied_extensions.append("pdf")
 
         rules = [
@@ -168,6 +257,12 @@ def create_spider(settings, start_url, crawler_name):
         # ensure that start_urls are also parsed
         parse_start_url = parser.parse
 
+        # resumable crawls keep the scheduler queue and the fingerprints of seen requests in a job directory
+        job_dir = job_directory(crawl_specification, crawler_name)
+        resumed = prepare_job_directory(job_dir)
+        if job_dir:
+            custom_settings = {"JOBDIR": job_dir, "DUPEFILTER_CLASS": "frontier.SeenRequestsFilter"}
+
         def __init__(self):
             super().__init__()
             # setup individual logger for every spider
@@ -185,15 +280,417 @@ def create_spider(settings, start_url, crawler_name):
             for hand in self.s_log.handlers:
                 self.logger.logger.addHandler(hand)
             self.s_log.info("[__init__] - Crawlspider logger setup finished.")
+            if self.resumed:
+                self.s_log.info("[__init__] - Resuming crawl from {0}".format(self.job_dir))
+
+            # multi-domain spiders keep a change index per domain
+            self.change_index = None if getattr(self, "multi_domain", False) \
+                else open_change_index(self.crawl_specification, self.name)
 
 
         def start_requests(self):
             for url in self.start_urls:
                 yield Request(url)
 
+        @classmethod
+        def from_crawler(cls, crawler, *args, **kwargs):
+            spider = super().from_crawler(crawler, *args, **kwargs)
+            spider.scorer = YieldScorer.from_settings(crawler.settings)
+            return spider
+
+        def closed(self, reason):
+            for rule in self._rules:
+                if isinstance(rule.link_extractor, VerboseLxmlLinkExtractor):
+                    rule.link_extractor.report()
+                    for rejection, count in rule.link_extractor.rejections.items():
+                        self.crawler.stats.set_value("link_filter/rejected/" + rejection, count, spider=self)
+            if self.change_index is not None:
+                self.change_index.save(complete=reason == "finished")
+            if self.job_dir and reason != "finished":
+                self.checkpoint(reason)
+
+        def checkpoint(self, reason):
+            """ Mark the job state as complete, the scheduler already saved its queue and seen requests """
+            with open(os.path.join(self.job_dir, CHECKPOINT), "w", encoding="utf-8") as checkpoint_file:
+                checkpoint_file.write(reason)
+            self.s_log.info("[checkpoint] - Crawl stopped ({0}), it is resumed from {1}".format(reason, self.job_dir))
+
+        def find_change_index(self, url):
+            """ Return the change index of the output of ``url``, None if the crawl is not incremental """
+            return self.change_index
+
+        def check_change(self, response):
+            """ Record ``response`` in the change index, returns True if it did not change since the previous crawl """
+            index = self.find_change_index(response.url)
+            if index is None:
+                return False
+            change = index.check(response)
+            response.meta[GenericCrawlSpider.CHANGE_META] = change
+            self.crawler.stats.inc_value("incremental/" + change, spider=self)
+            if change in (ChangeIndex.UNCHANGED, ChangeIndex.NOT_MODIFIED):
+                self.crawler.signals.send_catch_log(signal=pipelines.page_unchanged, response=response, spider=self)
+                return True
+            return False
+
+        def _parse_response(self, response, callback, cb_kwargs, follow=True):
+            """
+            Same as CrawlSpider._parse_response, but also accepts callbacks that return a Deferred. Pages of incremental
+            crawls that did not change are handed to parser.unchanged instead of the callback.
+            """
+            cb_res = ()
+            if callback:
+                if self.check_change(response):
+                    cb_res = self.parser.unchanged(response) or ()
+                else:
+                    cb_res = callback(response, **cb_kwargs) or ()
+
+            if isinstance(cb_res, Deferred):
+                return cb_res.addCallback(lambda res: self._iterate_parse_results(response, res or (), follow))
+
+            return self._iterate_parse_results(response, cb_res, follow)
+
+        def _iterate_parse_results(self, response, cb_res, follow):
+            cb_res = self.process_results(response, cb_res)
+            items = 0
+            for request_or_item in iterate_spider_output(cb_res):
+                if not isinstance(request_or_item, Request):
+                    items += 1
+                yield request_or_item
+
+            # unchanged pages of incremental crawls are not parsed, their items are unknown
+            if self.scorer is not None and response.meta.get(GenericCrawlSpider.CHANGE_META) not in \
+                    (ChangeIndex.UNCHANGED, ChangeIndex.NOT_MODIFIED):
+                response.meta[GenericCrawlSpider.ITEMS_META] = items
+                self.scorer.record(response.url, response.meta.get("link_text"),
+                                   response.meta.get(GenericCrawlSpider.LINKED_FROM_ITEMS_META), items)
+
+            if follow and self._follow_links:
+                for request_or_item in self._requests_to_follow(response):
+                    yield self.prioritize(request_or_item, response)
+
+        def prioritize(self, request, response):
+            """ Raise the priority of a followed link by its estimated yield, if yield priorities are enabled """
+            if self.scorer is None or not isinstance(request, Request):
+                return request
+            items = response.meta.get(GenericCrawlSpider.ITEMS_META)
+            linked_from_items = items > 0 if items is not None else None
+            request.meta[GenericCrawlSpider.LINKED_FROM_ITEMS_META] = linked_from_items
+            priority = self.scorer.priority(request.url, request.meta.get("link_text"), linked_from_items)
+            request.priority += priority
+            self.crawler.stats.inc_value("yield_priority/{0}".format(priority), spider=self)
+            return request
+
+        def _requests_to_follow(self, response):
+            """
+            Same as CrawlSpider._requests_to_follow, but in incremental crawls, the followed links are recorded in the
+            change index, and pages that did not change follow the links of the previous crawl without extracting them
+            """
+            index = self.find_change_index(response.url)
+            if index is None:
+                for request in super()._requests_to_follow(response):
+                    yield request
+                return
+
+            if response.meta.get(GenericCrawlSpider.CHANGE_META) in (ChangeIndex.UNCHANGED, ChangeIndex.NOT_MODIFIED):
+                # the spiders of this wrapper have a single rule
+                rule_links = [(0, [Link(url) for url in index.previous_links(response.url)])]
+            elif isinstance(response, HtmlResponse):
+                rule_links = [(rule_index, rule.link_extractor.extract_links(response))
+                              for rule_index, rule in enumerate(self._rules)]
+            else:
+                return
+
+            seen = set()
+            followed = []
+            for rule_index, links in rule_links:
+                rule = self._rules[rule_index]
+                for link in rule.process_links([link for link in links if link not in seen]):
+                    seen.add(link)
+                    followed.append(link.url)
+                    yield rule.process_request(self._build_request(rule_index, link), response)
+            if response.meta.get(GenericCrawlSpider.CHANGE_META) is not None:
+                index.set_links(response.url, followed)
+
+        def frontier_entry(self, request):
+            """
+            Return url, depth and priority of a request for a followed link, from which frontier_request rebuilds it
+            (without its Referer header), None for all other requests (see frontier.SpillingQueue)
+            """
+            if request.meta.get("rule") != 0 or not self.FRONTIER_META.issuperset(request.meta) \
+                    or request.method != "GET" or request.body or any(name != b"Referer" for name in request.headers) \
+                    or request.cookies or request.dont_filter or getattr(request, "cb_kwargs", None):
+                return None
+            return request.url, request.meta.get("depth", 0), request.priority
+
+        def frontier_request(self, url, depth, priority):
+            """ Rebuild the request for a followed link from its frontier entry """
+            request = self._build_request(0, Link(url))
+            # the anchor text is not kept in the frontier, it is unknown rather than empty
+            request.meta["link_text"] = None
+            request.meta["depth"] = depth
+            request.priority = priority
+            return request
+
     return GenericCrawlSpider
 
 
+class DomainContext:
+    """
+    State of one domain of a multi-domain spider. It is handed to the pipelines in place of a spider (see
+    pipelines.DomainPipelineManager) and offers the spider attributes they use, its log messages go to the log of
+    the spider, prefixed with the name of the domain.
+    """
+
+    def __init__(self, spider, domain, name):
+        self.spider = spider
+        self.domain = domain
+        self.name = name
+        self.allowed_domains = [domain]  # the domain and the hosts of its subdomains that had pages
+        self.s_log = shared.PrefixLoggerAdapter(spider.s_log, name)
+        self.pending = 0  # scheduled requests of the domain that are not processed yet
+        self.resumed = False  # requests of resumed domains were scheduled before, they are only finished when idle
+        self.change_index = open_change_index(spider.crawl_specification, name)
+
+    @property
+    def crawl_specification(self):
+        return self.spider.crawl_specification
+
+    @property
+    def parser(self):
+        return self.spider.parser
+
+    @property
+    def crawler(self):
+        return self.spider.crawler
+
+    @property
+    def job_dir(self):
+        return self.spider.job_dir
+
+
+def create_multi_domain_spider(settings, start_urls, crawler_name):
+    """
+    Create a single spider that crawls the domains of all start urls. Start urls are grouped by domain, the output of
+    a domain is named after its first start url.
+    """
+    base_spider = create_spider(settings, start_urls[0], crawler_name)
+
+    class MultiDomainCrawlSpider(base_spider):
+        """
+        Crawls all domains with one scheduler, parser and link extractor. Per-domain state is only kept for the
+        domains that are currently crawled, at most MAX_ACTIVE_DOMAINS at a time, further domains are started as soon
+        as a domain has no pending requests anymore. Requests carry their domain in the meta key DOMAIN_META, only
+        links to the domain of the response (or its subdomains) are followed.
+        """
+
+        MAX_ACTIVE_DOMAINS = 256
+        DOMAIN_META = "crawl_domain"
+        PENDING_META = "domain_pending"
+        DOMAINS_FILE = "domains.json"  # started and active domains of an interrupted crawl, in the job directory
+
+        multi_domain = True
+
+        FRONTIER_META = base_spider.FRONTIER_META | {DOMAIN_META, PENDING_META}
+
+        # a request queue per domain, so that every domain keeps its own requests in memory, see frontier.SpillingQueue
+        custom_settings = dict(base_spider.custom_settings or {},
+                               SCHEDULER_PRIORITY_QUEUE="scrapy.pqueues.DownloaderAwarePriorityQueue")
+
+        # the domains are checked per request in follow_request, scrapy's offsite check would build one expression
+        # for all domains
+        allowed_domains = None
+
+        rules = [
+            Rule(base_spider.rules[0].link_extractor,
+                 callback=base_spider.parser.parse,
+                 follow=True,
+                 errback="domain_errback",
+                 process_request="follow_request")
+        ]
+
+        def __init__(self):
+            super().__init__()
+            self.start_urls = list(start_urls)
+
+            seeds = OrderedDict()
+            for url in start_urls:
+                seeds.setdefault(urlparse(url).netloc, []).append(url)
+            self.seeds = iter(seeds.items())
+            self.started = 0  # number of domains taken from seeds
+            self.active = dict()  # contexts of the domains that are currently crawled
+            if self.resumed:
+                self.resume_domains()
+
+        @classmethod
+        def from_crawler(cls, crawler, *args, **kwargs):
+            spider = super().from_crawler(crawler, *args, **kwargs)
+            crawler.signals.connect(spider.request_scheduled, signal=signals.request_scheduled)
+            crawler.signals.connect(spider.request_dropped, signal=signals.request_dropped)
+            crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+            return spider
+
+        def active_domain(self, netloc):
+            """ Return the active domain that is ``netloc`` or one of its parent domains, None if there is none """
+            labels = netloc.split(".")
+            return next((".".join(labels[i:]) for i in range(len(labels)) if ".".join(labels[i:]) in self.active),
+                        None)
+
+        def domain_context(self, url):
+            """
+            Return the context of the domain of ``url``, None if the domain is not crawled (anymore). Pages of
+            subdomains, e.g. after a redirect from example.com to www.example.com, belong to the crawled domain.
+            """
+            if not url:
+                return None
+            netloc = urlparse(url).netloc
+            domain = self.active_domain(netloc)
+            if domain is None:
+                return None
+            context = self.active[domain]
+            if netloc not in context.allowed_domains:
+                # the pipelines only write items of the hosts in allowed_domains
+                context.allowed_domains.append(netloc)
+            return context
+
+        def find_change_index(self, url):
+            context = self.domain_context(url)
+            return context.change_index if context is not None else None
+
+        def resume_domains(self):
+            """ Skip the domains started by the interrupted crawl, the domains that were still active are continued """
+            path = os.path.join(self.job_dir, MultiDomainCrawlSpider.DOMAINS_FILE)
+            if not os.path.exists(path):
+                return
+            with open(path, "r", encoding="utf-8") as domains_file:
+                state = json.load(domains_file)
+            active = set(state["active"])
+            for domain, urls in itertools.islice(self.seeds, state["started"]):
+                if domain in active:
+                    self.active[domain] = DomainContext(self, domain, shared.url2filename(urls[0]))
+                    self.active[domain].resumed = True
+            self.started = state["started"]
+            self.s_log.info("[resume_domains] - Continuing {0} active domains, {1} domains were started".format(
+                len(self.active), self.started))
+
+        def activate_domains(self):
+            """ Start crawling further domains up to MAX_ACTIVE_DOMAINS, returns their start requests """
+            requests = []
+            while len(self.active) < MultiDomainCrawlSpider.MAX_ACTIVE_DOMAINS:
+                domain, urls = next(self.seeds, (None, None))
+                if domain is None:
+                    break
+                self.started += 1
+                self.active[domain] = DomainContext(self, domain, shared.url2filename(urls[0]))
+                requests.extend(Request(url, errback=self.domain_errback,
+                                        meta={MultiDomainCrawlSpider.DOMAIN_META: domain}) for url in urls)
+            return requests
+
+        def start_requests(self):
+            for request in self.activate_domains():
+                yield request
+
+        def schedule(self, request):
+            try:
+                self.crawler.engine.crawl(request)
+            except TypeError:
+                self.crawler.engine.crawl(request, self)  # scrapy < 2.6
+
+        def follow_request(self, request, response):
+            domain = response.meta.get(MultiDomainCrawlSpider.DOMAIN_META)
+            if domain is None or not url_is_from_any_domain(request.url, [domain]):
+                return None
+            request.meta[MultiDomainCrawlSpider.DOMAIN_META] = domain
+            return request
+
+        def frontier_request(self, url, depth, priority):
+            request = super().frontier_request(url, depth, priority)
+            # spilled requests of a domain are pending, so the domain is still active, possibly as parent domain
+            netloc = urlparse(url).netloc
+            domain = self.active_domain(netloc) or netloc
+            request.meta[MultiDomainCrawlSpider.DOMAIN_META] = domain
+            request.meta[MultiDomainCrawlSpider.PENDING_META] = True
+            return request
+
+        def request_scheduled(self, request, spider):
+            # redirected and retried requests keep the meta data, they continue the original request
+            context = self.active.get(request.meta.get(MultiDomainCrawlSpider.DOMAIN_META))
+            if context is not None and not request.meta.get(MultiDomainCrawlSpider.PENDING_META):
+                request.meta[MultiDomainCrawlSpider.PENDING_META] = True
+                context.pending += 1
+
+        def request_dropped(self, request, spider):
+            self.request_done(request)
+
+        def request_done(self, request):
+            if not request.meta.pop(MultiDomainCrawlSpider.PENDING_META, False):
+                return
+            context = self.active.get(request.meta.get(MultiDomainCrawlSpider.DOMAIN_META))
+            if context is not None:
+                context.pending -= 1
+                if context.pending <= 0 and not context.resumed:
+                    self.finish_domain(context)
+
+        def finish_domain(self, context):
+            del self.active[context.domain]
+            if context.change_index is not None:
+                context.change_index.save()
+            context.s_log.info("[finish_domain] - Finished crawling {0}".format(context.domain))
+            self.crawler.signals.send_catch_log(signal=pipelines.domain_finished, context=context)
+            for request in self.activate_domains():
+                self.schedule(request)
+
+        def spider_idle(self, spider):
+            # nothing is scheduled, downloaded or parsed anymore, so the remaining domains are done as well
+            for context in list(self.active.values()):
+                self.finish_domain(context)
+            if self.active:
+                raise DontCloseSpider
+
+        def closed(self, reason):
+            # domains that are still active were interrupted
+            for context in self.active.values():
+                if context.change_index is not None:
+                    context.change_index.save(complete=False)
+            super().closed(reason)
+
+        def checkpoint(self, reason):
+            with open(os.path.join(self.job_dir, MultiDomainCrawlSpider.DOMAINS_FILE), "w",
+                      encoding="utf-8") as domains_file:
+                json.dump({"started": self.started, "active": list(self.active)}, domains_file)
+            super().checkpoint(reason)
+
+        def domain_errback(self, failure):
+            try:
+                for request_or_item in iterate_spider_output(self.parser.errback(failure) or ()):
+                    yield request_or_item
+            finally:
+                self.request_done(failure.request)
+
+        def _parse_response(self, response, callback, cb_kwargs, follow=True):
+            try:
+                result = super()._parse_response(response, callback, cb_kwargs, follow)
+            except Exception:
+                self.request_done(response.request)
+                raise
+            if isinstance(result, Deferred):
+                result.addErrback(self.parse_failed, response.request)
+            return result
+
+        def parse_failed(self, failure, request):
+            self.request_done(request)
+            return failure
+
+        def _iterate_parse_results(self, response, cb_res, follow):
+            # the request is done once all its items and requests are handed on, i.e. the new requests are scheduled
+            try:
+                for request_or_item in super()._iterate_parse_results(response, cb_res, follow):
+                    yield request_or_item
+            finally:
+                self.request_done(response.request)
+
+    return MultiDomainCrawlSpider
+
+
 class GenericScrapySettings(Settings):
 
     def __init__(self):
@@ -203,13 +700,77 @@ class GenericScrapySettings(Settings):
             "LOG_LEVEL": "WARNING",
             "DEPTH_PRIORITY": 1,
             "SCHEDULER_DISK_QUEUE": 'scrapy.squeues.PickleFifoDiskQueue',
-            "SCHEDULER_MEMORY_QUEUE": 'scrapy.squeues.FifoMemoryQueue',
-            "ROBOTSTXT_OBEY": True
+            "SCHEDULER_MEMORY_QUEUE": 'frontier.SpillingQueue',
+            "ROBOTSTXT_OBEY": True,
+            "DOWNLOADER_MIDDLEWARES": {
+                "middlewares.ContentTypeGateMiddleware": 50,
+                "middlewares.ConditionalRequestMiddleware": 60,
+                # after the RetryMiddleware (550), which retries throttled and failed requests
+                "middlewares.AdaptiveConcurrencyMiddleware": 580
+            }
             })
 
+    def set_performance(self, performance):
+        """ Apply the 'performance' section of a crawl specification, see PERFORMANCE_SETTINGS """
+        for key, value in performance.items():
+            if key in PERFORMANCE_SETTINGS:
+                self.set(PERFORMANCE_SETTINGS[key], value)
+            else:
+                MLOG.warning("Unknown performance setting '{0}' is ignored.".format(key))
+
+        if self.getbool("ADAPTIVE_CONCURRENCY_ENABLED") and "concurrent_requests" not in performance:
+            # do not let the global limit keep a single domain from reaching the maximum concurrency
+            self.set("CONCURRENT_REQUESTS", max(self.getint("CONCURRENT_REQUESTS"),
+                                                self.getint("ADAPTIVE_CONCURRENCY_MAX",
+                                                            AdaptiveConcurrency.DEFAULT_MAX_CONCURRENCY)))
+
+
+def add_spiders(process, crawl_specification):
+    """
+    Add the spiders of the crawl to ``process``, one per start url or a single multi-domain spider, returns their
+    crawlers
+    """
+    start_urls = list(OrderedDict.fromkeys(crawl_specification.urls))
+    if getattr(crawl_specification, "multi_domain", False) and start_urls:
+        name = crawl_specification.name or "multi_domain"
+        MLOG.info("Creating multi-domain spider {0} for {1} start urls".format(name, len(start_urls)))
+        spider_classes = [create_multi_domain_spider(crawl_specification, start_urls, name)]
+    else:
+        spider_classes = []
+        for url in start_urls:
+            name = shared.url2filename(url)
+            MLOG.info("Creating spider {0}".format(name))
+            spider_classes.append(create_spider(crawl_specification, url, name))
+
+    crawlers = []
+    for spider_class in spider_classes:
+        crawler = process.create_crawler(spider_class)
+        process.crawl(crawler)
+        crawlers.append(crawler)
+    return crawlers
+
+
+def finish_jobs(crawl_specification, crawlers):
+    """
+    Remove the job directories of all finished spiders, returns False if a spider was interrupted (shut down) and has
+    to be resumed
+    """
+    interrupted = False
+    for crawler in crawlers:
+        reason = crawler.stats.get_value("finish_reason")
+        if reason == "shutdown":
+            interrupted = True
+        elif reason == "finished" and crawler.spidercls.job_dir:
+            shutil.rmtree(crawler.spidercls.job_dir, ignore_errors=True)
+
+    jobs = os.path.join(crawl_specification.logs or "", JOBS_DIR, crawl_specification.name or "crawl")
+    if getattr(crawl_specification, "resume", False) and os.path.isdir(jobs) and not os.listdir(jobs):
+        os.rmdir(jobs)
+    return not interrupted
+
 
 def run_crawl(call_parameter, worker_flag=False):
-    """Run crawl with given parameter."""
+    """Run crawl with given parameter. Workers are told whether the crawl is done or has to be resumed."""
     global MLOG
     # setup consistent language detection
     DetectorFactory.seed = 0
@@ -237,29 +798,32 @@ def run_crawl(call_parameter, worker_flag=False):
         scrapy_settings.set("LOG_FILE", os.path.join(crawl_specification.logs, "scrapy.log"))
 
     scrapy_settings.set("ITEM_PIPELINES", crawl_specification.pipelines)
+    scrapy_settings.set_performance(getattr(crawl_specification, "performance", None) or dict())
+    if getattr(crawl_specification, "multi_domain", False) or getattr(crawl_specification, "change_index", None):
+        scrapy_settings.set("ITEM_PROCESSOR", "pipelines.DomainPipelineManager")
 
     MLOG.info("Initiating scrapy crawler process")
     process = CrawlerProcess(settings=scrapy_settings)
-    start_urls = list(set(crawl_specification.urls))
-    allowed_domains = list(map(lambda x: urlparse(x).netloc, start_urls))
-    for url in start_urls:
-        name = shared.url2filename(url)
-        MLOG.info("Creating spider {0}".format(name))
-        process.crawl(create_spider(crawl_specification, url, name))
+    crawlers = add_spiders(process, crawl_specification)
     try:
         process.start()
     except Exception as exc:
         MLOG.exception("{0}: {1}".format(type(exc).__name__, exc))
 
-    # every spider finished, finalize crawl
-    for finalizer_path in crawl_specification.finalizers:
-        finalizer = shared.get_class(finalizer_path)
-        if finalizer:
-            # somehow pass the collected language statistics from parser
-            finalizer(crawl_specification, crawl_specification.finalizers[finalizer_path]).finalize_crawl()
+    # the output of an interrupted resumable crawl is incomplete, the finalizers run once the resumed crawl finishes
+    interrupted = not finish_jobs(crawl_specification, crawlers) and getattr(crawl_specification, "resume", False)
+    if interrupted:
+        MLOG.info("Crawl was interrupted, it is resumed by the next crawl of {0}".format(crawl_specification.name))
+    else:
+        # every spider finished, finalize crawl
+        for finalizer_path in crawl_specification.finalizers:
+            finalizer = shared.get_class(finalizer_path)
+            if finalizer:
+                # somehow pass the collected language statistics from parser
+                finalizer(crawl_specification, crawl_specification.finalizers[finalizer_path]).finalize_crawl()
 
     if worker_flag == True:
-        return True
+        return not interrupted
 
 
 def get_info():
@@ -298,11 +862,18 @@ def generate_template_specification(parser_class=None):
                               parser=p_class,
                               parser_data=p_data,
                               pipelines={"<Pipeline Class>": 300},
+                              pipeline_data={"<Pipeline Option>": "<Value>"},
+                              multi_domain=False,
+                              resume=False,
+                              change_index=None,
+                              performance={"<Performance Option>": "<Value>"},
                               finalizers={"<Finalizer Class>": "<Finalizer Data Dictionary>"})
     return spec
 
 
 if __name__ == '__main__':
+    # required for the worker processes of parser_pool in frozen executables
+    multiprocessing.freeze_support()
 
     # get call parameter
     if len(sys.argv) >= 2:
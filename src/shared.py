@@ -24,7 +24,8 @@ import importlib
 import json
 import os
 import sys
-from logging import INFO, Logger, Formatter, StreamHandler, FileHandler
+from collections import OrderedDict
+from logging import INFO, Logger, LoggerAdapter, Formatter, StreamHandler, FileHandler
 from urllib.parse import urlparse
 
 
@@ -40,7 +41,12 @@ class CrawlSpecification:
                  parser: str = None,
                  parser_data: {} = None,
                  pipelines: {} = None,
-                 finalizers: {} = None):
+                 pipeline_data: {} = None,
+                 finalizers: {} = None,
+                 multi_domain: bool = False,
+                 resume: bool = False,
+                 change_index: str = None,
+                 performance: {} = None):
 
         self.name = name
         self.output = output
@@ -68,10 +74,22 @@ class CrawlSpecification:
             pipelines = dict()
         self.pipelines = pipelines
 
+        if pipeline_data is None:
+            pipeline_data = dict()
+        self.pipeline_data = pipeline_data
+
         if finalizers is None:
             finalizers = dict()
         self.finalizers = finalizers
 
+        self.multi_domain = multi_domain
+        self.resume = resume
+        self.change_index = change_index
+
+        if performance is None:
+            performance = dict()
+        self.performance = performance
+
     def update(self,
                name: str = None,
                output: str = None,
@@ -82,7 +100,12 @@ class CrawlSpecification:
                parser: str = None,
                parser_data: {} = None,
                pipelines: {} = None,
-               finalizers: {} = None):
+               pipeline_data: {} = None,
+               finalizers: {} = None,
+               multi_domain: bool = None,
+               resume: bool = None,
+               change_index: str = None,
+               performance: {} = None):
         if name:
             self.name = name
         if output:
@@ -101,8 +124,18 @@ class CrawlSpecification:
             self.parser_data = parser_data
         if pipelines:
             self.pipelines = pipelines
+        if pipeline_data:
+            self.pipeline_data = pipeline_data
         if finalizers:
             self.finalizers = finalizers
+        if multi_domain is not None:
+            self.multi_domain = multi_domain
+        if resume is not None:
+            self.resume = resume
+        if change_index:
+            self.change_index = change_index
+        if performance:
+            self.performance = performance
 
     def serialize(self, pretty=True):
         if pretty:
@@ -116,6 +149,46 @@ class CrawlSpecification:
             setattr(self, key, data[key])
 
 
+class LRUCache:
+    """
+    Bounded mapping that evicts the least recently used entry as soon as more than ``maxsize`` entries are stored.
+    Hits and misses are counted, so that callers can report the effectiveness of their caches.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
 def url2filename(url):
     return (urlparse(url).netloc + urlparse(url).path).replace("/", "_")
 
@@ -161,6 +234,16 @@ def simple_logger(loger_name="core", file_path=None, console_level=INFO, file_le
     return logger
 
 
+class PrefixLoggerAdapter(LoggerAdapter):
+    """ Prefixes all messages with '[prefix]', so that several sources can share one logger and its log file """
+
+    def __init__(self, logger, prefix):
+        super().__init__(logger, {"prefix": prefix})
+
+    def process(self, msg, kwargs):
+        return "[{0}] {1}".format(self.extra["prefix"], msg), kwargs
+
+
 def get_class(class_path):
     """
     Return the class object of the specified class-path, e.g. core.QtExtensions.SimpleMessageBox.
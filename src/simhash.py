@@ -0,0 +1,162 @@
+"""
+Created on 17.10.2026
+
+@author: Maximilian Pensel
+
+Copyright 2019 Maximilian Pensel <maximilian.pensel@gmx.de>
+
+This file is part of OWS-scrapy-wrapper.
+
+OWS-scrapy-wrapper is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+OWS-scrapy-wrapper is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with OWS-scrapy-wrapper.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import hashlib
+import re
+
+import numpy as np
+
+TOKEN = re.compile(r"\w+")
+
+# number of set bits of every byte value
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def simhash(text):
+    """ Return the 64 bit SimHash of the lower case word tokens of ``text``, None if it has no tokens """
+    tokens = TOKEN.findall(text.lower())
+    if not tokens:
+        return None
+
+    hashes = np.array([int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+                       for token in tokens], dtype=np.uint64)
+    bits = np.unpackbits(hashes.view(np.uint8)).reshape(-1, 64)
+    # a bit of the fingerprint is set if it is set in the majority of token hashes
+    majority = (bits.sum(axis=0) * 2 > len(tokens)).astype(np.uint8)
+    return int(np.packbits(majority).view(np.uint64)[0])
+
+
+def hamming_distances(fingerprints, fingerprint):
+    """ Return the Hamming distances between the uint64 array ``fingerprints`` and ``fingerprint`` """
+    xor = np.bitwise_xor(fingerprints, np.uint64(fingerprint))
+    return _POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class _Generation:
+    """
+    Fingerprints of one generation of a SimHashIndex. Every band of the fingerprints is kept in a sorted array, so
+    that candidates sharing a band with a query are found by binary search. New fingerprints are collected in a small
+    buffer, which is compared linearly and merged into the sorted arrays once it is full.
+    """
+
+    BUFFER_SIZE = 1024
+
+    def __init__(self, bands):
+        self.bands = bands  # (shift, mask) per band
+        self.fingerprints = np.zeros(0, dtype=np.uint64)
+        self.band_keys = [np.zeros(0, dtype=np.uint64) for _ in bands]
+        self.band_positions = [np.zeros(0, dtype=np.int32) for _ in bands]
+        self.buffer = []
+
+    def __len__(self):
+        return len(self.fingerprints) + len(self.buffer)
+
+    def band(self, fingerprint, shift, mask):
+        return np.uint64((fingerprint >> shift) & mask)
+
+    def find(self, fingerprint, distance):
+        """ Return a stored fingerprint within ``distance`` of ``fingerprint``, None if there is none """
+        if self.buffer:
+            buffered = np.array(self.buffer, dtype=np.uint64)
+            matches = np.nonzero(hamming_distances(buffered, fingerprint) <= distance)[0]
+            if len(matches):
+                return int(buffered[matches[0]])
+
+        for (shift, mask), keys, positions in zip(self.bands, self.band_keys, self.band_positions):
+            key = self.band(fingerprint, shift, mask)
+            start = np.searchsorted(keys, key, side="left")
+            stop = np.searchsorted(keys, key, side="right")
+            if start == stop:
+                continue
+            candidates = self.fingerprints[positions[start:stop]]
+            matches = np.nonzero(hamming_distances(candidates, fingerprint) <= distance)[0]
+            if len(matches):
+                return int(candidates[matches[0]])
+        return None
+
+    def add(self, fingerprint):
+        self.buffer.append(fingerprint)
+        if len(self.buffer) >= _Generation.BUFFER_SIZE:
+            self.merge()
+
+    def merge(self):
+        new = np.array(self.buffer, dtype=np.uint64)
+        new_positions = np.arange(len(self.fingerprints), len(self.fingerprints) + len(new), dtype=np.int32)
+        self.fingerprints = np.concatenate((self.fingerprints, new))
+        self.buffer = []
+
+        for i, (shift, mask) in enumerate(self.bands):
+            new_keys = (new >> np.uint64(shift)) & np.uint64(mask)
+            order = np.argsort(new_keys, kind="mergesort")
+            new_keys = new_keys[order]
+            insert_at = np.searchsorted(self.band_keys[i], new_keys)
+            self.band_keys[i] = np.insert(self.band_keys[i], insert_at, new_keys)
+            self.band_positions[i] = np.insert(self.band_positions[i], insert_at, new_positions[order])
+
+
+class SimHashIndex:
+    """
+    Index of 64 bit SimHash fingerprints that finds a stored fingerprint within a Hamming distance of ``distance``.
+    The fingerprints are split into distance + 1 bands, two fingerprints within the distance agree on at least one
+    band. Memory is bounded by ``capacity`` fingerprints: the index keeps two generations of capacity / 2 fingerprints,
+    once the current generation is full, the previous one is dropped.
+    """
+
+    DEFAULT_DISTANCE = 3
+    DEFAULT_CAPACITY = 1000000
+
+    def __init__(self, distance=DEFAULT_DISTANCE, capacity=DEFAULT_CAPACITY):
+        self.distance = distance
+        self.capacity = capacity
+
+        count = distance + 1
+        self.bands = []
+        shift = 0
+        for i in range(count):
+            width = 64 // count + (1 if i < 64 % count else 0)
+            self.bands.append((shift, (1 << width) - 1))
+            shift += width
+
+        self.current = _Generation(self.bands)
+        self.previous = None
+
+    def __len__(self):
+        return len(self.current) + (len(self.previous) if self.previous is not None else 0)
+
+    def find(self, fingerprint):
+        found = self.current.find(fingerprint, self.distance)
+        if found is None and self.previous is not None:
+            found = self.previous.find(fingerprint, self.distance)
+        return found
+
+    def add(self, fingerprint):
+        if len(self.current) >= max(1, self.capacity // 2):
+            self.previous = self.current
+            self.current = _Generation(self.bands)
+        self.current.add(fingerprint)
+
+    def check(self, fingerprint):
+        """ Return True if a near-duplicate of ``fingerprint`` is stored, otherwise store it and return False """
+        if self.find(fingerprint) is not None:
+            return True
+        self.add(fingerprint)
+        return False
@@ -0,0 +1,65 @@
+import json
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from remote import task_consumer
+from remote.task_consumer import MAX_UNFINISHED_RUNS, TaskConsumer
+
+
+class Channel:
+    """Records the acknowledgements of a task."""
+
+    def __init__(self):
+        self.calls = []
+
+    def basic_ack(self, delivery_tag):
+        self.calls.append("ack")
+
+    def basic_nack(self, delivery_tag, requeue):
+        self.calls.append("nack" if requeue else "drop")
+
+    def basic_reject(self, delivery_tag, requeue):
+        self.calls.append("reject")
+
+    def basic_cancel(self, consumer_tag):
+        pass
+
+
+def deliver(body, redelivered, run_crawl, monkeypatch):
+    """Deliver a task to a consumer whose crawls are run by ``run_crawl``, returns the acknowledgements."""
+    monkeypatch.setattr(task_consumer, "run_crawl", run_crawl)
+    consumer = TaskConsumer.__new__(TaskConsumer)
+    consumer.channel = channel = Channel()
+    consumer.consumer_tag = "worker"
+    try:
+        consumer.callback(channel, SimpleNamespace(redelivered=redelivered, delivery_tag=1), None, body)
+    except SystemExit:
+        pass  # workers exit after every task they processed
+    return channel.calls
+
+
+def test_task_redelivery(tmp_path, monkeypatch):
+    """Redelivered tasks are only resumed for resumable crawls, and only until they stopped too often."""
+    plain = json.dumps({"name": "plain", "logs": str(tmp_path)})
+    resumable = json.dumps({"name": "resumable", "logs": str(tmp_path), "resume": True})
+    finished = lambda body, worker_flag: True
+    assert deliver(plain, True, finished, monkeypatch) == ["ack"]
+    assert deliver(plain, False, finished, monkeypatch) == ["ack"]
+    assert deliver(resumable, False, lambda body, worker_flag: False, monkeypatch) == ["nack"]
+
+    def crash(body, worker_flag):
+        raise MemoryError()
+
+    for _ in range(MAX_UNFINISHED_RUNS):
+        with pytest.raises(MemoryError):
+            deliver(resumable, True, crash, monkeypatch)
+    assert deliver(resumable, True, finished, monkeypatch) == ["reject"]
+    # the count starts over, runs that end reset it
+    assert deliver(resumable, True, finished, monkeypatch) == ["ack"]
+
+    def invalid(body, worker_flag):
+        sys.exit(1)
+
+    assert deliver(plain, False, invalid, monkeypatch) == ["reject"]
@@ -0,0 +1,38 @@
+from scrapy.http import HtmlResponse, Response
+
+from change_index import ChangeIndex
+
+
+def response(url, body=b"", status=200, headers=None):
+    return HtmlResponse(url, body=body, status=status, headers=headers) if status == 200 \
+        else Response(url, status=status, headers=headers)
+
+
+def test_change_index(tmp_path):
+    """Pages are classified against the previous crawl, whose links are taken over for unchanged pages."""
+    index = ChangeIndex(str(tmp_path), "www.example.com")
+    assert index.check(response("http://www.example.com/", b"start", headers={"ETag": '"1"'})) == ChangeIndex.NEW
+    index.set_links("http://www.example.com/", ["http://www.example.com/a", "http://www.example.com/b"])
+    assert index.check(response("http://www.example.com/a", b"a",
+                                headers={"Last-Modified": "Sat, 17 Oct 2026 10:00:00 GMT"})) == ChangeIndex.NEW
+    assert index.check(response("http://www.example.com/b", b"b")) == ChangeIndex.NEW
+    index.save()
+
+    index = ChangeIndex(str(tmp_path), "www.example.com")
+    assert index.conditional_headers("http://www.example.com/") == {"If-None-Match": '"1"'}
+    assert index.conditional_headers("http://www.example.com/a") == {
+        "If-Modified-Since": "Sat, 17 Oct 2026 10:00:00 GMT"}
+    assert index.conditional_headers("http://www.example.com/b") == {}
+    assert index.check(response("http://www.example.com/", status=304)) == ChangeIndex.NOT_MODIFIED
+    assert index.check(response("http://www.example.com/a", b"a changed")) == ChangeIndex.CHANGED
+    index.save(complete=False)
+
+    # b was not crawled again, the interrupted crawl keeps its entry of the previous crawl
+    index = ChangeIndex(str(tmp_path), "www.example.com")
+    assert index.previous_links("http://www.example.com/") == ["http://www.example.com/a", "http://www.example.com/b"]
+    assert index.check(response("http://www.example.com/b", b"b")) == ChangeIndex.UNCHANGED
+    index.save()
+
+    index = ChangeIndex(str(tmp_path), "www.example.com")
+    assert sorted(index.previous) == ["http://www.example.com/b"]
+    assert index.previous_urls == ["http://www.example.com/b"]
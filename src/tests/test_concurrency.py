@@ -0,0 +1,39 @@
+from concurrency import AdaptiveConcurrency
+
+
+def test_adaptive_concurrency():
+    """Saturated fast domains get more concurrent requests, throttled, failing and slow ones back off."""
+    controller = AdaptiveConcurrency(min_concurrency=2, max_concurrency=10, target_latency=1.0, max_error_rate=0.1,
+                                     window=5)
+    assert controller.concurrency("fast", 16) == 10
+    assert controller.concurrency("slow", 8) == 8
+    assert controller.concurrency("idle", 4) == 4
+
+    # only domains that use all of their concurrent requests are increased, once per window
+    decisions = [controller.record("idle", 4, status=200, latency=0.1, in_use=1) for _ in range(5)]
+    assert decisions == [None] * 4 + [AdaptiveConcurrency.HOLD]
+    for _ in range(10):
+        controller.record("idle", 4, status=200, latency=0.1, in_use=5)
+    assert controller.concurrency("idle", 4) == 6
+    for _ in range(50):
+        controller.record("fast", 16, status=200, latency=0.1, in_use=10)
+    assert controller.concurrency("fast", 16) == 10
+
+    # a 429 halves the concurrency once, responses to the requests under way at that time are not judged again
+    assert controller.record("fast", 16, status=429, latency=0.1, in_use=10) == AdaptiveConcurrency.THROTTLED
+    assert controller.concurrency("fast", 16) == 5
+    assert [controller.record("fast", 16, status=429, in_use=9) for _ in range(9)] == [None] * 9
+    assert controller.record("fast", 16, status=503, in_use=5) == AdaptiveConcurrency.THROTTLED
+    assert controller.concurrency("fast", 16) == 2
+    assert [controller.record("fast", 16, status=200, in_use=1) for _ in range(4)] == [None] * 4
+    assert controller.record("fast", 16, status=503, in_use=1) == AdaptiveConcurrency.THROTTLED
+    assert controller.concurrency("fast", 16) == 2
+
+    decisions = [controller.record("slow", 8, status=200, latency=3.0, in_use=8) for _ in range(5)]
+    assert decisions[-1] == AdaptiveConcurrency.LATENCY
+    assert controller.concurrency("slow", 8) == 4
+    assert [controller.record("slow", 8, status=200, latency=3.0, in_use=7) for _ in range(7)] == [None] * 7
+    decisions = [controller.record("slow", 8, status=status, latency=0.5, in_use=1)
+                 for status in (200, 500, None, 200, 200)]
+    assert decisions[-1] == AdaptiveConcurrency.ERRORS
+    assert controller.concurrency("slow", 8) == 2
@@ -0,0 +1,101 @@
+import hashlib
+import os
+from types import SimpleNamespace
+
+from scrapy import Request
+from scrapy.settings import Settings
+from scrapy.signalmanager import SignalManager
+from scrapy.statscollectors import MemoryStatsCollector
+
+from frontier import FingerprintSet, SeenRequestsFilter, SpillingQueue
+
+
+def test_fingerprint_set(tmp_path, monkeypatch):
+    """Fingerprints are found before and after they are merged into the sorted array, and after loading."""
+    monkeypatch.setattr(FingerprintSet, "MIN_MERGE", 4)
+    fingerprints = FingerprintSet()
+    values = [(i * 0x9E3779B97F4A7C15) % 2 ** 64 for i in range(1, 50)]
+    assert all(fingerprints.add(value) for value in values)
+    assert not any(fingerprints.add(value) for value in values)
+    assert len(fingerprints) == len(values) and len(fingerprints.recent) < len(values)
+
+    path = os.path.join(str(tmp_path), "fingerprints")
+    fingerprints.save(path)
+    loaded = FingerprintSet.load(path)
+    assert all(value in loaded for value in values) and 2 ** 64 - 1 not in loaded
+    assert os.path.getsize(path) == 8 * len(values)
+
+
+def test_seen_requests_filter(tmp_path):
+    """Seen requests are filtered, also by the filter of a resumed job."""
+    fingerprinter = SimpleNamespace(fingerprint=lambda request: hashlib.sha1(request.url.encode("utf-8")).digest())
+    dupefilter = SeenRequestsFilter(str(tmp_path), fingerprinter=fingerprinter)
+    assert not dupefilter.request_seen(Request("http://a.example/1"))
+    assert dupefilter.request_seen(Request("http://a.example/1"))
+    dupefilter.close("shutdown")
+
+    resumed = SeenRequestsFilter(str(tmp_path), fingerprinter=fingerprinter)
+    assert resumed.request_seen(Request("http://a.example/1"))
+    assert not resumed.request_seen(Request("http://a.example/2"))
+
+
+class LinkSpider:
+    """ Spider whose link requests carry the meta key 'rule' """
+
+    def frontier_entry(self, request):
+        if "rule" not in request.meta:
+            return None
+        return request.url, request.meta["depth"], request.priority
+
+    def frontier_request(self, url, depth, priority):
+        return Request(url, meta={"rule": 0, "depth": depth}, priority=priority)
+
+
+def test_spilling_queue(tmp_path):
+    """Requests beyond the head size are spilled to segment files and popped in order, other requests stay in memory."""
+    crawler = SimpleNamespace(spider=LinkSpider(), signals=SignalManager(),
+                              settings=Settings({"FRONTIER_HEAD_SIZE": 10, "FRONTIER_SPILL_DIR": str(tmp_path)}))
+    crawler.stats = MemoryStatsCollector(crawler)
+    queue = SpillingQueue.from_crawler(crawler, "/-3")
+    urls = ["http://a.example/{0}".format(i) for i in range(35)]
+    for url in urls:
+        queue.push(Request(url, meta={"rule": 0, "depth": 3}, priority=-3))
+    queue.push(Request("http://a.example/retry", dont_filter=True))
+    assert len(queue) == 36
+    assert crawler.stats.get_value("frontier/memory") == 11 and crawler.stats.get_value("frontier/disk") == 25
+    assert len(os.listdir(queue.directory)) == 2
+
+    popped = [queue.pop() for _ in range(len(queue))]
+    assert [request.url for request in popped] == urls[:10] + ["http://a.example/retry"] + urls[10:]
+    assert all(request.meta["depth"] == 3 and request.priority == -3 for request in popped[11:])
+    assert queue.pop() is None and len(queue) == 0
+    assert crawler.stats.get_value("frontier/memory") == 0 and crawler.stats.get_value("frontier/disk_max") == 25
+    assert not os.listdir(queue.directory)
+
+    queue.push(Request(urls[0], meta={"rule": 0, "depth": 1}))
+    queue.close()
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_spilling_queue_slot_budget(tmp_path):
+    """The queues of all priorities of a downloader slot keep at most FRONTIER_HEAD_SIZE requests in memory together."""
+    crawler = SimpleNamespace(spider=LinkSpider(), signals=SignalManager(),
+                              settings=Settings({"FRONTIER_HEAD_SIZE": 10, "FRONTIER_SPILL_DIR": str(tmp_path)}))
+    crawler.stats = MemoryStatsCollector(crawler)
+    shallow = SpillingQueue.from_crawler(crawler, "/a.example/1")
+    deep = SpillingQueue.from_crawler(crawler, "/a.example/2")
+    other = SpillingQueue.from_crawler(crawler, "/b.example/1")
+    for depth, queue in [(1, shallow), (2, deep), (1, other)]:
+        for i in range(8):
+            queue.push(Request("http://a.example/{0}/{1}".format(depth, i), meta={"rule": 0, "depth": depth}))
+    assert (len(shallow.head), len(deep.head), len(other.head)) == (8, 2, 8)
+    assert crawler.stats.get_value("frontier/memory") == 18 and crawler.stats.get_value("frontier/disk") == 6
+
+    # read back entries only take the memory that the other queues of the slot leave
+    assert [deep.pop().url for _ in range(3)] == ["http://a.example/2/{0}".format(i) for i in range(3)]
+    assert (len(deep.head), deep.spilled) == (1, 4)
+    while shallow.pop() is not None:
+        pass
+    assert [request.url for request in iter(deep.pop, None)] == ["http://a.example/2/{0}".format(i)
+                                                                 for i in range(3, 8)]
+    assert shallow.budget.used == 0 and other.budget.used == 8
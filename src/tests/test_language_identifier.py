@@ -0,0 +1,47 @@
+import pytest
+
+from langdetect import DetectorFactory
+from langdetect.lang_detect_exception import LangDetectException
+
+from language_identifier import LanguageIdentifier
+
+
+@pytest.fixture(scope='module', autouse=True)
+def seeded_langdetect():
+    DetectorFactory.seed = 0
+
+
+def test_detect_page():
+    """Paragraph and page languages are returned together."""
+    identifier = LanguageIdentifier()
+    paragraphs = ["Die Ergebnisse der Umfrage werden im kommenden Monat veröffentlicht.",
+                  "Weitere Informationen erhalten Sie bei unserer Geschäftsstelle.",
+                  "1234"]
+
+    par_results, page_languages = identifier.detect_page(paragraphs)
+
+    assert LanguageIdentifier.top_language(par_results[0]) == "de"
+    assert LanguageIdentifier.top_language(par_results[1]) == "de"
+    assert isinstance(par_results[2], LangDetectException)
+    assert page_languages[0].lang == "de"
+
+
+def test_detect_page_cached():
+    """Whitespace variants of a paragraph are only classified once."""
+    identifier = LanguageIdentifier()
+
+    identifier.detect_page(["Please contact our office for further information."])
+    identifier.detect_page(["Please  contact our office\n for further information. "])
+
+    assert identifier.cache.misses == 1
+    assert identifier.cache.hits == 1
+
+
+def test_detect_page_min_length():
+    """Paragraphs below the minimum length are skipped."""
+    identifier = LanguageIdentifier(min_length=10)
+
+    par_results, page_languages = identifier.detect_page(["Impressum"])
+
+    assert par_results == [None]
+    assert isinstance(page_languages, LangDetectException)
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+
+import pytest
+from scrapy import Request
+from scrapy.http import Response
+from scrapy.settings import Settings
+from scrapy.signalmanager import SignalManager
+from scrapy.statscollectors import MemoryStatsCollector
+
+import middlewares
+from middlewares import ContentGated, ContentTypeGateMiddleware
+from parsers import RawParser
+
+
+@pytest.fixture
+def gate():
+    crawler = SimpleNamespace(signals=SignalManager(), settings=Settings())
+    crawler.stats = MemoryStatsCollector(crawler)
+    return ContentTypeGateMiddleware(crawler)
+
+
+def response(url, content_type, body=b""):
+    return Response(url, headers={"Content-Type": content_type}, body=body, request=Request(url))
+
+
+def test_content_type_gate(gate):
+    """Unparsed content types and oversized bodies are dropped, html pages pass for their links."""
+    spider = SimpleNamespace(parser=RawParser(data={"allowed_content_type": ["application/pdf"],
+                                                    "max_body_size": {"application/pdf": 10}}))
+    html = response("http://example.com/", "text/html; charset=utf-8")
+    assert gate.process_response(html.request, html, spider) is html
+    small_pdf = response("http://example.com/a.pdf", "application/pdf", b"%PDF")
+    assert gate.process_response(small_pdf.request, small_pdf, spider) is small_pdf
+    for rejected in [response("http://example.com/a.png", "image/png"),
+                     response("http://example.com/b.pdf", "application/pdf", b"%PDF" + b"x" * 10)]:
+        with pytest.raises(ContentGated):
+            gate.process_response(rejected.request, rejected, spider)
+    assert gate.stats.get_value("content_gate/dropped/content_type") == 1
+    assert gate.stats.get_value("content_gate/dropped/size") == 1
+
+    # the size limit of pdfs does not apply to the unbounded html pages
+    request = Request("http://example.com/c")
+    gate.process_request(request, spider)
+    assert "download_maxsize" not in request.meta
+    spider.parser.data["max_body_size"].update({"text/html": 5, "application/xhtml+xml": 5})
+    gate.process_request(request, spider)
+    assert request.meta["download_maxsize"] == 10
+
+
+@pytest.mark.skipif(middlewares.StopDownload is None, reason="scrapy < 2.5 has no headers_received signal")
+def test_content_type_gate_headers(gate):
+    """Downloads are stopped at header time by their content type and declared length."""
+    spider = SimpleNamespace(parser=RawParser(data={"allowed_content_type": ["application/pdf"],
+                                                    "max_body_size": {"application/pdf": 10}}))
+    request = Request("http://example.com/")
+    gate.headers_received({b"Content-Type": b"text/html"}, -1, request, spider)
+    gate.headers_received({b"Content-Type": b"application/pdf"}, 10, request, spider)
+    with pytest.raises(middlewares.StopDownload):
+        gate.headers_received({b"Content-Type": b"image/png"}, -1, request, spider)
+    with pytest.raises(middlewares.StopDownload):
+        gate.headers_received({b"Content-Type": b"application/pdf"}, 11, request, spider)
+    # redirects pass regardless of their content type
+    gate.headers_received({b"Content-Type": b"image/png", b"Location": b"/"}, -1, request, spider)
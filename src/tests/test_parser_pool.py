@@ -0,0 +1,84 @@
+import logging
+import os
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from scrapy.http import HtmlResponse, Request
+from twisted.internet import defer
+
+import parser_pool
+from parser_pool import ParserProcessPool
+from parsers import ParagraphItem, ResponseParser
+
+
+class ExceptionParser(ResponseParser):
+    """Returns a paragraph with an exception as language, or raises for pages below /fail."""
+
+    def __init__(self, data=None, spider=None):
+        super().__init__(callbacks={"text/html": self.parse_html}, data=data, spider=spider)
+
+    def parse_html(self, response):
+        if response.url.endswith("/fail"):
+            raise ValueError("parsing failed")
+        self.log(logging.INFO, "Parsed " + response.url)
+        return [ParagraphItem(url=response.url, content="Absatz", par_lang=ValueError("No features in text."))]
+
+
+def main_parser(output):
+    """Parser of the main process, whose spider state is handed to the workers and which replays their log."""
+    messages = []
+    return SimpleNamespace(spider=SimpleNamespace(crawl_specification=SimpleNamespace(output=output)),
+                           log=lambda level, message: messages.append((level, message)), messages=messages)
+
+
+def response(url):
+    return HtmlResponse(url, body=b"<html><body><p>Absatz</p></body></html>", status=203,
+                        headers={"Content-Type": "text/html; charset=utf-8"},
+                        request=Request(url, headers={"Referer": "http://www.example.com/"}, meta={"depth": 2}))
+
+
+def test_parser_pool_round_trip(tmp_path):
+    """Workers rebuild the response with status and request headers, spool into the output directory of the spider."""
+    pool = ParserProcessPool("parsers.RawParser", {"spool_threshold": 4}, size=1, max_in_flight=1)
+    parser = main_parser(str(tmp_path))
+    try:
+        result = pool.executor.submit(parser_pool._parse_in_worker,
+                                      *ParserProcessPool.job(parser, response("http://www.example.com/a"))).result()
+    finally:
+        pool.shutdown()
+
+    items = ParserProcessPool._replay_log(result, parser)
+    assert len(items) == 1 and items[0]["status"] == 203 and items[0]["depth"] == 2
+    assert items[0]["request_headers"]["Referer"] == ["http://www.example.com/"]
+    assert items[0]["content"] is None and os.path.dirname(items[0]["content_file"]) == str(tmp_path / ".spool")
+    assert parser.messages == [(logging.INFO, "Storing response <203 http://www.example.com/a>")]
+
+
+def test_parser_pool_exceptions(monkeypatch, tmp_path):
+    """Exception values of items are turned into strings, exceptions of the parser fail the Deferred of the response."""
+    monkeypatch.setattr(parser_pool, "_WORKER_PARSER", None)
+    parser_pool._init_worker("tests.test_parser_pool.ExceptionParser", {})
+    parser = main_parser(str(tmp_path))
+    items = ParserProcessPool._replay_log(
+        parser_pool._parse_in_worker(*ParserProcessPool.job(parser, response("http://www.example.com/a"))), parser)
+    assert items[0]["par_lang"] == "No features in text."
+    assert parser.messages == [(logging.INFO, "Parsed http://www.example.com/a")]
+
+    pool = ParserProcessPool("tests.test_parser_pool.ExceptionParser", {}, size=1, max_in_flight=1)
+    try:
+        future = pool.executor.submit(parser_pool._parse_in_worker,
+                                      *ParserProcessPool.job(parser, response("http://www.example.com/fail")))
+        future.exception()
+    finally:
+        pool.shutdown()
+
+    failures = []
+    deferred = defer.Deferred().addErrback(failures.append)
+    ParserProcessPool._fire(deferred, future)
+    assert failures[0].check(ValueError) and str(failures[0].value) == "parsing failed"
+
+    succeeded = Future()
+    succeeded.set_result(([], []))
+    results = []
+    ParserProcessPool._fire(defer.Deferred().addCallback(results.append), succeeded)
+    assert results == [([], [])]
@@ -0,0 +1,82 @@
+import pytest
+
+from scrapy.http import HtmlResponse, Request
+
+from parsers import ParagraphParser
+
+
+HTML = b"""<html><body>
+<p>First <b>paragraph</b></p>
+<table><tr><td><p>Nested</p> cell</td><td>Second cell</td></tr></table>
+<div class="teaser">Teaser</div>
+<p>Last<!-- comment --> paragraph</p>
+</body></html>"""
+
+
+@pytest.fixture
+def html_response():
+    url = "http://www.example.com/page"
+    return HtmlResponse(url, body=HTML, encoding="utf-8", headers={"Content-Type": "text/html; charset=utf-8"},
+                        request=Request(url, meta={"depth": 0}))
+
+
+def test_extract_paragraphs(html_response):
+    """Paragraphs are extracted in document order, nested matches are merged into their enclosing paragraph."""
+    parser = ParagraphParser(data={"xpaths": ["//p", "//td", "//div[@class='teaser']"]})
+
+    paragraphs = list(parser.extract_paragraphs(html_response.selector.root))
+
+    assert paragraphs == [("First paragraph", "//p"),
+                          ("Nested cell", "//td"),
+                          ("Second cell", "//td"),
+                          ("Teaser", "//div[@class='teaser']"),
+                          ("Last paragraph", "//p")]
+
+
+def test_extract_paragraphs_strings(html_response):
+    """String results of text() and attribute expressions get the origin of the expression that selected them."""
+    parser = ParagraphParser(data={"xpaths": ["//p", "//td/text()", "//div/@class", "//div/text()"]})
+
+    paragraphs = list(parser.extract_paragraphs(html_response.selector.root))
+
+    assert paragraphs == [("First paragraph", "//p"),
+                          ("Nested", "//p"),
+                          (" cell", "//td/text()"),
+                          ("Second cell", "//td/text()"),
+                          ("teaser", "//div/@class"),
+                          ("Teaser", "//div/text()"),
+                          ("Last paragraph", "//p")]
+
+
+def test_parse_html(html_response):
+    """Each extracted paragraph becomes a ParagraphItem."""
+    parser = ParagraphParser(data={"allowed_languages": ["disabled"]})
+
+    items = parser.parse(html_response)
+
+    assert [item["content"] for item in items] == ["First paragraph", "Nested cell", "Second cell", "Last paragraph"]
+    assert all(item["depth"] == 0 and item["par_lang"] is None for item in items)
+
+
+MAIN_CONTENT_HTML = b"""<html><body>
+<nav><p>Home</p><p>About us and everything else you might want to know about our company</p></nav>
+<div id="cookie-notice"><p>This site uses cookies to improve your experience, by continuing you accept them.</p></div>
+<div class="article">
+<p>The main content of this page is a paragraph with enough words to count as real running text.</p>
+<p>Read more</p>
+<p><a href="/a">A paragraph that consists</a> <a href="/b">of nothing but links to other pages</a> here</p>
+</div>
+<footer><p>Copyright 2019 by the example company, all rights reserved, see imprint.</p></footer>
+</body></html>"""
+
+
+def test_extract_main_content():
+    """In main content mode, paragraphs in boilerplate sections, short and link heavy paragraphs are skipped."""
+    url = "http://www.example.com/page"
+    response = HtmlResponse(url, body=MAIN_CONTENT_HTML, encoding="utf-8", request=Request(url))
+    parser = ParagraphParser(data={"main_content": True})
+
+    paragraphs = list(parser.extract_paragraphs(response.selector.root))
+
+    assert paragraphs == [("The main content of this page is a paragraph with enough words to count as real running "
+                           "text.", "//p")]
@@ -0,0 +1,197 @@
+import os
+import time
+from types import SimpleNamespace
+
+from scrapy.http import Request, Response
+from twisted.internet import defer, error, task
+from twisted.python.failure import Failure
+
+import parsers
+import pdf_extraction
+import textract_pdf
+from parsers import ParagraphParser
+from pdf_extraction import AsyncPdfExtractor, PdfTextCache
+from textract_pdf import pdf_parser
+from textract_pdf.exceptions import ShellError, ShellTimeoutError
+
+
+def fake_ocr(monkeypatch, durations):
+    """Rasterize len(durations) pages, recognizing page n takes durations[n - 1] seconds. Returns the pdftoppm calls."""
+    calls = []
+
+    def run(self, args, timeout=None):
+        calls.append(args)
+        for page in range(1, len(durations) + 1):
+            open("{0}-{1}.ppm".format(args[-1], page), "w").close()
+        return b"", b""
+
+    def extract(self, filename, timeout=None, **kwargs):
+        page = int(os.path.basename(filename)[len("conv-"):-len(".ppm")])
+        if timeout is not None and durations[page - 1] > timeout:
+            time.sleep(timeout)
+            raise ShellTimeoutError("tesseract " + filename, timeout, b"", b"")
+        time.sleep(durations[page - 1])
+        return "page {0}\n".format(page).encode("utf-8")
+
+    monkeypatch.setattr(pdf_parser.Parser, "run", run)
+    monkeypatch.setattr(pdf_parser.TesseractParser, "extract", extract)
+    return calls
+
+
+def test_tesseract_page_order(monkeypatch):
+    """Pages are recognized in parallel, the text keeps the page order."""
+    calls = fake_ocr(monkeypatch, [0.3, 0.2, 0.1, 0.0])
+    start = time.monotonic()
+    text = pdf_parser.Parser().extract_tesseract("doc.pdf", ocr_workers=4, first_page=2, last_page=5)
+    assert time.monotonic() - start < 0.5
+    assert text == b"page 1\npage 2\npage 3\npage 4\n"
+    assert calls[0][:5] == ["pdftoppm", "-f", "2", "-l", "5"]
+
+
+def test_tesseract_time_budget(monkeypatch):
+    """Pages that are not recognized within the time budget are left out."""
+    fake_ocr(monkeypatch, [0.0, 5.0, 0.0])
+    start = time.monotonic()
+    text = pdf_parser.Parser().extract_tesseract("doc.pdf", ocr_workers=1, time_budget=0.3)
+    assert time.monotonic() - start < 1.0
+    assert text == b"page 1\n"
+
+
+def test_pdf_ocr_parser_data(monkeypatch):
+    """The OCR and page range keys of parser_data are handed to textract_pdf."""
+    calls = []
+    monkeypatch.setattr(textract_pdf, "process", lambda filename, **kwargs: calls.append(kwargs) or b"")
+    parser = ParagraphParser(data={"parse_pdf": True, "pdf_ocr": True, "pdf_first_page": 2, "pdf_last_page": 3,
+                                   "pdf_ocr_workers": 2, "pdf_ocr_time_budget": 60})
+    parser.extract_pdf_text(b"%PDF")
+    assert calls == [{"method": "tesseract", "first_page": 2, "last_page": 3, "ocr_workers": 2, "time_budget": 60}]
+    ParagraphParser(data={"parse_pdf": True}).extract_pdf_text(b"%PDF")
+    assert calls[1] == {"first_page": None, "last_page": None}
+
+
+def cached_size(path):
+    return sum(os.path.getsize(os.path.join(root, filename)) for root, _, files in os.walk(path) for filename in files)
+
+
+def test_pdf_text_cache_accounting(tmp_path):
+    """Entries shared by several processes are counted once, evictions keep the size in line with the directory."""
+    cache = PdfTextCache(str(tmp_path), max_size=25)
+    other = PdfTextCache(str(tmp_path), max_size=25)  # another process using the same directory
+
+    other.put("k1", b"0123456789")
+    assert cache.get("k1") == b"0123456789" and cache.size == 10
+    assert cache.get("k1") == b"0123456789" and cache.size == 10
+    cache.put("k2", b"0123456789")
+    cache.put("k2", b"01234")
+    assert cache.size == 15 == cached_size(str(tmp_path))
+
+    cache.put("k3", b"0123456789")
+    cache.put("k4", b"0123456789")
+    assert cache.size <= 22 and cache.size == cached_size(str(tmp_path))
+    assert cache.hits == 2 and cache.misses == 0
+
+    # entries evicted by another process are no longer counted
+    PdfTextCache(str(tmp_path), max_size=25).evict(0)
+    assert cache.get("k3") is None and cache.get("k4") is None
+    assert cache.size == 0 and cache.misses == 2
+
+
+class FakeTransport:
+    def __init__(self):
+        self.written = []
+        self.stdin_closed = False
+        self.signals = []
+
+    def write(self, data):
+        self.written.append(data)
+
+    def closeStdin(self):
+        self.stdin_closed = True
+
+    def signalProcess(self, signal):
+        self.signals.append(signal)
+
+
+class FakeReactor(task.Clock):
+    """Clock that connects spawned extractors to fake transports instead of starting processes."""
+
+    def __init__(self):
+        super().__init__()
+        self.processes = []
+
+    def spawnProcess(self, process_protocol, executable, args, env=None):
+        transport = FakeTransport()
+        self.processes.append((process_protocol, args, transport))
+        process_protocol.makeConnection(transport)
+
+
+def results(deferred):
+    outcome = []
+    deferred.addBoth(outcome.append)
+    return outcome
+
+
+def test_async_pdf_extractor(monkeypatch):
+    """Extractors get the body over stdin, at most max_processes run at a time, slow ones are killed."""
+    fake_reactor = FakeReactor()
+    monkeypatch.setattr(pdf_extraction, "reactor", fake_reactor)
+    monkeypatch.setattr(pdf_extraction, "_EXECUTABLES", dict())
+    monkeypatch.setattr(pdf_extraction.shutil, "which", lambda executable: "/usr/bin/" + executable)
+    extractor = AsyncPdfExtractor(max_processes=2, timeout=10)
+
+    done, failed, killed = [results(extractor.extract(b"%PDF-" + str(i).encode(), first_page=2)) for i in range(3)]
+    assert len(fake_reactor.processes) == 2
+    process_protocol, args, transport = fake_reactor.processes[0]
+    assert args == ["pdftotext", "-enc", "UTF-8", "-f", "2", "-", "-"]
+    assert transport.written == [b"%PDF-0"] and transport.stdin_closed
+
+    process_protocol.outReceived(b"text ")
+    process_protocol.outReceived(b"of the pdf")
+    process_protocol.processEnded(Failure(error.ProcessDone(0)))
+    assert done == [b"text of the pdf"]
+    assert len(fake_reactor.processes) == 3  # the third extraction starts once the first ended
+    assert len(fake_reactor.getDelayedCalls()) == 2  # the timeout of the first one is cancelled
+
+    process_protocol = fake_reactor.processes[1][0]
+    process_protocol.errReceived(b"Syntax Error")
+    process_protocol.processEnded(Failure(error.ProcessTerminated(exitCode=1)))
+    assert isinstance(failed[0].value, ShellError) and failed[0].value.exit_code == 1
+    assert failed[0].value.stderr == b"Syntax Error"
+
+    process_protocol, _, transport = fake_reactor.processes[2]
+    fake_reactor.advance(10)
+    assert transport.signals == ["KILL"] and killed == []
+    process_protocol.processEnded(Failure(error.ProcessTerminated(signal=9)))
+    assert isinstance(killed[0].value, ShellTimeoutError)
+    assert not fake_reactor.getDelayedCalls()
+
+
+def pdf_response():
+    url = "http://www.example.com/doc.pdf"
+    return Response(url, body=b"%PDF", headers={"Content-Type": "application/pdf"}, request=Request(url))
+
+
+def test_pdf_extraction_fallback(monkeypatch):
+    """Without pdftotext, textract_pdf extracts the text in threads within the process limit, and pdftotext is looked
+    up only once. Other extraction errors yield no items."""
+    lookups, started = [], []
+    monkeypatch.setattr(pdf_extraction, "_EXECUTABLES", dict())
+    monkeypatch.setattr(pdf_extraction, "_EXTRACTORS", dict())
+    monkeypatch.setattr(pdf_extraction.shutil, "which", lambda executable: lookups.append(executable))
+    monkeypatch.setattr(pdf_extraction, "threads", SimpleNamespace(
+        deferToThread=lambda func, *args: started.append((defer.Deferred(), func, args)) or started[-1][0]))
+    monkeypatch.setattr(parsers, "reactor", SimpleNamespace(running=True))
+    monkeypatch.setattr(textract_pdf, "process", lambda filename, **kwargs: b"Ein Absatz aus dem Dokument.\n")
+    parser = ParagraphParser(data={"parse_pdf": True, "allowed_languages": ["de"], "pdf_max_processes": 1})
+
+    first, second = results(parser.parse_pdf(pdf_response())), results(parser.parse_pdf(pdf_response()))
+    assert len(started) == 1 and lookups == ["pdftotext"]
+    deferred, func, args = started[0]
+    deferred.callback(func(*args))
+    assert [(item["content"], item["origin"]) for item in first[0]] == [("Ein Absatz aus dem Dokument.", "pdf")]
+    assert len(started) == 2 and not second  # the second extraction only started once the first one finished
+    deferred, func, args = started[1]
+    deferred.callback(func(*args))
+    assert len(second[0]) == 1 and lookups == ["pdftotext"]
+
+    assert parser.pdf_extraction_failed(Failure(ShellError("pdftotext", 1, b"", b"")), pdf_response()) == []
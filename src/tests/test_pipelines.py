@@ -0,0 +1,395 @@
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from scrapy.exceptions import DropItem
+
+from parsers import ParagraphItem, RawContentItem
+import pipelines
+from pipelines import BackgroundWriter, ContentAddressedStore, DomainPipelineManager, Item2SegmentPipeline, \
+    Paragraph2CsvPipeline, Paragraph2SqlitePipeline, ParagraphDeduplicationPipeline, Raw2FilePipeline, Raw2WarcPipeline
+from record_store import RecordStore
+from shared import simple_logger
+
+
+@pytest.fixture
+def spider(tmp_path):
+    return SimpleNamespace(name="www.example.com",
+                           allowed_domains=["www.example.com"],
+                           crawl_specification=SimpleNamespace(output=str(tmp_path)),
+                           s_log=simple_logger("test_pipelines"))
+
+
+def paragraph(url, content, par_lang="de"):
+    return ParagraphItem(url=url, content=content, par_lang=par_lang, page_lang="de", origin="//p", depth=1)
+
+
+class FakeReactor:
+    """Running reactor whose calls from the writer threads are executed by the test."""
+
+    running = True
+
+    def __init__(self):
+        self.calls = queue.Queue()
+
+    def callFromThread(self, func, *args):
+        self.calls.put((func, args))
+
+    def run_calls(self, writer):
+        while writer.pending > 0:
+            func, args = self.calls.get(timeout=5)
+            func(*args)
+
+
+def test_background_writer_backpressure(monkeypatch, spider):
+    """Jobs that do not fit into the queue get a Deferred, which fires once they are queued, drain waits for all."""
+    fake_reactor = FakeReactor()
+    monkeypatch.setattr(pipelines, "reactor", fake_reactor)
+    writer = BackgroundWriter("test", max_queue_size=1, log=spider.s_log)
+    started, release, written = threading.Event(), threading.Event(), []
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    assert writer.submit(block) is None
+    started.wait(5)
+    assert writer.submit(written.append, "a") is None
+    queued_b = writer.submit(written.append, "b")
+    queued_c = writer.submit(written.append, "c")
+    failing = writer.submit(os.unlink, "/nonexistent/file")
+    assert not any(deferred.called for deferred in [queued_b, queued_c, failing])
+    drained = writer.drain()
+    assert not drained.called
+
+    release.set()
+    fake_reactor.run_calls(writer)
+    assert queued_b.called and queued_c.called and failing.called and drained.called
+    assert written == ["a", "b", "c"] and writer.failed == 1
+    closed = writer.close()
+    assert closed.called and not any(thread.is_alive() for thread in writer.threads)
+
+
+def test_background_writer_keys():
+    """Jobs with the same key run on the same thread in submission order."""
+    writer = BackgroundWriter("test", max_queue_size=8, threads=4)
+    executed = []
+
+    def write(key, number):
+        time.sleep(0.001 * (number % 3))
+        executed.append((key, number, threading.current_thread().name))
+
+    for number in range(20):
+        for key in ["a", "b", "c"]:
+            writer.submit(write, key, number, key=key)
+    writer.close()
+
+    for key in ["a", "b", "c"]:
+        jobs = [(number, thread) for job_key, number, thread in executed if job_key == key]
+        assert [number for number, _ in jobs] == list(range(20)) and len(set(thread for _, thread in jobs)) == 1
+
+
+def test_paragraph_csv(spider, tmp_path):
+    """Rows are buffered until close_spider, only paragraphs of allowed domains are written."""
+    pipeline = Paragraph2CsvPipeline()
+    pipeline.open_spider(spider)
+    pipeline.process_item(paragraph("http://www.example.com/a", "Erster; \"Absatz\""), spider)
+    pipeline.process_item(paragraph("http://www.example.com/a", "Zweiter\nAbsatz", par_lang=None), spider)
+    pipeline.process_item(paragraph("http://other.example.com/", "Fremder Absatz"), spider)
+
+    assert len(pipeline.buffers[spider.name]) == 2
+    pipeline.close_spider(spider)
+
+    with open(os.path.join(str(tmp_path), "www.example.com.csv"), encoding="utf-8", newline="") as csv_file:
+        content = csv_file.read()
+    assert content == os.linesep.join(["url;content;par_language;page_language;origin;depth",
+                                       'http://www.example.com/a;"Erster; ""Absatz""";de;de;//p;1',
+                                       'http://www.example.com/a;"Zweiter\nAbsatz";;de;//p;1',
+                                       ""])
+
+
+def test_paragraph_csv_parts(spider, tmp_path, monkeypatch):
+    """Batches are split into parts of csv_max_rows rows, which are listed in the manifest once completed."""
+    monkeypatch.setattr(Paragraph2CsvPipeline, "FLUSH_ROWS", 3)
+    spider.crawl_specification.pipeline_data = {"csv_max_rows": 2}
+    pipeline = Paragraph2CsvPipeline()
+    pipeline.open_spider(spider)
+    for i in range(5):
+        pipeline.process_item(paragraph("http://www.example.com/a", "Absatz {0}".format(i)), spider)
+    pipeline.close_spider(spider)
+
+    parts = list(Paragraph2CsvPipeline.read_manifest(os.path.join(str(tmp_path), "www.example.com.manifest.tsv")))
+    assert [(filename, rows) for filename, rows, _, _ in parts] == [("www.example.com.00000.csv", 2),
+                                                                   ("www.example.com.00001.csv", 2),
+                                                                   ("www.example.com.00002.csv", 1)]
+    assert sorted(os.listdir(str(tmp_path))) == [filename for filename, _, _, _ in parts] + \
+        ["www.example.com.manifest.tsv"]
+    for filename, rows, size, digest in parts:
+        with open(os.path.join(str(tmp_path), filename), "rb") as part:
+            content = part.read()
+        assert content.startswith(b"url;content;") and len(content) == size
+        assert hashlib.sha256(content).hexdigest() == digest
+
+
+@pytest.mark.parametrize("limits", [{"csv_max_rows": 0}, {"csv_max_rows": -1}, {"csv_max_size": 1.5},
+                                    {"csv_max_size": "1000"}])
+def test_paragraph_csv_invalid_limits(spider, limits):
+    """Limits of the parts have to be positive integers."""
+    spider.crawl_specification.pipeline_data = limits
+    with pytest.raises(ValueError):
+        Paragraph2CsvPipeline().open_spider(spider)
+
+
+def test_paragraph_csv_parts_repeated(spider, tmp_path):
+    """A crawl that is not resumed replaces the parts and the manifest of the previous crawl."""
+    spider.crawl_specification.pipeline_data = {"csv_max_rows": 2}
+    for count in [5, 1]:
+        pipeline = Paragraph2CsvPipeline()
+        pipeline.open_spider(spider)
+        for i in range(count):
+            pipeline.process_item(paragraph("http://www.example.com/a", "Absatz {0}".format(i)), spider)
+        pipeline.close_spider(spider)
+
+    parts = list(Paragraph2CsvPipeline.read_manifest(os.path.join(str(tmp_path), "www.example.com.manifest.tsv")))
+    assert [(filename, rows) for filename, rows, _, _ in parts] == [("www.example.com.00000.csv", 1)]
+    assert sorted(os.listdir(str(tmp_path))) == ["www.example.com.00000.csv", "www.example.com.manifest.tsv"]
+    with open(os.path.join(str(tmp_path), "www.example.com.00000.csv"), "rb") as part:
+        assert hashlib.sha256(part.read()).hexdigest() == parts[0][3]
+
+
+def test_paragraph_csv_resume(spider, tmp_path):
+    """Spiders of resumed crawls append to the csv file of the interrupted crawl."""
+    for i, resumed in enumerate([False, True]):
+        spider.resumed = resumed
+        pipeline = Paragraph2CsvPipeline()
+        pipeline.open_spider(spider)
+        pipeline.process_item(paragraph("http://www.example.com/{0}".format(i), "Absatz {0}".format(i)), spider)
+        pipeline.close_spider(spider)
+
+    assert os.listdir(str(tmp_path)) == ["www.example.com.csv"]
+    with open(os.path.join(str(tmp_path), "www.example.com.csv"), encoding="utf-8") as csv_file:
+        assert csv_file.read().splitlines() == ["url;content;par_language;page_language;origin;depth",
+                                                "http://www.example.com/0;Absatz 0;de;de;//p;1",
+                                                "http://www.example.com/1;Absatz 1;de;de;//p;1"]
+
+
+def test_paragraph_csv_unchanged(spider, tmp_path):
+    """Incremental crawls carry the rows of unchanged pages over from the output of the previous crawl."""
+    spider.change_index = object()
+    pipeline = Paragraph2CsvPipeline()
+    pipeline.open_spider(spider)
+    for page in ["a", "b"]:
+        pipeline.process_item(paragraph("http://www.example.com/" + page, "Absatz " + page), spider)
+        pipeline.process_item(paragraph("http://www.example.com/" + page, "Zweiter\nAbsatz " + page), spider)
+    pipeline.close_spider(spider)
+
+    pipeline = Paragraph2CsvPipeline()
+    pipeline.open_spider(spider)
+    pipeline.process_item(paragraph("http://www.example.com/b", "Absatz b2"), spider)
+    pipeline.page_unchanged(SimpleNamespace(url="http://www.example.com/a"), spider)
+    pipeline.close_spider(spider)
+
+    assert os.listdir(str(tmp_path)) == ["www.example.com.csv"]
+    with open(os.path.join(str(tmp_path), "www.example.com.csv"), encoding="utf-8", newline="") as csv_file:
+        assert csv_file.read() == os.linesep.join(["url;content;par_language;page_language;origin;depth",
+                                                   "http://www.example.com/b;Absatz b2;de;de;//p;1",
+                                                   "http://www.example.com/a;Absatz a;de;de;//p;1",
+                                                   'http://www.example.com/a;"Zweiter\nAbsatz a";de;de;//p;1',
+                                                   ""])
+
+
+def test_domain_pipeline_manager(spider, tmp_path):
+    """Items of a multi-domain spider are written per domain, a domain's output is completed once it finished."""
+    contexts = {domain: SimpleNamespace(name=domain.replace(".", "_"), allowed_domains=[domain],
+                                        crawl_specification=spider.crawl_specification, s_log=spider.s_log)
+                for domain in ["www.example.com", "www.example.org"]}
+    multi_domain_spider = SimpleNamespace(multi_domain=True, s_log=spider.s_log,
+                                          domain_context=lambda url: contexts.get(url.split("/")[2]))
+    manager = DomainPipelineManager(Paragraph2CsvPipeline())
+    manager.open_spider(multi_domain_spider)
+    manager.process_item(paragraph("http://www.example.com/a", "Erster Absatz"), multi_domain_spider)
+    manager.process_item(paragraph("http://www.example.org/a", "Zweiter Absatz"), multi_domain_spider)
+    manager.process_item(paragraph("http://www.example.net/", "Fremder Absatz"), multi_domain_spider)
+
+    manager.domain_finished(contexts["www.example.com"])
+    assert sorted(os.listdir(str(tmp_path))) == ["www_example_com.csv", "www_example_org-INCOMPLETE.csv"]
+    manager.close_spider(multi_domain_spider)
+    assert sorted(os.listdir(str(tmp_path))) == ["www_example_com.csv", "www_example_org.csv"]
+
+    with open(os.path.join(str(tmp_path), "www_example_org.csv"), encoding="utf-8") as csv_file:
+        assert csv_file.read().splitlines()[1:] == ["http://www.example.org/a;Zweiter Absatz;de;de;//p;1"]
+
+
+def test_domain_pipeline_manager_subdomains(tmp_path):
+    """Items of redirected and subdomain pages are written to the output of their crawled domain."""
+    import scrapy_wrapper
+    from shared import CrawlSpecification
+
+    spec = CrawlSpecification(name="crawl", output=str(tmp_path), parser="parsers.ParagraphParser",
+                              parser_data={"allowed_languages": ["de"], "xpaths": ["//p"]})
+    spider = scrapy_wrapper.create_multi_domain_spider(spec, ["http://example.com/", "http://www.example.org/"],
+                                                       "crawl")()
+    spider.activate_domains()
+    assert spider.domain_context("https://www.example.com/").name == "example.com_"
+    assert spider.domain_context("http://blog.example.com/a").name == "example.com_"
+    assert spider.domain_context("http://example.org/") is None
+
+    manager = DomainPipelineManager(Paragraph2CsvPipeline())
+    manager.open_spider(spider)
+    manager.process_item(paragraph("https://www.example.com/", "Weitergeleiteter Absatz"), spider)
+    manager.process_item(paragraph("http://blog.example.com/a", "Absatz einer Subdomain"), spider)
+    manager.process_item(paragraph("http://example.org/", "Fremder Absatz"), spider)
+    manager.close_spider(spider)
+
+    assert sorted(os.listdir(str(tmp_path))) == ["example.com_.csv"]
+    with open(os.path.join(str(tmp_path), "example.com_.csv"), encoding="utf-8") as csv_file:
+        assert [row.split(";")[0] for row in csv_file.read().splitlines()[1:]] == ["https://www.example.com/",
+                                                                                  "http://blog.example.com/a"]
+
+
+def test_paragraph_sqlite(spider, tmp_path):
+    """Paragraphs are stored once per url and content."""
+    spider.crawl_specification.name = "crawl"
+    pipeline = Paragraph2SqlitePipeline()
+    pipeline.open_spider(spider)
+    pipeline.process_item(paragraph("http://www.example.com/a", "Erster Absatz"), spider)
+    pipeline.process_item(paragraph("http://www.example.com/a", "Erster Absatz"), spider)
+    pipeline.process_item(paragraph("http://www.example.com/b", "Erster Absatz", par_lang=None), spider)
+    pipeline.process_item(paragraph("http://other.example.com/", "Fremder Absatz"), spider)
+    pipeline.close_spider(spider)
+
+    with sqlite3.connect(os.path.join(str(tmp_path), "crawl.sqlite")) as connection:
+        rows = connection.execute("SELECT url, content, par_language, depth FROM paragraphs ORDER BY id").fetchall()
+    assert rows == [("http://www.example.com/a", "Erster Absatz", "de", 1),
+                    ("http://www.example.com/b", "Erster Absatz", None, 1)]
+
+
+@pytest.mark.parametrize("action", ["drop", "flag"])
+def test_paragraph_deduplication(spider, action):
+    """Paragraphs that differ from an earlier paragraph only in a few tokens are dropped or flagged."""
+    spider.crawl_specification.name = "crawl"
+    spider.crawl_specification.pipeline_data = {"simhash_distance": 6, "simhash_action": action}
+    announcement = "Die Veranstaltung findet am Montag im großen Saal des Rathauses statt. Der Eintritt ist frei, " \
+                   "alle Bürgerinnen und Bürger sind herzlich eingeladen. Für Getränke und einen kleinen Imbiss ist " \
+                   "gesorgt. Aktualisiert am {0}"
+    pipeline = ParagraphDeduplicationPipeline()
+    pipeline.open_spider(spider)
+
+    passed = []
+    for url, content in [("http://www.example.com/a", announcement.format("12.03.2019")),
+                         ("http://www.example.com/a", "Die Stadtverwaltung informiert über neue Öffnungszeiten."),
+                         ("http://www.example.com/b", announcement.format("19.03.2019")),
+                         ("http://www.example.com/c", "")]:
+        try:
+            passed.append(pipeline.process_item(paragraph(url, content), spider))
+        except DropItem:
+            pass
+    pipeline.close_spider(spider)
+
+    if action == "drop":
+        assert [item["url"] for item in passed] == ["http://www.example.com/a", "http://www.example.com/a",
+                                                    "http://www.example.com/c"]
+    else:
+        assert [item.get("near_duplicate", False) for item in passed] == [False, False, True, False]
+
+
+def test_item_segments(spider, tmp_path):
+    """Raw bodies are stored as record data, spooled bodies are moved into the record store."""
+    spool_file = tmp_path / "body_spooled"
+    spool_file.write_bytes(b"<html>spooled</html>")
+    pipeline = Item2SegmentPipeline()
+    pipeline.open_spider(spider)
+    pipeline.process_item(RawContentItem(url="http://www.example.com/a", content=b"<html>a</html>", depth=0), spider)
+    pipeline.process_item(RawContentItem(url="http://www.example.com/b", content=None, content_file=str(spool_file),
+                                         depth=1), spider)
+    pipeline.close_spider(spider)
+
+    assert not spool_file.exists()
+    assert list(RecordStore(str(tmp_path), spider.name)) == [({"url": "http://www.example.com/a", "depth": 0},
+                                                              b"<html>a</html>"),
+                                                             ({"url": "http://www.example.com/b", "depth": 1},
+                                                              b"<html>spooled</html>")]
+
+
+def test_raw_abbreviated_names(spider, tmp_path):
+    """Long file names are abbreviated and made unique, names are only tracked until their file is written."""
+    pipeline = Raw2FilePipeline()
+    pipeline.open_spider(spider)
+    pending = pipeline.abbreviated[spider.name]
+    for i in range(3):
+        url = "http://www.example.com/" + "a" * 100 + str(i) + "a" * 100 + ".html"  # same abbreviation
+        pipeline.process_item(RawContentItem(url=url, content=str(i).encode()), spider)
+    pipeline.close_spider(spider)
+
+    files = sorted(os.listdir(str(tmp_path / spider.name)))
+    assert len(files) == 3 and all("(...)" in filename for filename in files)
+    assert [filename[-9:] for filename in files] == [" (1).html", " (2).html", "aaaa.html"]
+    assert sorted((tmp_path / spider.name / filename).read_bytes() for filename in files) == [b"0", b"1", b"2"]
+    assert not pending
+
+
+def test_raw_content_addressed(spider, tmp_path):
+    """Identical bodies are stored once, the manifest lists every url."""
+    spider.crawl_specification.pipeline_data = {"content_addressed": True, "content_compression": True}
+    pipeline = Raw2FilePipeline()
+    pipeline.open_spider(spider)
+    for path in ("a", "b", "c"):
+        body = b"<html>c</html>" if path == "c" else b"<html>ab</html>"
+        pipeline.process_item(RawContentItem(url="http://www.example.com/" + path, content=body, depth=1), spider)
+    pipeline.close_spider(spider)
+
+    # written by several writer threads, in no particular order
+    manifest = sorted(Raw2FilePipeline.read_manifest(str(tmp_path / spider.name / "manifest.tsv")))
+    assert [(url, size) for url, _, size, _ in manifest] == [("http://www.example.com/a", 15),
+                                                             ("http://www.example.com/b", 15),
+                                                             ("http://www.example.com/c", 14)]
+    assert manifest[0][1] == manifest[1][1] != manifest[2][1]
+    assert ContentAddressedStore.read(str(tmp_path / "objects"), manifest[2][1]) == b"<html>c</html>"
+    assert len(list((tmp_path / "objects").rglob("*.gz"))) == 2
+
+
+def test_raw_content_addressed_repeated(spider, tmp_path):
+    """A repeated crawl replaces the manifest, a resumed crawl continues it."""
+    spider.crawl_specification.pipeline_data = {"content_addressed": True}
+    for path, resumed in [("a", False), ("a", False), ("b", True)]:
+        spider.resumed = resumed
+        pipeline = Raw2FilePipeline()
+        pipeline.open_spider(spider)
+        pipeline.process_item(RawContentItem(url="http://www.example.com/" + path, content=b"<html></html>"), spider)
+        pipeline.close_spider(spider)
+
+    manifest = list(Raw2FilePipeline.read_manifest(str(tmp_path / spider.name / "manifest.tsv")))
+    assert [url for url, _, _, _ in manifest] == ["http://www.example.com/a", "http://www.example.com/b"]
+
+
+def test_raw_warc(spider, tmp_path):
+    """Response records can be read back at the offsets of the sorted cdx index."""
+    pipeline = Raw2WarcPipeline()
+    pipeline.open_spider(spider)
+    for path in ("b", "a"):
+        pipeline.process_item(RawContentItem(url="http://www.example.com/" + path,
+                                             content="<html>{0}</html>".format(path).encode("utf-8"),
+                                             depth=1,
+                                             status=200,
+                                             headers={"Content-Type": ["text/html; charset=utf-8"],
+                                                      "Content-Encoding": ["gzip"]},
+                                             request_headers={"Accept": ["text/html"]}), spider)
+    pipeline.close_spider(spider)
+
+    with open(str(tmp_path / "www.example.com.cdx"), encoding="utf-8") as cdx_file:
+        lines = cdx_file.read().splitlines()
+    assert lines[0] == Raw2WarcPipeline.CDX_HEADER.rstrip("\n")
+    entries = [line.split(" ") for line in lines[1:]]
+    assert [entry[0] for entry in entries] == ["com,example)/a", "com,example)/b"]
+    assert all(entry[3] == "text/html" and entry[4] == "200" for entry in entries)
+
+    record = Raw2WarcPipeline.read_record(str(tmp_path / entries[0][10]), int(entries[0][9]), int(entries[0][8]))
+    head, http_head, body = record.split(b"\r\n\r\n", 2)
+    assert b"WARC-Type: response" in head and b"WARC-Target-URI: http://www.example.com/a" in head
+    assert http_head.startswith(b"HTTP/1.1 200 OK") and b"Content-Encoding" not in http_head
+    assert body == b"<html>a</html>\r\n\r\n"
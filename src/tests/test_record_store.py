@@ -0,0 +1,28 @@
+import pytest
+
+import record_store
+
+
+@pytest.mark.parametrize("compression", [None, 6])
+def test_segments(tmp_path, compression):
+    """Records are read back from rotated segments, chunks are bounded by the encoded record size."""
+    writer = record_store.SegmentWriter(str(tmp_path), "www.example.com", segment_size=4096, block_size=512,
+                                        compression=compression)
+    records = [({"url": "http://www.example.com/{0}".format(i), "content": "Absatz " * (i % 10)}, bytes(i % 3))
+               for i in range(200)]
+    for meta, data in records:
+        writer.append(meta, data)
+    writer.close()
+
+    store = record_store.RecordStore(str(tmp_path), "www.example.com")
+    assert len(store.segment_paths()) > 1
+    assert list(store) == records
+
+    max_bytes = 3 * max(len(record_store.encode_record(meta, data)) for meta, data in records)
+    chunks = list(store.chunks(max_bytes))
+    assert [record for chunk in chunks for record in chunk] == records
+    assert all(sum(len(record_store.encode_record(meta, data)) for meta, data in chunk) <= max_bytes
+               for chunk in chunks)
+
+    with record_store.SegmentReader(store.segment_paths()[-1]) as reader:
+        assert reader.record(len(reader) - 1) == records[-1]
@@ -0,0 +1,47 @@
+from scrapy.settings import Settings
+
+from scoring import YieldScorer
+
+
+def test_yield_scorer():
+    """Links are ranked by the yield of their url prefix, anchor text and linking page."""
+    assert YieldScorer.from_settings(Settings()) is None
+    scorer = YieldScorer.from_settings(Settings({"YIELD_PRIORITY_ENABLED": True, "YIELD_PRIORITY_WEIGHT": 6}))
+    assert scorer.weight == 6
+    assert scorer.url_prefixes("http://example.de/a/b/c/page.html") == ["example.de", "example.de/a", "example.de/a/b"]
+
+    # without any pages every link gets the middle priority
+    assert scorer.priority("http://example.de/artikel/1.html", "Neue Öffnungszeiten", None) == 3
+
+    for i in range(20):
+        scorer.record("http://example.de/artikel/{0}.html".format(i), "Bericht aus dem Rathaus", True, 4)
+        scorer.record("http://example.de/kalender/{0}.html".format(i), str(2000 + i), True, 0)
+        scorer.record("http://example.de/archiv/{0}.html".format(i), "Archive", False, 0)
+    assert scorer.mean() == 4 / 3
+
+    artikel = scorer.priority("http://example.de/artikel/new.html", "Bericht", True)
+    kalender = scorer.priority("http://example.de/kalender/new.html", "2005", True)
+    assert artikel == 6
+    assert kalender < 3
+
+    # unseen prefixes fall back to their host, the anchor text and the linking page still count
+    assert scorer.priority("http://example.de/neu/1.html", "Bericht aus dem Rathaus", True) > \
+        scorer.priority("http://example.de/neu/1.html", "Archive", False)
+    assert scorer.priority("http://other.de/1.html", None, None) == 3
+
+
+def test_frontier_requests_unscored_text():
+    """Requests rebuilt from frontier entries are learned by their url prefix only, not as links without text."""
+    import scrapy_wrapper
+    from shared import CrawlSpecification
+
+    spec = CrawlSpecification(name="crawl", parser="parsers.ParagraphParser",
+                              parser_data={"allowed_languages": ["de"], "xpaths": ["//p"]})
+    spider = scrapy_wrapper.create_spider(spec, "http://example.de/", "crawl")()
+    request = spider.frontier_request("http://example.de/artikel/1.html", 2, -2)
+    assert request.meta["link_text"] is None and request.meta["depth"] == 2 and request.priority == -2
+
+    scorer = YieldScorer()
+    scorer.record(request.url, request.meta["link_text"], request.meta.get(spider.LINKED_FROM_ITEMS_META), 3)
+    assert scorer.words.get(YieldScorer.NO_TEXT) is None
+    assert scorer.prefixes.get("example.de/artikel") == [1, 3]
@@ -0,0 +1,36 @@
+import re
+
+import url_filter
+
+
+def test_regex_set():
+    """Combined expressions find the same texts as the single expressions."""
+    patterns = [r".*/login.*", r".*\.pdf\\.*", r".*?x$", r"\?sort=", r"(a)\1", r"(?i)^https://PRIVATE",
+                re.compile("calendar", re.IGNORECASE), r"/(de|en)/archiv/"]
+    regex_set = url_filter.RegexSet(patterns)
+    assert len(regex_set) == len(patterns)
+    assert len(regex_set.separate) == 3
+    assert url_filter.strip_wildcards(r".*/login.*") == "/login"
+    assert url_filter.strip_wildcards(r".*\.pdf\\.*") == r"\.pdf\\"
+    assert url_filter.strip_wildcards(r"calendar\.*") == r"calendar\.*"
+
+    for text in ["http://www.example.com/login", "http://www.example.com/?sort=asc", "http://www.example.com/aa",
+                 "https://private.example.com/", "http://www.example.com/Calendar", "http://www.example.com/en/archiv/",
+                 "http://www.example.com/a", "http://www.example.com/fr/archiv/",
+                 "http://www.example.com/a.pdf\\b", "http://www.example.com/x"]:
+        assert regex_set.search(text) == any(re.search(pattern, text) for pattern in patterns)
+
+
+def test_url_filter():
+    """Links are rejected with the reason of the first failing check, decisions are cached."""
+    url_filter_ = url_filter.UrlFilter(allow=[r"example\.com"], deny=[r"/private/"],
+                                       deny_domains=["ads.example.com"], deny_extensions=[".pdf", ".tar.gz"])
+    assert url_filter_.rejection("mailto:info@example.com") == url_filter.UrlFilter.INVALID_SCHEME
+    assert url_filter_.rejection("http://www.example.org/") == url_filter.UrlFilter.NOT_WHITELISTED
+    assert url_filter_.rejection("http://www.example.com/private/a") == url_filter.UrlFilter.BLACKLISTED
+    assert url_filter_.rejection("http://ads.example.com/") == url_filter.UrlFilter.DOMAIN_DENIED
+    assert url_filter_.rejection("http://www.example.com/Report.PDF") == url_filter.UrlFilter.EXTENSION_DENIED
+    assert url_filter_.rejection("http://www.example.com/dump.tar.gz") == url_filter.UrlFilter.EXTENSION_DENIED
+    assert url_filter_.rejection("http://www.example.com/pdf/") is None
+    assert url_filter_.rejection("http://www.example.com/pdf/") is None
+    assert url_filter_.cache.hits == 1
@@ -106,4 +106,19 @@ class ShellError(CommandLineError):
         if self.is_not_installed():
             return self.not_installed_message()
         else:
-            return self.failed_message()
\ No newline at end of file
+            return self.failed_message()
+
+
+class ShellTimeoutError(ShellError):
+    """This error is raised when a shell.run does not finish within its
+    timeout (the command is killed).
+    """
+    def __init__(self, command, timeout, stdout, stderr):
+        super(ShellTimeoutError, self).__init__(command, -9, stdout, stderr)
+        self.timeout = timeout
+
+    def __str__(self):
+        return self.render((
+            "The command `%(command)s` did not finish within %(timeout)s\n"
+            "seconds and was killed.\n"
+        ))
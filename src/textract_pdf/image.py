@@ -18,6 +18,9 @@ from .utils import ShellParser
 class Parser(ShellParser):
     """Extract text from various image file formats using tesseract-ocr"""
 
+    # tesseract always writes UTF-8 text
+    declared_encoding = 'utf_8'
+
     def extract(self, filename, **kwargs):
 
         # if language given as argument, specify language for tesseract to use
@@ -26,5 +29,5 @@ class Parser(ShellParser):
         else:
             args = ['tesseract', filename, 'stdout']
 
-        stdout, _ = self.run(args)
+        stdout, _ = self.run(args, timeout=kwargs.get('timeout'))
         return stdout
\ No newline at end of file
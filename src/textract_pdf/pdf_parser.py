@@ -10,20 +10,37 @@ Copyright (c) 2014 Dean Malmgren
 
 import os
 import shutil
+import time
 import six
+from concurrent.futures import ThreadPoolExecutor
 from tempfile import mkdtemp
 
-from textract_pdf.exceptions import UnknownMethod, ShellError
+from textract_pdf.exceptions import UnknownMethod, ShellError, ShellTimeoutError
 
 from textract_pdf.utils import ShellParser
 from textract_pdf.image import Parser as TesseractParser
 
 
+def page_range_args(first_page=None, last_page=None):
+    """Return the arguments of the poppler utilities (pdftotext, pdftoppm)
+    that restrict them to the pages ``first_page`` to ``last_page``.
+    """
+    args = []
+    if first_page is not None:
+        args += ['-f', str(first_page)]
+    if last_page is not None:
+        args += ['-l', str(last_page)]
+    return args
+
+
 class Parser(ShellParser):
     """Extract text from pdf files using either the ``pdftotext`` method
     (default) or the ``pdfminer`` method.
     """
 
+    # pdftotext is asked for UTF-8, pdfminer and tesseract always output it
+    declared_encoding = 'utf_8'
+
     def extract(self, filename, method='', **kwargs):
         if method == '' or method == 'pdftotext':
             try:
@@ -44,13 +61,16 @@ class Parser(ShellParser):
         else:
             raise UnknownMethod(method)
 
-    def extract_pdftotext(self, filename, **kwargs):
-        """Extract text from pdfs using the pdftotext command line utility."""
+    def extract_pdftotext(self, filename, first_page=None, last_page=None,
+                          **kwargs):
+        """Extract text from pdfs using the pdftotext command line utility,
+        optionally restricted to the pages ``first_page`` to ``last_page``.
+        """
+        args = ['pdftotext', '-enc', 'UTF-8']
         if 'layout' in kwargs:
-            args = ['pdftotext', '-layout', filename, '-']
-        else:
-            args = ['pdftotext', filename, '-']
-        stdout, _ = self.run(args)
+            args += ['-layout']
+        args += page_range_args(first_page, last_page)
+        stdout, _ = self.run(args + [filename, '-'])
         return stdout
 
     def extract_pdfminer(self, filename, **kwargs):
@@ -58,22 +78,62 @@ class Parser(ShellParser):
         stdout, _ = self.run(['pdf2txt.py', filename])
         return stdout
 
-    def extract_tesseract(self, filename, **kwargs):
-        """Extract text from pdfs using tesseract (per-page OCR)."""
+    def extract_tesseract(self, filename, ocr_workers=None, first_page=None,
+                          last_page=None, time_budget=None, **kwargs):
+        """Extract text from pdfs using tesseract (per-page OCR).
+
+        Pages are rasterized with ``pdftoppm`` (optionally restricted to
+        ``first_page`` to ``last_page``) and recognized by up to
+        ``ocr_workers`` concurrent tesseract processes, the page order of
+        the result is preserved. If ``time_budget`` seconds are exceeded,
+        running tesseract processes are killed and the text of all pages
+        recognized so far is returned.
+        """
+        deadline = None
+        if time_budget is not None:
+            deadline = time.monotonic() + time_budget
+
         temp_dir = mkdtemp()
         base = os.path.join(temp_dir, 'conv')
-        contents = []
+        args = ['pdftoppm'] + page_range_args(first_page, last_page)
         try:
-            stdout, _ = self.run(['pdftoppm', filename, base])
+            try:
+                stdout, _ = self.run(args + [filename, base],
+                                     timeout=self._remaining(deadline))
+            except ShellTimeoutError:
+                return six.b('')
 
-            for page in sorted(os.listdir(temp_dir)):
-                page_path = os.path.join(temp_dir, page)
-                page_content = TesseractParser().extract(page_path, **kwargs)
-                contents.append(page_content)
+            pages = [os.path.join(temp_dir, page)
+                     for page in sorted(os.listdir(temp_dir))]
+            workers = ocr_workers or os.cpu_count() or 1
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(self._extract_page, page_path,
+                                           deadline, **kwargs)
+                           for page_path in pages]
+                contents = [future.result() for future in futures]
             return six.b('').join(contents)
         finally:
             shutil.rmtree(temp_dir)
 
+    def _extract_page(self, page_path, deadline, **kwargs):
+        """OCR a single rasterized page, pages that can not be finished
+        within the time budget are skipped.
+        """
+        remaining = self._remaining(deadline)
+        if remaining is not None and remaining <= 0:
+            return six.b('')
+        try:
+            return TesseractParser().extract(page_path, timeout=remaining,
+                                             **kwargs)
+        except ShellTimeoutError:
+            return six.b('')
+
+    @staticmethod
+    def _remaining(deadline):
+        if deadline is None:
+            return None
+        return max(deadline - time.monotonic(), 0)
+
 if __name__ == "__main__":
     parser = Parser()
     print(parser.__dict__)
\ No newline at end of file
@@ -29,6 +29,13 @@ class BaseParser(object):
     the responsibility of handling all unicode and byte-encoding.
     """
 
+    # encoding of the byte-strings returned by :meth:`.extract`, if the
+    # extractor is known to produce a specific encoding
+    declared_encoding = None
+
+    # number of bytes that chardet inspects when the encoding is unknown
+    detection_sample_size = 64 * 1024
+
     def extract(self, filename, **kwargs):
         """This method must be overwritten by child classes to extract raw
         text from a filename. This method can return either a
@@ -53,12 +60,14 @@ class BaseParser(object):
         # output encoding
         # http://nedbatchelder.com/text/unipain/unipain.html#35
         byte_string = self.extract(filename, **kwargs)
-        unicode_string = self.decode(byte_string)
+        unicode_string = self.decode(byte_string, self.declared_encoding)
         return self.encode(unicode_string, encoding)
 
-    def decode(self, text):
-        """Decode ``text`` using the `chardet
-        <https://github.com/chardet/chardet>`_ package.
+    def decode(self, text, declared_encoding=None):
+        """Decode ``text`` with the ``declared_encoding`` of the extractor,
+        or else as UTF-8. Only if strict decoding fails, the encoding is
+        guessed by the `chardet <https://github.com/chardet/chardet>`_
+        package from a bounded sample of ``text``.
         """
         # only decode byte strings into unicode if it hasn't already
         # been done by a subclass
@@ -69,9 +78,17 @@ class BaseParser(object):
         if not text:
             return u''
 
-        # use chardet to automatically detect the encoding text
-        result = chardet.detect(text)
-        return text.decode(result['encoding'])
+        for encoding in (declared_encoding, 'utf_8'):
+            if encoding:
+                try:
+                    return text.decode(encoding)
+                except UnicodeDecodeError:
+                    pass
+
+        # use chardet to automatically detect the encoding of a sample,
+        # characters beyond the sample may not fit the guessed encoding
+        result = chardet.detect(text[:self.detection_sample_size])
+        return text.decode(result['encoding'] or 'utf_8', 'replace')
 
 
 class ShellParser(BaseParser):
@@ -80,10 +97,12 @@ class ShellParser(BaseParser):
     `Fabric <http://www.fabfile.org/>`_-like behavior.
     """
 
-    def run(self, args):
+    def run(self, args, timeout=None):
         """Run ``command`` and return the subsequent ``stdout`` and ``stderr``
         as a tuple. If the command is not successful, this raises a
-        :exc:`textract.exceptions.ShellError`.
+        :exc:`textract.exceptions.ShellError`. If the command does not
+        finish within ``timeout`` seconds, it is killed and a
+        :exc:`textract.exceptions.ShellTimeoutError` is raised.
         """
 
         # run a subprocess and put the stdout and stderr on the pipe object
@@ -102,7 +121,14 @@ class ShellParser(BaseParser):
 
         # pipe.wait() ends up hanging on large files. using
         # pipe.communicate appears to avoid this issue
-        stdout, stderr = pipe.communicate()
+        try:
+            stdout, stderr = pipe.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            pipe.kill()
+            stdout, stderr = pipe.communicate()
+            raise exceptions.ShellTimeoutError(
+                ' '.join(args), timeout, stdout, stderr,
+            )
 
         # if pipe is busted, raise an error (unlike Fabric)
         if pipe.returncode != 0:
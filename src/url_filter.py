@@ -0,0 +1,161 @@
+"""
+Created on 18.10.2026
+
+@author: Maximilian Pensel
+
+Copyright 2019 Maximilian Pensel <maximilian.pensel@gmx.de>
+
+This file is part of OWS-scrapy-wrapper.
+
+OWS-scrapy-wrapper is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+OWS-scrapy-wrapper is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with OWS-scrapy-wrapper.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import re
+from urllib.parse import urlparse
+
+from scrapy.utils.url import url_is_from_any_domain
+
+from shared import LRUCache
+
+# url filters are shared by all link extractors with the same configuration, see get_url_filter
+_URL_FILTERS = dict()
+
+# expressions that change their meaning or fail to compile as part of a combined expression
+_UNCOMBINABLE = re.compile(r"\\[1-9]|\(\?P=|^\(\?[aiLmsux]+\)")
+_QUANTIFIERS = "*+?{"
+
+
+def strip_wildcards(pattern):
+    """
+    Remove a leading and a trailing '.*' from ``pattern``, which do not change whether a search finds the expression
+    in a text, but make every failed search backtrack over the whole text once per start position
+    """
+    if pattern.startswith(".*") and pattern[2:3] not in _QUANTIFIERS:
+        pattern = pattern[2:]
+    if pattern.endswith(".*"):
+        # the dot must not be escaped, i.e. preceded by an even number of backslashes
+        backslashes = len(pattern[:-2]) - len(pattern[:-2].rstrip("\\"))
+        if backslashes % 2 == 0:
+            pattern = pattern[:-2]
+    return pattern
+
+
+class RegexSet:
+    """
+    Searches a text for any of a list of regular expressions with a single combined expression, from which leading and
+    trailing wildcards are removed. Expressions with back references, global inline flags or compile flags are
+    searched one by one, since they can not be combined.
+    """
+
+    def __init__(self, patterns=()):
+        combinable = []
+        self.separate = []
+        for pattern in patterns:
+            if isinstance(pattern, str):
+                pattern = re.compile(pattern)
+            if (pattern.flags & ~re.UNICODE) or _UNCOMBINABLE.search(pattern.pattern):
+                self.separate.append(pattern)
+            else:
+                combinable.append(pattern)
+
+        self.combined = None
+        if combinable:
+            try:
+                self.combined = re.compile("|".join("(?:{0})".format(strip_wildcards(pattern.pattern))
+                                                    for pattern in combinable))
+            except re.error:
+                self.separate.extend(combinable)
+        self.count = len(combinable) + len(self.separate)
+
+    def __len__(self):
+        return self.count
+
+    def search(self, text):
+        """ Return True if any of the expressions is found in ``text`` """
+        if self.combined is not None and self.combined.search(text):
+            return True
+        return any(pattern.search(text) for pattern in self.separate)
+
+
+class UrlFilter:
+    """
+    Decides whether links are followed, based on the whitelist and blacklist expressions, allowed and denied domains
+    and denied file extensions of a link extractor. Decisions are cached by url, since navigation links appear on
+    every page of a site.
+    """
+
+    INVALID_SCHEME = "invalid_scheme"
+    NOT_WHITELISTED = "not_whitelisted"
+    BLACKLISTED = "blacklisted"
+    DOMAIN_NOT_ALLOWED = "domain_not_allowed"
+    DOMAIN_DENIED = "domain_denied"
+    EXTENSION_DENIED = "extension_denied"
+
+    VALID_SCHEMES = {"http", "https", "file", "ftp"}
+
+    DEFAULT_CACHE_SIZE = 10000
+
+    def __init__(self, allow=(), deny=(), allow_domains=(), deny_domains=(), deny_extensions=(),
+                 cache_size=DEFAULT_CACHE_SIZE):
+        self.allow = RegexSet(allow)
+        self.deny = RegexSet(deny)
+        self.allow_domains = list(allow_domains)
+        self.deny_domains = list(deny_domains)
+        self.deny_extensions = {extension.lower() for extension in deny_extensions}
+        # extensions like ".tar.gz" are not found by a lookup of the last extension
+        self.compound_extensions = [extension for extension in self.deny_extensions if extension.count(".") > 1]
+        self.cache = LRUCache(maxsize=cache_size)
+
+    def rejection(self, url):
+        """ Return the reason to reject ``url``, None if it is allowed """
+        reason = self.cache.get(url, False)
+        if reason is False:
+            reason = self.decide(url)
+            self.cache.put(url, reason)
+        return reason
+
+    def decide(self, url):
+        if url.split("://", 1)[0] not in UrlFilter.VALID_SCHEMES:
+            return UrlFilter.INVALID_SCHEME
+        if self.allow and not self.allow.search(url):
+            return UrlFilter.NOT_WHITELISTED
+        if self.deny and self.deny.search(url):
+            return UrlFilter.BLACKLISTED
+
+        if self.allow_domains or self.deny_domains or self.deny_extensions:
+            parsed_url = urlparse(url)
+            if self.allow_domains and not url_is_from_any_domain(parsed_url, self.allow_domains):
+                return UrlFilter.DOMAIN_NOT_ALLOWED
+            if self.deny_domains and url_is_from_any_domain(parsed_url, self.deny_domains):
+                return UrlFilter.DOMAIN_DENIED
+            if self.deny_extensions and self.has_denied_extension(parsed_url.path.lower()):
+                return UrlFilter.EXTENSION_DENIED
+        return None
+
+    def has_denied_extension(self, path):
+        """ Same as scrapy.utils.url.url_has_any_extension, with a single lookup for simple extensions """
+        dot = path.rfind(".")
+        if dot > path.rfind("/") and path[dot:] in self.deny_extensions:
+            return True
+        return any(path.endswith(extension) for extension in self.compound_extensions)
+
+
+def get_url_filter(allow=(), deny=(), allow_domains=(), deny_domains=(), deny_extensions=()):
+    """ Return the url filter of the given configuration, creating it on first request """
+    key = (tuple((pattern.pattern, pattern.flags) if hasattr(pattern, "pattern") else pattern for pattern in allow),
+           tuple((pattern.pattern, pattern.flags) if hasattr(pattern, "pattern") else pattern for pattern in deny),
+           frozenset(allow_domains), frozenset(deny_domains), frozenset(deny_extensions))
+    if key not in _URL_FILTERS:
+        _URL_FILTERS[key] = UrlFilter(allow=allow, deny=deny, allow_domains=allow_domains,
+                                      deny_domains=deny_domains, deny_extensions=deny_extensions)
+    return _URL_FILTERS[key]